@@ -1,13 +1,21 @@
 import json
+import mmap
+import heapq
 import pathlib
 import datetime
-from typing import List, Union
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Tuple, Union
 
 from dataclasses import dataclass
 
 from json_coder import register
 
-from .logentry import LogEntry, RequestLog, PerfLog, cast_log_type
+from .logentry import LogEntry, RequestLog, PerfLog, cast_log_type, cast_log_types
+from .compression import is_compressed, is_logfile, logfile_platform, iter_line_blocks
+from .jsonbackend import get_backend, default_backend, decode_entry, encode_entry
+from .cache import ParseCache
+from . import columnar, jsonl
 
 
 __version__ = "2.4.3"
@@ -16,47 +24,420 @@ register("datetime", datetime.datetime, datetime.datetime.fromisoformat, datetim
 
 
 MESSAGE_TAG = "FAASTERMETRICS"
+_MESSAGE_TAG_BYTES = MESSAGE_TAG.encode("utf-8")
 
+# Characters dropped from messages before decoding them as json.
+_CONTROL_CHARS = "\x0e\x12\x14\n"
+_CONTROL_BYTES = _CONTROL_CHARS.encode("utf-8")
+_CONTROL_TABLE = str.maketrans("", "", _CONTROL_CHARS)
 
-def load_logs(logdump: pathlib.Path) -> List[Union[RequestLog, PerfLog]]:
-    """Load dumped logs in json format.
+# Whitespace and separators between entries of a dumped json list.
+_LIST_SEPARATORS = " \t\r\n,"
+
+# Size of line-aligned byte ranges handed to worker processes.
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def load_logs(
+        logdump: pathlib.Path, backend: str = None, lazy: bool = False, context_id: str = None,
+        function: str = None,
+) -> List[Union[RequestLog, PerfLog]]:
+    """Load dumped logs in json, jsonl or columnar format.
 
     This is an alternative to just directly using json.load on a opened file.
+
+    Args:
+        logdump: Path to a json dump created by dump_logs, a jsonl or a
+            columnar dump.
+        backend: Name of the json backend, see jsonbackend.
+        lazy: Decode entry data on first access. Only columnar dumps keep
+            raw data per entry, json dumps are always decoded completely.
+        context_id: Only load entries with the given context id.
+        function: Only load entries of the given function. Filters are
+            looked up in the index of jsonl dumps, so that only matching
+            entries are read.
     """
-    with open(logdump, "r") as logfile:
-        entries = json.load(logfile)
+    values = {}
+    if context_id is not None:
+        values["context_id"] = context_id
+    if function is not None:
+        values["function"] = function
+
+    if jsonl.is_jsonl(logdump):
+        return list(jsonl.iter_jsonl(logdump, backend=backend, **values))
 
-    entries = [cast_log_type(e) for e in entries]
+    if columnar.is_columnar(logdump):
+        entries = columnar.load_entries(logdump, backend=backend, lazy=lazy)
+    else:
+        entries = get_backend(backend).load_dump(logdump)
+        entries = cast_log_types(entries)
+
+    if values:
+        entries = [e for e in entries if jsonl.matches(e, values)]
     return entries
 
+
+def iter_logs(
+        logdump: pathlib.Path, backend: str = None, read_size: int = 1024 * 1024
+) -> Iterator[Union[RequestLog, PerfLog]]:
+    """Iterate over dumped logs without loading the complete dump.
+
+    Args:
+        logdump: Path to a json dump created by dump_logs, a jsonl or a
+            columnar dump.
+        backend: Name of the json backend used for jsonl and columnar dumps,
+            see jsonbackend. Json lists are decoded incrementally by the
+            standard library.
+        read_size: Number of characters read from the dump at once.
+    """
+    if jsonl.is_jsonl(logdump):
+        yield from jsonl.iter_jsonl(logdump, backend=backend)
+        return
+
+    if columnar.is_columnar(logdump):
+        yield from columnar.iter_entries(logdump, backend=backend)
+        return
+
+    decoder = json.JSONDecoder()
+    with open(logdump, "r") as logfile:
+        buffer = logfile.read(read_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{logdump} is not a json list of log entries.")
+        pos = 1
+        while True:
+            # skip separators between entries
+            while pos < len(buffer) and buffer[pos] in _LIST_SEPARATORS:
+                pos += 1
+
+            if pos == len(buffer):
+                buffer = logfile.read(read_size)
+                pos = 0
+                if not buffer:
+                    raise ValueError(f"{logdump} ended before the end of the list.")
+                continue
+
+            if buffer[pos] == "]":
+                return
+
+            try:
+                entry, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # entry is incomplete, grow the buffer geometrically
+                data = logfile.read(max(read_size, len(buffer) - pos))
+                if not data:
+                    raise
+                buffer = buffer[pos:] + data
+                pos = 0
+                continue
+
+            yield cast_log_type(decode_entry(entry))
+            pos = end
+
+
+def dump_logs(entries: Iterable[LogEntry], logdump: pathlib.Path, append: bool = False) -> int:
+    """Write log entries to a json dump one entry at a time.
+
+    The output is identical to using json.dump on a list of the entries.
+
+    Args:
+        entries: Log entries to be dumped.
+        logdump: Destination json file.
+        append: Add entries to the end of an existing dump instead of
+            overwriting it.
+
+    Returns:
+        Number of written entries.
+    """
+    if append and logdump.exists():
+        return _append_logs(entries, logdump)
+
+    num_entries = 0
+    with open(logdump, "w") as logfile:
+        logfile.write("[")
+        for entry in entries:
+            if num_entries:
+                logfile.write(", ")
+            logfile.write(encode_entry(entry))
+            num_entries += 1
+        logfile.write("]")
+    return num_entries
+
+
+def _append_logs(entries: Iterable[LogEntry], logdump: pathlib.Path) -> int:
+    """Insert entries before the closing bracket of an existing dump."""
+    with open(logdump, "r+b") as logfile:
+        tail_size = min(logfile.seek(0, 2), 64)
+        logfile.seek(-tail_size, 2)
+        tail = logfile.read().rstrip()
+        if not tail.endswith(b"]"):
+            raise ValueError(f"{logdump} is not a json list of log entries.")
+
+        end = logfile.seek(len(tail) - tail_size - 1, 2)
+        is_empty = tail[:-1].rstrip().endswith(b"[")
+
+        num_entries = 0
+        for entry in entries:
+            if num_entries or not is_empty:
+                logfile.write(b", ")
+            logfile.write(encode_entry(entry).encode("utf-8"))
+            num_entries += 1
+        logfile.write(b"]")
+        logfile.truncate()
+    return num_entries
+
+
 def is_log_folder(logdir: pathlib.Path) -> bool:
     """Check whether the given folder is a valid log directory, eg whether aws,
     gcp logs etc are contained."""
-    num_logs = sum(1 for p in logdir.iterdir() if p.suffix == ".log")
+    num_logs = sum(1 for p in logdir.iterdir() if is_logfile(p))
     return num_logs > 0
 
 
-def parse_logdir(path: pathlib.Path) -> List[LogEntry]:
+def list_logfiles(logdir: pathlib.Path) -> List[pathlib.Path]:
+    """List plain and compressed logfiles in the given log directory."""
+    return [p for p in logdir.glob("*.log*") if is_logfile(p)]
+
+
+def parse_logdir(
+        path: pathlib.Path, workers: int = 1, backend: str = None, cache: ParseCache = None
+) -> List[LogEntry]:
+    """Parse all logfiles in the given log directory.
+
+    Args:
+        path: Log directory containing platform logfiles.
+        workers: Number of processes used for parsing. Files are split into
+            line-aligned chunks and results are merged in file order.
+        backend: Name of the json backend used for decoding messages.
+        cache: Cache of parsed logfiles. Unchanged logfiles are loaded from
+            the cache instead of being parsed.
+    """
+    return list(iter_logdir(path, workers=workers, backend=backend, cache=cache))
+
+
+def iter_logdir(
+        path: pathlib.Path, workers: int = 1, backend: str = None, cache: ParseCache = None,
+        interleave: bool = False,
+) -> Iterator[LogEntry]:
+    """Iterate over entries of all logfiles in the given log directory.
+
+    Entries are yielded in the same order as returned by parse_logdir,
+    unless they are interleaved.
+
+    Args:
+        interleave: Merge entries of all logfiles by timestamp instead of
+            yielding them file by file, so that streams of entries of all
+            platforms advance together, eg for sketch.LatencySketches.
+            Logfiles are read in parallel, each of them in its order. Not
+            supported with multiple workers.
+    """
     if not is_log_folder(path):
         raise ValueError(f"{path} is not a valid log directory.")
-    entries = [
-        entry
-        for filepath in path.glob("*.log") for entry in parse_logfile(filepath, platform=filepath.stem)
-    ]
-    return entries
+    filepaths = list_logfiles(path)
+    platforms = [logfile_platform(p) for p in filepaths]
+    if interleave:
+        if workers > 1:
+            raise ValueError("Logfiles cannot be interleaved when parsing with multiple workers.")
+        if cache is not None:
+            logfiles = [_load_cached(f, p, cache, workers, backend) for f, p in zip(filepaths, platforms)]
+        else:
+            logfiles = [iter_logfile(f, platform=p, backend=backend) for f, p in zip(filepaths, platforms)]
+        yield from heapq.merge(*logfiles, key=_timestamp)
+        return
 
+    if cache is not None:
+        for filepath, platform in zip(filepaths, platforms):
+            yield from _load_cached(filepath, platform, cache, workers, backend)
+        return
 
-def parse_logfile(path: pathlib.Path, platform: str = None) -> List[LogEntry]:
+    if workers > 1:
+        yield from _iter_parallel(filepaths, platforms, workers, backend=backend)
+        return
+
+    for filepath, platform in zip(filepaths, platforms):
+        yield from iter_logfile(filepath, platform=platform, backend=backend)
+
+
+def parse_logfile(
+        path: pathlib.Path, platform: str = None, workers: int = 1, backend: str = None
+) -> List[LogEntry]:
     """Read json logs at the given path."""
+    return list(iter_logfile(path, platform=platform, workers=workers, backend=backend))
+
+
+def iter_logfile(
+        path: pathlib.Path, platform: str = None, workers: int = 1, start: int = 0, end: int = None,
+        backend: str = None, select: Callable[[bytes], bool] = None,
+) -> Iterator[LogEntry]:
+    """Iterate over json logs at the given path.
+
+    Compressed logfiles (.log.gz, .log.xz, .log.zst) are decompressed as a
+    stream and can only be parsed as a whole.
+
+    Args:
+        path: Logfile to be parsed.
+        platform: Platform of the entries, defaults to name of the logfile.
+        workers: Number of processes used for parsing.
+        start: Byte offset to start parsing at, must be at a line start.
+        end: Byte offset to stop parsing at, defaults to end of file.
+        backend: Name of the json backend used for decoding messages.
+        select: Only decode messages for which this returns True, given the
+            raw message following the message tag. Not supported with
+            multiple workers.
+    """
     if platform is None:
         # Parse platform from name of logfile
-        platform = path.stem
+        platform = logfile_platform(path)
+
+    if end is None:
+        end = path.stat().st_size
+
+    if workers > 1:
+        if select is not None:
+            raise ValueError("Messages cannot be selected when parsing with multiple workers.")
+        yield from _iter_parallel([path], [platform], workers, [(start, end)], backend=backend)
+        return
+
+    if start >= end:
+        return
+
+    decode = get_backend(backend).decode_message
+    if is_compressed(path):
+        for block in _iter_compressed_blocks(path, start, end):
+            yield from _iter_buffer(block, platform, decode, select=select)
+        return
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield from _iter_buffer(buf, platform, decode, start, end, select=select)
+
+
+def _load_cached(
+        path: pathlib.Path, platform: str, cache: ParseCache, workers: int, backend: str
+) -> List[LogEntry]:
+    """Load entries of the logfile from the cache, parsing and caching them
+    if the logfile is not cached yet."""
+    entries = cache.load(path, backend=backend)
+    if entries is None:
+        entries = parse_logfile(path, platform=platform, workers=workers, backend=backend)
+        cache.store(path, entries)
+    return entries
+
+
+def _iter_compressed_blocks(path: pathlib.Path, start: int, end: int) -> Iterator[bytes]:
+    if start != 0 or end != path.stat().st_size:
+        raise ValueError(f"Compressed logfile {path} can only be parsed as a whole.")
+    return iter_line_blocks(path, CHUNK_SIZE)
+
+
+def _chunk_logfile(
+        path: pathlib.Path, start: int = 0, end: int = None, chunk_size: int = None
+) -> List[Tuple[int, int]]:
+    """Split the logfile into byte ranges ending on line boundaries, of
+    CHUNK_SIZE bytes by default."""
+    if end is None:
+        end = path.stat().st_size
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    chunks = []
+    with open(path, "rb") as f:
+        while start < end:
+            f.seek(start + chunk_size)
+            f.readline()
+            chunk_end = min(f.tell(), end)
+            chunks.append((start, chunk_end))
+            start = chunk_end
+    return chunks
+
+
+def _parse_chunk(path: pathlib.Path, platform: str, start: int, end: int, backend: str) -> List[LogEntry]:
+    """Parse the given byte range of a logfile."""
+    if start >= end:
+        return []
+
+    decode = get_backend(backend).decode_message
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return list(_iter_buffer(buf, platform, decode, start, end))
+
+
+def _iter_buffer(
+        buf, platform: str, decode: Callable, start: int = 0, end: int = None,
+        select: Callable[[bytes], bool] = None,
+) -> Iterator[LogEntry]:
+    """Parse all tagged lines inside the given bytes-like buffer.
+
+    Lines without the message tag are skipped without being copied, messages
+    not selected are skipped without being decoded.
+    """
+    if end is None:
+        end = len(buf)
+
+    pos = buf.find(_MESSAGE_TAG_BYTES, start, end)
+    while pos != -1:
+        message_start = pos + len(_MESSAGE_TAG_BYTES)
+        line_end = buf.find(b"\n", message_start, end)
+        if line_end == -1:
+            line_end = end
 
-    with open(path) as f:
-        parsed_entries = [_parse_entry(line, platform) for line in f]
+        message = buf[message_start:line_end]
+        if select is None or select(message):
+            entry = _parse_message(message, platform, decode)
+            if _is_valid(entry):
+                yield entry
 
-    valid_entries = [e for e in parsed_entries if _is_valid(e)]
-    return valid_entries
+        pos = buf.find(_MESSAGE_TAG_BYTES, line_end, end)
+
+
+def _parse_block(block: bytes, platform: str, backend: str) -> List[LogEntry]:
+    """Parse a block of decompressed log lines."""
+    return list(_iter_buffer(block, platform, get_backend(backend).decode_message))
+
+
+def _iter_tasks(
+        paths: List[pathlib.Path], platforms: List[str], ranges: List[Tuple[int, int]], backend: str
+) -> Iterator[tuple]:
+    """Split the given logfiles into parsing tasks for worker processes."""
+    for path, platform, (start, end) in zip(paths, platforms, ranges):
+        if end is None:
+            end = path.stat().st_size
+        if start >= end:
+            continue
+
+        if is_compressed(path):
+            # blocks can only be created by decompressing in order
+            for block in _iter_compressed_blocks(path, start, end):
+                yield _parse_block, (block, platform, backend)
+        else:
+            for chunk_start, chunk_end in _chunk_logfile(path, start, end):
+                yield _parse_chunk, (path, platform, chunk_start, chunk_end, backend)
+
+
+def _iter_parallel(
+        paths: List[pathlib.Path], platforms: List[str], workers: int, ranges: List[Tuple[int, int]] = None,
+        backend: str = None,
+) -> Iterator[LogEntry]:
+    """Parse chunks of all given logfiles in a process pool.
+
+    Entries are yielded in the same order as parsing the files serially. The
+    number of tasks in flight is bounded, so that decompressed blocks do not
+    pile up in memory.
+    """
+    if ranges is None:
+        ranges = [(0, None)] * len(paths)
+
+    # resolve the default backend once, so that all workers use the same
+    if backend is None:
+        backend = default_backend()
+    get_backend(backend)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for fun, args in _iter_tasks(paths, platforms, ranges, backend):
+            pending.append(executor.submit(fun, *args))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
 
 
 def _parse_entry(raw_entry: str, platform: str) -> LogEntry:
@@ -76,5 +457,31 @@ def _parse_entry(raw_entry: str, platform: str) -> LogEntry:
     return entry
 
 
+def _parse_message(message: bytes, platform: str, decode: Callable) -> LogEntry:
+    """Byte based equivalent of _parse_entry for the part after the message tag.
+
+    Escape sequences are only decoded if the message contains any.
+
+    Args:
+        message: Raw message following the message tag.
+        platform: Platform the message has been logged on.
+        decode: Function decoding the json object at the start of a string.
+    """
+    if b"\\" in message:
+        dec_entry = message.decode("unicode_escape").translate(_CONTROL_TABLE)
+    else:
+        dec_entry = message.translate(None, _CONTROL_BYTES).decode("latin-1")
+    obj = decode(dec_entry)
+
+    timestamp = datetime.datetime.fromtimestamp(obj["timestamp"] / 1000)
+
+    entry = LogEntry(timestamp, obj, platform)
+    return entry
+
+
+def _timestamp(entry: LogEntry) -> datetime.datetime:
+    return entry.timestamp
+
+
 def _is_valid(entry: LogEntry) -> bool:
     return entry is not None and entry.data["version"] is not None
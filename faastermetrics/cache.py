@@ -0,0 +1,102 @@
+"""
+Persistent cache of parsed raw logfiles.
+
+Parsed entries of every logfile are stored as a columnar dump in the cache
+directory. Cached files are keyed by path, size and modification time of the
+logfile and the parser version, so changed logfiles are parsed again. The
+least recently used files are removed once the cache exceeds its maximum
+size.
+"""
+import os
+import hashlib
+import pathlib
+from typing import List
+
+from .logentry import LogEntry
+from . import columnar
+
+
+# Increase whenever parsing raw logs creates different entries.
+PARSER_VERSION = 1
+
+CACHE_ENV = "FAASTERMETRICS_CACHE"
+
+DEFAULT_MAX_SIZE = 1024 ** 3
+
+_CACHE_SUFFIX = ".npz"
+
+
+class ParseCache:
+    """Parsed entries of logfiles stored in a cache directory.
+
+    Args:
+        cache_dir: Directory containing cached files, created if missing.
+        max_size: Maximum total size of cached files in bytes.
+    """
+
+    def __init__(self, cache_dir: pathlib.Path, max_size: int = DEFAULT_MAX_SIZE):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_size = max_size
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def cache_path(self, path: pathlib.Path) -> pathlib.Path:
+        stat = path.stat()
+        key = f"{path.resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}\0{PARSER_VERSION}"
+        return self.cache_dir / (hashlib.sha1(key.encode("utf-8")).hexdigest() + _CACHE_SUFFIX)
+
+    def load(self, path: pathlib.Path, backend: str = None) -> List[LogEntry]:
+        """Get cached entries of the logfile or None if it is not cached."""
+        cached = self.cache_path(path)
+        try:
+            entries = columnar.load_entries(cached, backend=backend, cast=False)
+        except FileNotFoundError:
+            return None
+        # mark as recently used for eviction
+        os.utime(cached)
+        return entries
+
+    def store(self, path: pathlib.Path, entries: List[LogEntry]):
+        """Cache parsed entries of the logfile and evict old files."""
+        cached = self.cache_path(path)
+        tmp_path = cached.with_name(cached.name + f".{os.getpid()}.tmp")
+        columnar.dump_columnar(entries, tmp_path)
+        os.replace(tmp_path, cached)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used files until the cache fits its maximum
+        size."""
+        files = []
+        for cached in self.cache_dir.glob("*" + _CACHE_SUFFIX):
+            try:
+                stat = cached.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, cached))
+
+        total_size = sum(size for _, size, _ in files)
+        for _, size, cached in sorted(files):
+            if total_size <= self.max_size:
+                break
+            cached.unlink(missing_ok=True)
+            total_size -= size
+
+    def clear(self):
+        for cached in self.cache_dir.glob("*" + _CACHE_SUFFIX):
+            cached.unlink(missing_ok=True)
+
+
+def get_cache(cache_dir: pathlib.Path = None, disabled: bool = False) -> ParseCache:
+    """Get the parse cache in the given directory or the directory set in the
+    FAASTERMETRICS_CACHE environment variable.
+
+    Returns:
+        The cache or None if caching is disabled or no directory is set.
+    """
+    if disabled:
+        return None
+    if cache_dir is None:
+        cache_dir = os.environ.get(CACHE_ENV)
+        if not cache_dir:
+            return None
+    return ParseCache(cache_dir)
@@ -1,11 +1,21 @@
 """
 Performance logging utility functions.
 """
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional
+import zlib
+import heapq
+import itertools
 import datetime
+import multiprocessing
+from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 
-from .logentry import LogEntry, RequestLog, PerfLog, UNDEFINED_XPAIR, MARK_END, MARK_START, ArtilleryLog
+from .logentry import (
+    LogEntry, RequestLog, PerfLog, UNDEFINED_XPAIR, MARK_END, MARK_START, ArtilleryLog, INCOMING_REQ_TYPES,
+    OUTGOING_REQ_TYPES, cast_log_type,
+)
+from .symbols import SymbolTable
 from . import helper as cg
 from .helper import group_by_function, group_by, uniq_by
 
@@ -17,24 +27,36 @@ class Call:
     duration: datetime.timedelta
     entries: List[LogEntry]
     calls: List["Call"] = field(default_factory=lambda: list())
+    # code of the id in the symbol table of the run that built the call
+    id_code: int = field(default=None, repr=False, compare=False)
+    symbols: SymbolTable = field(default=None, repr=False, compare=False)
 
     @property
     def start_time(self):
-        if len(self.entries) == 0:
-            return None
-        return sorted(self.entries, key=lambda e: e.timestamp)[0]
+        """Entry with the first timestamp, the first one of equal entries."""
+        return min(self.entries, key=lambda e: e.timestamp, default=None)
 
     @property
     def end_time(self):
-        if len(self.entries) == 0:
-            return None
-        return sorted(self.entries, key=lambda e: e.timestamp)[-1]
+        """Entry with the last timestamp, the last one of equal entries."""
+        return max(reversed(self.entries), key=lambda e: e.timestamp, default=None)
+
+    def code(self, symbols: SymbolTable) -> int:
+        """Get the code of the id in the table, interning the id if the call
+        has not been built with the table."""
+        if self.symbols is symbols:
+            return self.id_code
+        return symbols.intern_id(self.id)
+
+    def __getstate__(self):
+        # codes are only valid together with the table of the run
+        return {**self.__dict__, "id_code": None, "symbols": None}
 
     @property
     def log_duration(self):
-        if self.end_time is None or self.start_time is None:
+        if not self.entries:
             return None
-        return self.end_time - self.start_time
+        return self.end_time.timestamp - self.start_time.timestamp
 
     def __repr__(self):
         fmt_id = "-".join(map(str, self.id))
@@ -127,6 +149,71 @@ def id_groups_to_call(entry_id, entries: List[LogEntry]) -> Call:
     return request_to_call(entries)
 
 
+def calls_symbols(calls: List[Call]) -> SymbolTable:
+    """Get the symbol table the calls have been built with or a new table
+    if they have been built without one."""
+    if calls and calls[0].symbols is not None:
+        return calls[0].symbols
+    return SymbolTable()
+
+
+def code_call(call: Call, symbols: SymbolTable) -> Call:
+    """Store the codes of the ids of the call and its subcalls in the
+    table, sharing their ids with other calls of the table."""
+    for c in [call, *call.calls]:
+        c.id_code = symbols.intern_id(c.id)
+        c.id = symbols.value(c.id_code)
+        c.symbols = symbols
+    return call
+
+
+def calls_by_id(calls: Iterable[Call], symbols: SymbolTable) -> Dict[int, List[Call]]:
+    """Index calls by the code of their id in the symbol table, see
+    calls_symbols.
+
+    Returns:
+        Calls in their given order by id code, used for matching subcalls to
+        the calls of their ids with subcall.code(symbols) without scanning
+        all calls.
+    """
+    index = defaultdict(list)
+    for call in calls:
+        index[call.code(symbols)].append(call)
+    return dict(index)
+
+
+def platform_transport_times(calls: List[Call]) -> Dict[tuple, List[float]]:
+    """Get transport times in ms of subcalls by origin and destination
+    platform.
+
+    The transport time is half of the difference between the duration of
+    the subcall measured by the caller and the duration of the matching
+    call. Subcalls without a single matching call are skipped.
+    """
+    # get function platform associations
+    platforms = {
+        call.function: entry.platform for call in calls for entry in call.entries
+    }
+    symbols = calls_symbols(calls)
+    index = calls_by_id(calls, symbols)
+
+    transport_times = defaultdict(list)
+    for call in calls:
+        if call.function == "artillery":
+            continue
+        for subcall in call.calls:
+            try:
+                matched_call, = index.get(subcall.code(symbols), [])
+            except ValueError:
+                continue
+
+            orig = platforms[call.function]
+            dest = platforms[subcall.function]
+            transport = (subcall.duration - matched_call.duration) / 2
+            transport_times[(orig, dest)].append(transport.total_seconds() * 1000)
+    return transport_times
+
+
 def url_to_function_name(name):
     # AWS URL is DOMAIN/dev/PATH
     if "/dev/" in name:
@@ -141,42 +228,230 @@ def url_to_function_name(name):
     return new_name
 
 
-def normalize_call_names(calls):
-    id_names = group_by(
-        [c for c in calls] + [s for c in calls for s in c.calls],
-        lambda c: c.id
-    )
+def _normalized_name(names: set) -> str:
+    """Get the name of an id from the names of all its calls and subcalls."""
+    if len(names) == 1:
+        name, = names
+        if "http" in name:
+            name = url_to_function_name(name)
+        return name
+    name, = [url_to_function_name(n) for n in names if "http" in n]
+    return name
+
+
+def normalize_call_names(calls, symbols: SymbolTable = None):
+    if symbols is None:
+        symbols = calls_symbols(calls)
+    id_names = defaultdict(set)
+    for call in calls:
+        id_names[call.code(symbols)].add(call.function)
+        for subcall in call.calls:
+            id_names[subcall.code(symbols)].add(subcall.function)
 
     # built id name translation mapping
-    id_translated = {}
-    for key, id_calls in id_names.items():
-        names = {c.function for c in id_calls}
-        if len(names) == 1:
-            name, = names
-            if "http" in name:
-                name = url_to_function_name(name)
-            id_translated[key] = name
-        elif len(names) > 1:
-            name, = [url_to_function_name(n) for n in names if "http" in n]
-            id_translated[key] = name
+    id_translated = {key: _normalized_name(names) for key, names in id_names.items()}
 
     # rename calls
     for call in calls:
-        call.function = id_translated[call.id]
+        call.function = id_translated[call.code(symbols)]
         for subcall in call.calls:
-            subcall.function = id_translated[subcall.id]
+            subcall.function = id_translated[subcall.code(symbols)]
 
     return calls
 
 
-def create_requestgroups(data: List[LogEntry]) -> List[Call]:
-    """Create a list of logs based on request behavior."""
-    context_id_groups = group_by(data, lambda e: e.id)
-    calls = [
-        id_groups_to_call(id, entries)
-        for id, entries in context_id_groups.items()
+def _one(values: list, name: str):
+    """Get the single value, raising a ValueError if there is none or more."""
+    if len(values) != 1:
+        raise ValueError(f"{name} not unique: {values}")
+    return values[0]
+
+
+def _measure_duration(measures: List[PerfLog]) -> datetime.timedelta:
+    measure = _one(measures, "Measure entries")
+    return datetime.timedelta(milliseconds=measure.perf["duration"])
+
+
+def _group_to_call(id: tuple, entries: List[LogEntry]) -> Call:
+    """Create the call of a single id like id_groups_to_call, classifying
+    each entry once."""
+    if id[0] is None:
+        return misc_to_call(entries)
+
+    incoming = []
+    measures = []
+    functions = set()
+    # entries and measures by perf type data of outgoing calls
+    outgoing = {}
+    requests = []
+    is_artillery = True
+    for entry in entries:
+        if isinstance(entry, PerfLog):
+            is_artillery = False
+            perf = entry.perf
+            perf_type = entry.perf_type[1]
+            if perf_type in INCOMING_REQ_TYPES:
+                incoming.append(entry)
+                functions.add(entry.function)
+                if perf["entryType"] == "measure":
+                    measures.append(entry)
+            elif perf_type in OUTGOING_REQ_TYPES:
+                out = outgoing.get(entry.perf_type_data)
+                if out is None:
+                    out = outgoing[entry.perf_type_data] = ([], [])
+                out[0].append(entry)
+                if perf["entryType"] == "measure":
+                    out[1].append(entry)
+        elif not isinstance(entry, ArtilleryLog):
+            is_artillery = False
+            if isinstance(entry, RequestLog):
+                requests.append(entry)
+
+    if is_artillery:
+        return artillery_to_call(entries)
+
+    if not incoming:
+        raise ValueError(f"No incoming entries for {id}")
+    call = Call(
+        id=id,
+        function=_one(list(functions), "Function names"),
+        duration=_measure_duration(measures),
+        entries=incoming,
+    )
+    for perf_type_data, (out_entries, out_measures) in outgoing.items():
+        function, ids, *_ = perf_type_data.split(":")
+        call.calls.append(Call(
+            id=tuple(ids.split("-")),
+            function=function,
+            duration=_measure_duration(out_measures),
+            entries=out_entries,
+        ))
+    if len(requests) > 1:
+        raise ValueError(f"Too many request entries in single group: {requests}")
+    call.entries += requests
+    return call
+
+
+def build_calls(data: List[LogEntry], symbols: SymbolTable = None) -> List[Call]:
+    """Create calls of all ids, classifying each entry once.
+
+    Entries are grouped by the code of their id in the symbol table, a new
+    table for this run by default. Calls are ordered by the first entry of
+    their id. Calls without a context id are included and names are not
+    normalized.
+    """
+    if symbols is None:
+        symbols = SymbolTable()
+    groups = group_by(data, symbols.intern_entry)
+    return [
+        code_call(_group_to_call(symbols.value(id_code), entries), symbols)
+        for id_code, entries in groups.items()
     ]
 
+
+def _shard(context_id: str, num_shards: int) -> int:
+    if context_id is None:
+        return 0
+    return zlib.crc32(context_id.encode("utf-8")) % num_shards
+
+
+def _call_skeleton(call: Call, positions: dict) -> tuple:
+    """Replace entries of the call by their positions for sending it back
+    from a worker process."""
+    return (
+        call.id, call.function, call.duration, [positions[id(e)] for e in call.entries],
+        [_call_skeleton(c, positions) for c in call.calls],
+    )
+
+
+def _restore_call(skeleton: tuple, entries: List[LogEntry]) -> Call:
+    call_id, function, duration, positions, subcalls = skeleton
+    return Call(
+        id=call_id, function=function, duration=duration, entries=[entries[i] for i in positions],
+        calls=[_restore_call(c, entries) for c in subcalls],
+    )
+
+
+def _build_shard_calls(entries: List[LogEntry]) -> List[tuple]:
+    """Build calls of a shard in a worker process.
+
+    Returns:
+        Call skeletons and the position of the first entry of their id.
+    """
+    positions = {id(e): i for i, e in enumerate(entries)}
+    symbols = SymbolTable()
+    groups = group_by(range(len(entries)), lambda i: symbols.intern_entry(entries[i]))
+    return [
+        (_call_skeleton(_group_to_call(symbols.value(id_code), [entries[i] for i in group]), positions), group[0])
+        for id_code, group in groups.items()
+    ]
+
+
+# Shards of entries inherited by forked worker processes.
+_FORK_SHARDS = None
+
+
+def _build_forked_shard_calls(index: int) -> List[tuple]:
+    return _build_shard_calls(_FORK_SHARDS[index])
+
+
+def build_calls_parallel(data: List[LogEntry], workers: int, symbols: SymbolTable = None) -> List[Call]:
+    """Build calls in a process pool, same as build_calls.
+
+    Calls never cross context ids, so entries are split into shards by a
+    hash of their context id, which are grouped independently. Ids of the
+    calls are coded in the symbol table once they are sent back.
+    """
+    if symbols is None:
+        symbols = SymbolTable()
+    shards = [[] for _ in range(workers)]
+    shard_positions = [[] for _ in range(workers)]
+    for position, entry in enumerate(data):
+        shard = _shard(entry.context_id, workers)
+        shards[shard].append(entry)
+        shard_positions[shard].append(position)
+
+    global _FORK_SHARDS
+    if "fork" in multiprocessing.get_all_start_methods():
+        # forked workers inherit the shards instead of receiving them pickled
+        _FORK_SHARDS = shards
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+                shard_results = list(executor.map(_build_forked_shard_calls, range(workers)))
+        finally:
+            _FORK_SHARDS = None
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shard_results = list(executor.map(_build_shard_calls, shards))
+
+    calls = []
+    for entries, positions, results in zip(shards, shard_positions, shard_results):
+        calls += [
+            (positions[first], code_call(_restore_call(skeleton, entries), symbols))
+            for skeleton, first in results
+        ]
+
+    # restore the order of the first entry of each id
+    calls.sort(key=lambda c: c[0])
+    return [call for _, call in calls]
+
+
+def create_requestgroups(data: List[LogEntry], workers: int = 1, symbols: SymbolTable = None) -> List[Call]:
+    """Create a list of logs based on request behavior.
+
+    Args:
+        data: Log entries.
+        workers: Number of processes used for building calls.
+        symbols: Symbol table the ids of calls are coded in, a new table
+            owned by the calls by default.
+    """
+    if symbols is None:
+        symbols = SymbolTable()
+    if workers > 1:
+        calls = build_calls_parallel(data, workers, symbols)
+    else:
+        calls = build_calls(data, symbols)
+
     # remove calls without a context ID, these are most probably platform
     # messages
     len_all_calls = len(calls)
@@ -184,5 +459,271 @@ def create_requestgroups(data: List[LogEntry]) -> List[Call]:
     print(f"Keep with context ids only: {len(calls)}/{len_all_calls}")
 
     # normalize artillery call urls
-    calls = normalize_call_names(calls)
+    calls = normalize_call_names(calls, symbols)
     return calls
+
+
+# time by which entries of a call may be logged after later entries
+DEFAULT_LATENESS = datetime.timedelta(seconds=1)
+
+
+class CallStream:
+    """Build calls from batches of a stream of entries, only keeping entries
+    of calls that are not finished yet.
+
+    A call is finished once entries of its platform logged more than the
+    lateness after its last entry have been added, so entries logged out of
+    order are still part of it. Its entries are dropped afterwards, also if
+    no call can be built of them, eg since the measure of an outgoing call
+    is missing. So only entries logged within the lateness before the
+    latest entry of their platform are kept. Unlike create_requestgroups,
+    names of calls are not normalized, since this needs the names of all
+    calls.
+
+    Args:
+        lateness: Time by which entries of a call may be out of order.
+    """
+
+    def __init__(self, lateness: datetime.timedelta = DEFAULT_LATENESS):
+        self.lateness = lateness
+        # entries of unfinished calls by id
+        self._groups = {}
+        # latest timestamp of added entries by platform
+        self._watermarks = {}
+        # deadlines and ids of unfinished calls by platform, as heaps
+        self._deadlines = defaultdict(list)
+
+    def add(self, entries: Iterable[LogEntry]) -> List[Call]:
+        """Add entries and get the calls finished by them."""
+        groups = self._groups
+        watermarks = self._watermarks
+        touched = {}
+        for entry in entries:
+            entry = cast_log_type(entry)
+            if entry.context_id is None:
+                continue
+            group = groups.get(entry.id)
+            if group is None:
+                group = groups[entry.id] = []
+            group.append(entry)
+            watermark = watermarks.get(entry.platform)
+            if watermark is None or entry.timestamp > watermark:
+                watermarks[entry.platform] = entry.timestamp
+            touched[entry.id] = entry.platform
+
+        for call_id, platform in touched.items():
+            heapq.heappush(self._deadlines[platform], (self._deadline(call_id), call_id))
+        return self._release()
+
+    def _deadline(self, call_id: tuple) -> datetime.datetime:
+        return max(entry.timestamp for entry in self._groups[call_id]) + self.lateness
+
+    def _release(self) -> List[Call]:
+        calls = []
+        for platform, deadlines in self._deadlines.items():
+            watermark = self._watermarks[platform]
+            while deadlines and deadlines[0][0] <= watermark:
+                _, call_id = heapq.heappop(deadlines)
+                group = self._groups.get(call_id)
+                if group is None or self._deadline(call_id) > watermark:
+                    # finished already or entries have been added since,
+                    # which queued the call again
+                    continue
+                del self._groups[call_id]
+                try:
+                    calls.append(_group_to_call(call_id, group))
+                except ValueError:
+                    # measures of outgoing calls are missing
+                    continue
+        return calls
+
+    def finish(self) -> List[Call]:
+        """Get calls of the remaining entries that can be built."""
+        calls = []
+        for call_id, group in self._groups.items():
+            try:
+                calls.append(_group_to_call(call_id, group))
+            except ValueError:
+                continue
+        self._groups = {}
+        self._watermarks = {}
+        self._deadlines = defaultdict(list)
+        return calls
+
+    def entries(self) -> List[LogEntry]:
+        """Get entries of calls that are not finished yet."""
+        return [entry for group in self._groups.values() for entry in group]
+
+    @property
+    def num_pending(self) -> int:
+        """Number of ids with entries whose calls are not finished yet."""
+        return len(self._groups)
+
+
+def stream_calls(entries: Iterable[LogEntry], batch_size: int = 10000) -> Iterator[Call]:
+    """Build calls from a stream of entries with a CallStream.
+
+    Args:
+        entries: Log entries.
+        batch_size: Number of entries read before yielding finished calls.
+    """
+    stream = CallStream()
+    entries = iter(entries)
+    while True:
+        batch = list(itertools.islice(entries, batch_size))
+        if not batch:
+            break
+        yield from stream.add(batch)
+    yield from stream.finish()
+
+
+def _decrement(counter: Counter, key):
+    counter[key] -= 1
+    if not counter[key]:
+        del counter[key]
+
+
+class CallIndex:
+    """Calls of entries added in batches, eg while an experiment is running.
+
+    Only calls of ids with new entries are built again and only names of
+    their ids are normalized again. Like in a CallStream, a call is built
+    once entries of its platform logged more than the lateness after its
+    last entry have been added, and built again if entries of its id are
+    added later. Call finish once all entries have been added, the calls
+    are then the same as returned by create_requestgroups.
+
+    Ids are coded in a symbol table owned by the index.
+
+    Args:
+        lateness: Time by which entries of a call may be out of order.
+    """
+
+    def __init__(self, lateness: datetime.timedelta = DEFAULT_LATENESS):
+        self.lateness = lateness
+        self.symbols = SymbolTable()
+        # entries by id code, in order of the first entry of each id
+        self._groups = {}
+        # finished calls by id code
+        self._calls = {}
+        # raw names of finished calls and their subcalls by id code of the
+        # call
+        self._call_names = {}
+        # raw names and id codes of the containing calls by id code
+        self._id_names = defaultdict(Counter)
+        self._id_owners = defaultdict(Counter)
+        # latest timestamp of added entries by platform
+        self._watermarks = {}
+        # deadlines of ids with new entries, also as heaps by platform
+        self._queued = {}
+        self._deadlines = defaultdict(list)
+
+    def add(self, entries: Iterable[LogEntry]) -> List[Call]:
+        """Add new entries and build the calls finished by them.
+
+        Entries are cast to their log type, so that batches of parsed
+        logfiles can be added directly. Entries without a context id are
+        ignored.
+
+        Returns:
+            Calls that have been built again.
+        """
+        watermarks = self._watermarks
+        touched = {}
+        for entry in entries:
+            entry = cast_log_type(entry)
+            if entry.context_id is None:
+                continue
+            id_code = self.symbols.intern_entry(entry)
+            group = self._groups.get(id_code)
+            if group is None:
+                group = self._groups[id_code] = []
+            group.append(entry)
+            watermark = watermarks.get(entry.platform)
+            if watermark is None or entry.timestamp > watermark:
+                watermarks[entry.platform] = entry.timestamp
+            touched[id_code] = entry.platform
+
+        for id_code, platform in touched.items():
+            deadline = max(entry.timestamp for entry in self._groups[id_code]) + self.lateness
+            if self._queued.get(id_code) != deadline:
+                self._queued[id_code] = deadline
+                heapq.heappush(self._deadlines[platform], (deadline, id_code))
+
+        built = []
+        for platform, deadlines in self._deadlines.items():
+            watermark = watermarks[platform]
+            while deadlines and deadlines[0][0] <= watermark:
+                deadline, id_code = heapq.heappop(deadlines)
+                if self._queued.get(id_code) != deadline:
+                    # entries have been added since, which queued the id again
+                    continue
+                del self._queued[id_code]
+                built += self._build(id_code)
+        return built
+
+    def finish(self) -> List[Call]:
+        """Build the calls of all ids with new entries."""
+        built = []
+        for id_code in list(self._queued):
+            del self._queued[id_code]
+            built += self._build(id_code)
+        self._deadlines = defaultdict(list)
+        return built
+
+    def _build(self, id_code: int) -> List[Call]:
+        try:
+            call = _group_to_call(self.symbols.value(id_code), self._groups[id_code])
+        except ValueError:
+            # entries of the call are missing
+            self._replace(id_code, None)
+            return []
+        code_call(call, self.symbols)
+        self._replace(id_code, call)
+        return [call]
+
+    def _replace(self, owner: int, call: Optional[Call]):
+        """Replace the call of the owner id and rename calls of all ids whose
+        names have changed.
+
+        Names are normalized before any state is changed, so the index is
+        left unchanged if they cannot be normalized.
+        """
+        old_names = self._call_names.get(owner, [])
+        new_names = [] if call is None else [(c.id_code, c.function) for c in [call, *call.calls]]
+        id_names = {}
+        for id_code, name in old_names:
+            _decrement(id_names.setdefault(id_code, Counter(self._id_names[id_code])), name)
+        for id_code, name in new_names:
+            id_names.setdefault(id_code, Counter(self._id_names.get(id_code, ())))[name] += 1
+        normalized = {id_code: _normalized_name(set(names)) for id_code, names in id_names.items() if names}
+
+        for id_code, name in old_names:
+            _decrement(self._id_names[id_code], name)
+            _decrement(self._id_owners[id_code], owner)
+        self._call_names.pop(owner, None)
+        self._calls.pop(owner, None)
+        if call is not None:
+            self._calls[owner] = call
+            self._call_names[owner] = new_names
+            for id_code, name in new_names:
+                self._id_names[id_code][name] += 1
+                self._id_owners[id_code][owner] += 1
+
+        for id_code, name in normalized.items():
+            for other in self._id_owners[id_code]:
+                owner_call = self._calls[other]
+                for renamed in [owner_call, *owner_call.calls]:
+                    if renamed.id_code == id_code:
+                        renamed.function = name
+
+    @property
+    def calls(self) -> List[Call]:
+        """Finished calls in order of the first entry of their id."""
+        return [self._calls[id_code] for id_code in self._groups if id_code in self._calls]
+
+    @property
+    def num_pending(self) -> int:
+        """Number of ids with new entries whose calls have not been built
+        again yet."""
+        return len(self._queued)
@@ -0,0 +1,268 @@
+"""
+Columnar log dumps stored as NumPy .npz archives.
+
+Each dump contains typed columns for the fields used by most analyses and
+the json encoded data of every entry, so that complete entries can be
+restored. Columns are stored as separate arrays and can be loaded
+individually. Categories are stored json encoded, so that values keep their
+type.
+"""
+import json
+import pathlib
+from array import array
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+
+from .logentry import LogEntry, LOG_SUBTYPES, log_type
+from .jsonbackend import get_backend, encode_data
+
+
+FORMAT_VERSION = 2
+
+# Dumps of version 1 store categories as plain strings.
+SUPPORTED_VERSIONS = (1, FORMAT_VERSION)
+
+ZIP_MAGIC = b"PK\x03\x04"
+
+# Columns containing json values stored as integer codes into a categories
+# array. Missing values have the code -1.
+CATEGORICAL_COLUMNS = (
+    "platform",
+    "context_id",
+    "xpair",
+    "function",
+    "perf_mark",
+    "perf_entry_type",
+    "kind",
+    "version",
+    "deployment_id",
+)
+
+NUMERIC_COLUMNS = (
+    "timestamp",
+    "perf_duration",
+)
+
+COLUMNS = NUMERIC_COLUMNS + CATEGORICAL_COLUMNS
+
+LOG_TYPES = {t.__name__: t for t in [LogEntry, *LOG_SUBTYPES]}
+
+
+def is_columnar(logdump: pathlib.Path) -> bool:
+    """Check whether the dump is a columnar dump instead of json."""
+    with open(logdump, "rb") as dfile:
+        return dfile.read(len(ZIP_MAGIC)) == ZIP_MAGIC
+
+
+class _Categorical:
+    """Incrementally build codes for a column of json values."""
+
+    def __init__(self):
+        self.codes = array("i")
+        self.categories = {}
+
+    def append(self, value):
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self.categories.get(value)
+        if code is None:
+            code = self.categories[value] = len(self.categories)
+        self.codes.append(code)
+
+    def arrays(self, name: str) -> Dict[str, np.ndarray]:
+        return {
+            f"{name}.codes": np.frombuffer(self.codes, dtype=np.int32),
+            f"{name}.categories": np.array([json.dumps(c) for c in self.categories], dtype=str),
+        }
+
+
+def _entry_columns(entry: LogEntry) -> tuple:
+    """Get values of categorical columns in the order of
+    CATEGORICAL_COLUMNS."""
+    data = entry.data
+    event = data.get("event", {})
+    perf = event.get("perf", {})
+    kind = log_type(entry) if "event" in data else None
+    return (
+        entry.platform,
+        event.get("contextId"),
+        event.get("xPair"),
+        data.get("fn", {}).get("name"),
+        perf.get("mark"),
+        perf.get("entryType"),
+        kind.__name__ if kind is not None else LogEntry.__name__,
+        data.get("version"),
+        data.get("deploymentId"),
+    )
+
+
+def _perf_duration(entry: LogEntry) -> float:
+    """Get the perf duration of the entry, NaN if it is missing."""
+    duration = entry.data.get("event", {}).get("perf", {}).get("duration")
+    return np.nan if duration is None else duration
+
+
+def dump_columnar(entries: Iterable[LogEntry], logdump: pathlib.Path) -> int:
+    """Write log entries to a columnar dump.
+
+    Returns:
+        Number of written entries.
+    """
+    timestamps = []
+    durations = array("d")
+    categoricals = [_Categorical() for _ in CATEGORICAL_COLUMNS]
+    payload = bytearray()
+    offsets = array("q", [0])
+
+    for entry in entries:
+        timestamps.append(entry.timestamp)
+        durations.append(_perf_duration(entry))
+        for categorical, value in zip(categoricals, _entry_columns(entry)):
+            categorical.append(value)
+        payload += encode_data(entry.data)
+        offsets.append(len(payload))
+
+    arrays = {
+        "format_version": np.array(FORMAT_VERSION),
+        "timestamp": np.array(timestamps, dtype="datetime64[us]"),
+        "perf_duration": np.frombuffer(durations, dtype=np.float64),
+        "payload.data": np.frombuffer(payload, dtype=np.uint8),
+        "payload.offsets": np.frombuffer(offsets, dtype=np.int64),
+    }
+    for name, categorical in zip(CATEGORICAL_COLUMNS, categoricals):
+        arrays.update(categorical.arrays(name))
+
+    with open(logdump, "wb") as dfile:
+        np.savez(dfile, **arrays)
+    return len(timestamps)
+
+
+def load_categorical(logdump: pathlib.Path, name: str) -> tuple:
+    """Load codes and categories of a categorical column, categories are an
+    object array of the original values."""
+    with np.load(logdump) as npz:
+        _check_version(npz)
+        return npz[f"{name}.codes"], _load_categories(npz, name)
+
+
+def _load_categories(npz, name: str) -> np.ndarray:
+    encoded = npz[f"{name}.categories"].tolist()
+    categories = np.empty(len(encoded), dtype=object)
+    if int(npz["format_version"]) == 1:
+        categories[:] = encoded
+    else:
+        categories[:] = [json.loads(c) for c in encoded]
+    return categories
+
+
+def load_columns(logdump: pathlib.Path, columns: List[str] = None) -> Dict[str, np.ndarray]:
+    """Load typed columns from a columnar dump.
+
+    Args:
+        logdump: Path to the columnar dump.
+        columns: Names of columns to be loaded, defaults to all in COLUMNS.
+
+    Returns:
+        Arrays by column name. Categorical columns are object arrays with None
+        for missing values.
+    """
+    if columns is None:
+        columns = COLUMNS
+
+    unknown = set(columns) - set(COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown columns {unknown}, available: {COLUMNS}")
+
+    loaded = {}
+    with np.load(logdump) as npz:
+        _check_version(npz)
+        for name in columns:
+            if name in CATEGORICAL_COLUMNS:
+                codes = npz[f"{name}.codes"]
+                categories = np.append(_load_categories(npz, name), None)
+                loaded[name] = categories[codes]
+            else:
+                loaded[name] = npz[name]
+    return loaded
+
+
+def load_entries(
+        logdump: pathlib.Path, backend: str = None, lazy: bool = False, cast: bool = True
+) -> List[LogEntry]:
+    """Restore entries of their respective log type from a columnar dump.
+
+    Args:
+        logdump: Path to the columnar dump.
+        backend: Name of the json backend used for decoding entry data.
+        lazy: Keep the json encoded data of entries until it is first
+            accessed.
+        cast: Restore the log type of entries instead of plain LogEntry
+            objects as returned by parsing.
+    """
+    decode = get_backend(backend).loads
+    with np.load(logdump) as npz:
+        _check_version(npz)
+        timestamps = npz["timestamp"].astype(object)
+        platform_codes = npz["platform.codes"]
+        platforms = _load_categories(npz, "platform").tolist()
+        kind_codes = npz["kind.codes"]
+        if cast:
+            kinds = [LOG_TYPES[k] for k in _load_categories(npz, "kind").tolist()]
+        else:
+            kinds = [LogEntry] * len(npz["kind.categories"])
+        payload = npz["payload.data"].tobytes()
+        offsets = npz["payload.offsets"].tolist()
+
+    entries = []
+    for i, (timestamp, platform, kind) in enumerate(zip(timestamps, platform_codes.tolist(), kind_codes.tolist())):
+        entry_type = kinds[kind]
+        raw = payload[offsets[i]:offsets[i + 1]]
+        if lazy:
+            entry = entry_type.lazy(timestamp, raw, platforms[platform], decode)
+        else:
+            entry = entry_type(timestamp, decode(raw), platforms[platform])
+        if cast and entry_type is LogEntry:
+            print(f"Unknown log type: {entry}")
+        entries.append(entry)
+    return entries
+
+
+def iter_entries(
+        logdump: pathlib.Path, backend: str = None, rows: np.ndarray = None
+) -> Iterator[LogEntry]:
+    """Iterate over entries of a columnar dump, decoding the data of every
+    entry only when it is reached.
+
+    Args:
+        logdump: Path to the columnar dump.
+        backend: Name of the json backend used for decoding entry data.
+        rows: Indices of the entries to be decoded, defaults to all.
+    """
+    decode = get_backend(backend).loads
+    with np.load(logdump) as npz:
+        _check_version(npz)
+        timestamps = npz["timestamp"]
+        platform_codes = npz["platform.codes"]
+        platforms = _load_categories(npz, "platform").tolist()
+        kind_codes = npz["kind.codes"]
+        kinds = [LOG_TYPES[k] for k in _load_categories(npz, "kind").tolist()]
+        payload = npz["payload.data"]
+        offsets = npz["payload.offsets"]
+
+    if rows is None:
+        rows = np.arange(len(timestamps))
+    for row in rows.tolist():
+        entry_type = kinds[kind_codes[row]]
+        raw = payload[offsets[row]:offsets[row + 1]].tobytes()
+        entry = entry_type(timestamps[row].item(), decode(raw), platforms[platform_codes[row]])
+        if entry_type is LogEntry:
+            print(f"Unknown log type: {entry}")
+        yield entry
+
+
+def _check_version(npz):
+    version = int(npz["format_version"])
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Unsupported columnar dump version {version}, expected {FORMAT_VERSION}.")
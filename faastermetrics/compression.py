@@ -0,0 +1,65 @@
+"""
+Reading of raw logfiles that have been archived in compressed form.
+"""
+import gzip
+import lzma
+import pathlib
+from typing import Iterator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+LOG_SUFFIX = ".log"
+
+
+def _open_zstd(path: pathlib.Path):
+    if zstandard is None:
+        raise ImportError(f"Reading {path} requires the zstandard package.")
+    return zstandard.open(path, "rb")
+
+
+COMPRESSED_OPENERS = {
+    ".gz": gzip.open,
+    ".xz": lzma.open,
+    ".zst": _open_zstd,
+}
+
+
+def is_compressed(path: pathlib.Path) -> bool:
+    return path.suffix in COMPRESSED_OPENERS
+
+
+def is_logfile(path: pathlib.Path) -> bool:
+    """Check whether the path is a plain or compressed logfile, eg aws.log or
+    aws.log.gz."""
+    if is_compressed(path):
+        path = path.with_suffix("")
+    return path.suffix == LOG_SUFFIX
+
+
+def logfile_platform(path: pathlib.Path) -> str:
+    """Get the platform name from a logfile name."""
+    if is_compressed(path):
+        path = path.with_suffix("")
+    return path.stem
+
+
+def iter_line_blocks(path: pathlib.Path, block_size: int) -> Iterator[bytes]:
+    """Decompress the logfile as a stream of blocks ending on line
+    boundaries."""
+    with COMPRESSED_OPENERS[path.suffix](path) as stream:
+        rest = b""
+        while True:
+            data = stream.read(block_size)
+            if not data:
+                break
+            block = rest + data
+            split = block.rfind(b"\n") + 1
+            rest = block[split:]
+            if split:
+                yield block[:split]
+        if rest:
+            yield rest
@@ -0,0 +1,194 @@
+"""
+Critical paths of requests through their calls.
+
+The critical path of a call is found walking backwards from its end: the
+subcall ending last is critical, followed by the subcall ending last before
+that subcall started, and so on. Subcalls running in parallel with a
+critical subcall are not critical. The duration of every request is
+decomposed along its critical path into exclusive time of functions,
+transport time of rpcOut calls and child time spent in critical subcalls.
+"""
+import datetime
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .calls import Call, calls_by_id, calls_symbols
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+PATH_SEPARATOR = " > "
+
+
+def _ms(duration: datetime.timedelta) -> float:
+    return duration.total_seconds() * 1000
+
+
+def _end(call: Call) -> Optional[float]:
+    """Get the end of the call in ms, None if it has no entries."""
+    end = call.end_time
+    return _ms(end.timestamp - _EPOCH) if end is not None else None
+
+
+def _subcall_interval(subcall: Call, call_end: Optional[float]) -> Optional[tuple]:
+    """Get start and end of a subcall in ms, unknown ends are clamped to the
+    end of its call. None if the duration or both ends are unknown."""
+    end = _end(subcall)
+    if end is None:
+        end = call_end
+    if end is None or subcall.duration is None:
+        return None
+    return (end - _ms(subcall.duration), end)
+
+
+def _critical_subcalls(subcalls: List[Call], call_end: Optional[float] = None) -> List[Call]:
+    """Get critical subcalls of a call in order of their start, subcalls
+    without an interval are not critical."""
+    if len(subcalls) < 2:
+        return subcalls
+    intervals = []
+    for i, subcall in enumerate(subcalls):
+        interval = _subcall_interval(subcall, call_end)
+        if interval is not None:
+            intervals.append((interval, i))
+    intervals.sort(key=lambda item: item[0][1], reverse=True)
+    critical = []
+    boundary = np.inf
+    for (start, end), i in intervals:
+        if end <= boundary:
+            critical.append(subcalls[i])
+            boundary = start
+    critical.reverse()
+    return critical
+
+
+@dataclass
+class CriticalPaths:
+    """Critical paths of requests and their decomposition.
+
+    Requests and hops of critical paths are stored as columns. Hops are the
+    calls on critical paths in depth first order, with the index of their
+    request, depth, duration and its decomposition in ms:
+    exclusive + child == duration and transport is the part of the rpcOut
+    duration of the caller not spent in the call. Subcalls whose call has
+    not been logged are hops with only exclusive time.
+    """
+    # columns by request: context_id, function, duration, path
+    requests: Dict[str, np.ndarray]
+    # columns by hop: request, function, depth, duration, exclusive,
+    # transport, child
+    hops: Dict[str, np.ndarray]
+
+    def __len__(self):
+        return len(self.requests["duration"])
+
+    def most_common(self, num: int = None) -> List[tuple]:
+        """Get the most common critical paths with their number of requests,
+        mean and p99 duration of requests in ms."""
+        durations = self.requests["duration"]
+        uniq, inverse = np.unique(self.requests["path"].astype(str), return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(uniq))
+        means = np.bincount(inverse, weights=durations, minlength=len(uniq)) / np.maximum(counts, 1)
+        # durations grouped by path, sorted inside of each group
+        grouped = np.split(durations[np.lexsort((durations, inverse))], np.cumsum(counts)[:-1])
+        common = []
+        for code in np.argsort(-counts, kind="stable")[:num].tolist():
+            common.append((
+                str(uniq[code]), int(counts[code]), float(means[code]),
+                float(np.percentile(grouped[code], 99)),
+            ))
+        return common
+
+    def function_breakdown(self) -> Dict[str, dict]:
+        """Get the number of critical hops and the summed exclusive, transport
+        and child time in ms by function, with the share of exclusive and
+        transport time in the duration of all requests."""
+        functions, inverse = np.unique(self.hops["function"].astype(str), return_inverse=True)
+        total = self.requests["duration"].sum()
+        breakdown = {}
+        counts = np.bincount(inverse, minlength=len(functions))
+        sums = {
+            key: np.bincount(inverse, weights=self.hops[key], minlength=len(functions))
+            for key in ("exclusive", "transport", "child")
+        }
+        for code, function in enumerate(functions.tolist()):
+            breakdown[function] = {
+                "hops": int(counts[code]),
+                **{key: float(values[code]) for key, values in sums.items()},
+                "share": float((sums["exclusive"][code] + sums["transport"][code]) / total) if total else np.nan,
+            }
+        return breakdown
+
+
+def critical_paths(calls: List[Call]) -> CriticalPaths:
+    """Find critical paths of all requests in a single pass over the calls.
+
+    Requests are calls that are not called by other calls, eg artillery
+    calls, with their subcalls matched to calls by id.
+
+    Args:
+        calls: Calls as created by create_requestgroups.
+    """
+    symbols = calls_symbols(calls)
+    index = calls_by_id(calls, symbols)
+    called = {s.code(symbols) for c in calls for s in c.calls}
+
+    requests = {"context_id": [], "function": [], "duration": [], "path": []}
+    hops = {k: [] for k in ("request", "function", "depth", "duration", "exclusive", "transport", "child")}
+    for root in calls:
+        if root.code(symbols) in called or root.duration is None:
+            continue
+        request = len(requests["duration"])
+        path = []
+        # calls with the rpcOut duration of their caller
+        stack = [(root, 0, None)]
+        while stack:
+            call, depth, out_duration = stack.pop()
+            path.append(call.function)
+            duration = _ms(call.duration) if call.duration is not None else out_duration or 0.0
+            transport = out_duration - duration if out_duration is not None else 0.0
+
+            critical = _critical_subcalls(call.calls, _end(call)) if call.duration is not None else []
+            child = 0.0
+            children = []
+            for subcall in critical:
+                out = _ms(subcall.duration) if subcall.duration is not None else 0.0
+                child += out
+                matched = index.get(subcall.code(symbols))
+                if matched:
+                    children.append((matched[0], depth + 1, out))
+                else:
+                    # call of the subcall has not been logged
+                    children.append((Call(subcall.id, subcall.function, None, []), depth + 1, out))
+            stack.extend(reversed(children))
+
+            hops["request"].append(request)
+            hops["function"].append(call.function)
+            hops["depth"].append(depth)
+            hops["duration"].append(duration)
+            hops["exclusive"].append(duration - child)
+            hops["transport"].append(transport)
+            hops["child"].append(child)
+
+        requests["context_id"].append(root.id[0])
+        requests["function"].append(root.function)
+        requests["duration"].append(_ms(root.duration))
+        requests["path"].append(PATH_SEPARATOR.join(path))
+
+    return CriticalPaths(
+        requests={
+            "context_id": np.array(requests["context_id"], dtype=object),
+            "function": np.array(requests["function"], dtype=object),
+            "duration": np.array(requests["duration"], dtype=np.float64),
+            "path": np.array(requests["path"], dtype=object),
+        },
+        hops={
+            "request": np.array(hops["request"], dtype=np.int64),
+            "function": np.array(hops["function"], dtype=object),
+            "depth": np.array(hops["depth"], dtype=np.int32),
+            **{k: np.array(hops[k], dtype=np.float64) for k in ("duration", "exclusive", "transport", "child")},
+        },
+    )
+
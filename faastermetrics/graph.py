@@ -1,22 +1,30 @@
 """
 Generate a request graph based on a list of log entries.
 """
-from collections import Counter
+import datetime
+import itertools
+from typing import Dict, Iterable, List, Optional
 
 import numpy as np
 
 import networkx as nx
 from .logentry import LogEntry
-from .calls import create_requestgroups
+from .calls import Call, create_requestgroups, calls_by_id, calls_symbols
+from .sketch import QuantileSketch, DEFAULT_HORIZON, DEFAULT_RELATIVE_ACCURACY
 from .helper import uniq_by, group_by
 
 
-def build_call_graph(entries: LogEntry) -> nx.DiGraph:
-    calls = create_requestgroups(entries)
+def build_call_graph(entries: LogEntry, workers: int = 1) -> nx.DiGraph:
+    return calls_to_call_graph(create_requestgroups(entries, workers=workers))
 
-    count_ids = Counter([c.id for c in calls])
-    if max(count_ids.values()) > 1:
-        raise ValueError(f"Duplicate ids: { {k: v for k, v in count_ids.items() if v > 1} }")
+
+def calls_to_call_graph(calls: List[Call]) -> nx.DiGraph:
+    """Create a graph with a node for every call id."""
+    symbols = calls_symbols(calls)
+    index = calls_by_id(calls, symbols)
+    duplicates = {symbols.value(k): len(v) for k, v in index.items() if len(v) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate ids: {duplicates}")
 
     graph = nx.DiGraph()
 
@@ -24,20 +32,27 @@ def build_call_graph(entries: LogEntry) -> nx.DiGraph:
         graph.add_node(call.id, calls=[call])
         # add edges
         for subcall in call.calls:
-            matched_call, = [c for c in calls if c.id == subcall.id]
+            matched_call, = index.get(subcall.code(symbols), [])
             graph.add_node(matched_call.id, calls=[matched_call])
             graph.add_edge(call.id, subcall.id, calls=[subcall])
 
     return graph
 
 
-def build_function_graph(entries: LogEntry) -> nx.DiGraph:
+def build_function_graph(entries: LogEntry, workers: int = 1) -> nx.DiGraph:
     """Create a networkx graph that contains calls.
 
     Each edge contains outgoing calls that are logged externally (eg rpcOut)
+
+    Args:
+        entries: Log entries.
+        workers: Number of processes used for building calls.
     """
-    calls = create_requestgroups(entries)
+    return calls_to_function_graph(create_requestgroups(entries, workers=workers))
+
 
+def calls_to_function_graph(calls: List[Call]) -> nx.DiGraph:
+    """Create a graph with a node for every function."""
     graph = nx.DiGraph()
 
     for call in calls:
@@ -66,19 +81,81 @@ def build_function_graph(entries: LogEntry) -> nx.DiGraph:
     return graph
 
 
+# Maximum number of xpairs kept as examples in nodes of summary graphs, in
+# addition to UNDEFINED_XPAIR.
+SUMMARY_MAX_XPAIRS = 8
+
+
+def build_summary_function_graph(
+        entries: Iterable[LogEntry], horizon: Optional[datetime.timedelta] = DEFAULT_HORIZON
+) -> nx.DiGraph:
+    """Create a function graph of aggregates without keeping calls.
+
+    Entries are summarized as a stream, see summary.summarize, so only
+    entries of calls that are not finished yet are kept.
+
+    Args:
+        entries: Log entries in about timestamp order, or any order with a
+            horizon of None.
+        horizon: See sketch.LatencySketches.
+    """
+    from .summary import summarize
+
+    summary = summarize(entries, horizon=horizon)
+    summary.finish()
+    return summary.to_function_graph()
+
+
+def calls_to_summary_graph(
+        calls: Iterable[Call], relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY
+) -> nx.DiGraph:
+    """Create a graph with a node for every function that only contains
+    aggregates of calls, so that its size only depends on the number of
+    functions.
+
+    Nodes contain num_calls, the set of platforms, up to SUMMARY_MAX_XPAIRS
+    example xpairs and whether calls without xpair exist, and a sketch of
+    rpcIn durations in rpc_in_sketch. Edges contain num_calls and sketches
+    in rpc_out_sketch and transport_sketch. The graph attribute summary is
+    set to True.
+
+    Calls are added to the sketches in batches as they are iterated, so
+    they can be streamed, eg from calls.stream_calls.
+    """
+    from .summary import AnalysisSummary, BATCH_SIZE
+
+    summary = AnalysisSummary(relative_accuracy)
+    calls = iter(calls)
+    while True:
+        batch = list(itertools.islice(calls, BATCH_SIZE))
+        if not batch:
+            break
+        summary.add_calls(batch)
+    summary.finish()
+    return summary.to_function_graph()
+
+
+def is_summary_graph(graph: nx.DiGraph) -> bool:
+    return graph.graph.get("summary", False)
+
+
 def conv_to_ms(timedelta):
     return timedelta.total_seconds() * 1000
 
 
 def node_num_calls(graph, node):
+    if is_summary_graph(graph):
+        return graph.nodes[node]["num_calls"]
     calls = graph.nodes[node]["calls"]
     return len(calls)
 
 
 def node_platform(graph, node):
-    calls = graph.nodes[node]["calls"]
-    platforms = [e.platform for c in calls for e in c.entries]
-    uniq_platforms = set(platforms)
+    if is_summary_graph(graph):
+        uniq_platforms = graph.nodes[node]["platforms"]
+    else:
+        calls = graph.nodes[node]["calls"]
+        uniq_platforms = {e.platform for c in calls for e in c.entries}
     if len(uniq_platforms) != 1:
         raise RuntimeError(f"{node} has wrong platform number: {uniq_platforms}")
     platform, = uniq_platforms
@@ -106,7 +183,9 @@ def edge_transport_duration(graph, edge, reduce_fun=np.mean):
     edge_calls = graph.edges[edge]["calls"]
 
     transport_times = []
-    edge_dest = [(e, d) for e in edge_calls for d in dest_calls if e.id == d.id]
+    symbols = calls_symbols(dest_calls)
+    dest_index = calls_by_id(dest_calls, symbols)
+    edge_dest = [(e, d) for e in edge_calls for d in dest_index.get(e.code(symbols), [])]
     for e_call, d_call in edge_dest:
         duration = conv_to_ms(e_call.duration - d_call.duration)
         transport_times.append(duration)
@@ -114,6 +193,99 @@ def edge_transport_duration(graph, edge, reduce_fun=np.mean):
     return transport_time
 
 
+# Duration statistics attached to graph nodes and edges and the percentile
+# of every statistic computed from sorted durations.
+STATISTICS = ("count", "mean", "p50", "p90", "p99", "max")
+_PERCENTILES = (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))
+
+
+def duration_statistics(durations: np.ndarray, codes: np.ndarray, num_groups: int) -> Dict[str, np.ndarray]:
+    """Compute STATISTICS of durations grouped by integer codes.
+
+    Percentiles are interpolated linearly like np.percentile.
+
+    Args:
+        durations: Durations in ms.
+        codes: Group of every duration in range(num_groups).
+        num_groups: Number of groups.
+
+    Returns:
+        Array of values for all groups by statistic. Groups without durations
+        have a count of 0 and NaN for all other statistics.
+    """
+    durations = np.asarray(durations, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    counts = np.bincount(codes, minlength=num_groups)
+    starts = np.cumsum(counts) - counts
+    # durations sorted within each group
+    values = durations[np.lexsort((durations, codes))]
+
+    stats = {"count": counts}
+    with np.errstate(invalid="ignore"):
+        stats["mean"] = np.bincount(codes, weights=durations, minlength=num_groups) / counts
+
+    found = counts > 0
+    for name, percentile in _PERCENTILES:
+        position = starts[found] + (counts[found] - 1) * (percentile / 100)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        stats[name] = np.full(num_groups, np.nan)
+        stats[name][found] = values[lower] + (values[upper] - values[lower]) * (position - lower)
+    return stats
+
+
+def _to_ms(timedeltas: list) -> np.ndarray:
+    return np.array([t.total_seconds() for t in timedeltas], dtype=np.float64) * 1000
+
+
+def _set_statistics(set_attributes, graph, keys: list, key: str, durations: list, codes: list):
+    stats = duration_statistics(durations, codes, len(keys))
+    for name, values in stats.items():
+        set_attributes(graph, dict(zip(keys, values.tolist())), f"{key}_{name}")
+    # plain key kept as the mean
+    set_attributes(graph, dict(zip(keys, stats["mean"].tolist())), key)
+
+
+def add_duration_statistics(graph):
+    """Add STATISTICS of rpcIn durations to nodes and of rpcOut and
+    transport durations to edges.
+
+    Statistics are added as attributes named after the duration and the
+    statistic, eg rpc_in_p99 or transport_max. The rpc_in, rpc_out and
+    transport attributes contain the mean.
+    """
+    nodes = list(graph.nodes)
+    durations, codes = [], []
+    for code, node in enumerate(nodes):
+        for call in graph.nodes[node]["calls"]:
+            if call.duration is not None:
+                durations.append(call.duration)
+                codes.append(code)
+    _set_statistics(nx.set_node_attributes, graph, nodes, "rpc_in", _to_ms(durations), codes)
+
+    edges = list(graph.edges)
+    durations, codes = [], []
+    transports, transport_codes = [], []
+    dest_indices = {}
+    for code, edge in enumerate(edges):
+        dest = edge[1]
+        if dest not in dest_indices:
+            dest_calls = graph.nodes[dest]["calls"]
+            symbols = calls_symbols(dest_calls)
+            dest_indices[dest] = (calls_by_id(dest_calls, symbols), symbols)
+        dest_index, symbols = dest_indices[dest]
+        for call in graph.edges[edge]["calls"]:
+            if call.duration is not None:
+                durations.append(call.duration)
+                codes.append(code)
+            for dest_call in dest_index.get(call.code(symbols), []):
+                transports.append(call.duration - dest_call.duration)
+                transport_codes.append(code)
+    _set_statistics(nx.set_edge_attributes, graph, edges, "rpc_out", _to_ms(durations), codes)
+    _set_statistics(nx.set_edge_attributes, graph, edges, "transport", _to_ms(transports), transport_codes)
+    return graph
+
+
 def apply_to_graph_nodes(graph, fun, key):
     nx.set_node_attributes(graph, {n: fun(graph, n) for n in graph.nodes}, key)
     return graph
@@ -124,10 +296,33 @@ def apply_to_graph_edges(graph, fun, key):
     return graph
 
 
+def _sketch_statistics(sketch: QuantileSketch) -> Dict[str, float]:
+    stats = {"count": sketch.count, "mean": sketch.mean}
+    for name, percentile in _PERCENTILES:
+        stats[name] = sketch.quantile(percentile / 100)
+    return stats
+
+
+def add_sketch_statistics(graph):
+    """Add STATISTICS estimated from the duration sketches of a summary
+    graph, named like in add_duration_statistics."""
+    items = [(graph.nodes[n], "rpc_in") for n in graph.nodes]
+    items += [(graph.edges[e], key) for e in graph.edges for key in ("rpc_out", "transport")]
+    for attrs, key in items:
+        sketch = attrs.get(f"{key}_sketch")
+        if sketch is None:
+            continue
+        stats = _sketch_statistics(sketch)
+        for name, value in stats.items():
+            attrs[f"{key}_{name}"] = value
+        attrs[key] = stats["mean"]
+    return graph
+
+
 def add_default_metadata(graph):
-    apply_to_graph_nodes(graph, node_rpc_in_duration, "rpc_in")
+    if is_summary_graph(graph):
+        add_sketch_statistics(graph)
+    else:
+        add_duration_statistics(graph)
     apply_to_graph_nodes(graph, node_platform, "platform")
-
-    apply_to_graph_edges(graph, edge_rpc_out_duration, "rpc_out")
-    apply_to_graph_edges(graph, edge_transport_duration, "transport")
     return graph
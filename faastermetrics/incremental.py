@@ -0,0 +1,120 @@
+"""
+Checkpoints for incrementally parsing logfiles that are still being written.
+"""
+import os
+import json
+import hashlib
+import pathlib
+from typing import Dict, Tuple
+from dataclasses import dataclass, asdict
+
+from .compression import is_compressed
+
+
+# Number of bytes searched backwards for the start of the last line.
+LAST_LINE_WINDOW = 64 * 1024
+
+
+@dataclass
+class LogCheckpoint:
+    """Position up to which a logfile has been parsed."""
+    offset: int
+    inode: int
+    size: int
+    last_line_hash: str
+
+
+def complete_lines_end(path: pathlib.Path) -> int:
+    """Get the offset after the last newline, so that partially written lines
+    are left for the next run.
+
+    Compressed logfiles are always parsed as a whole.
+    """
+    size = path.stat().st_size
+    if is_compressed(path):
+        return size
+    with open(path, "rb") as f:
+        pos = size
+        while pos > 0:
+            read_start = max(0, pos - LAST_LINE_WINDOW)
+            f.seek(read_start)
+            newline = f.read(pos - read_start).rfind(b"\n")
+            if newline != -1:
+                return read_start + newline + 1
+            pos = read_start
+    return 0
+
+
+def last_line_hash(path: pathlib.Path, offset: int) -> str:
+    """Hash the line ending at the given offset."""
+    with open(path, "rb") as f:
+        read_start = max(0, offset - LAST_LINE_WINDOW)
+        f.seek(read_start)
+        data = f.read(offset - read_start)
+    line_start = data.rfind(b"\n", 0, max(0, len(data) - 1)) + 1
+    return hashlib.sha1(data[line_start:]).hexdigest()
+
+
+def create_checkpoint(path: pathlib.Path, offset: int) -> LogCheckpoint:
+    stat = path.stat()
+    return LogCheckpoint(
+        offset=offset,
+        inode=stat.st_ino,
+        size=stat.st_size,
+        last_line_hash=last_line_hash(path, offset),
+    )
+
+
+def resume_offset(path: pathlib.Path, checkpoint: LogCheckpoint) -> int:
+    """Get the offset to continue parsing at.
+
+    Returns:
+        Offset of the checkpoint or None if the file has been replaced or
+        truncated since the checkpoint was created. Compressed logfiles can
+        not be resumed after they have been changed.
+    """
+    stat = path.stat()
+    if stat.st_ino != checkpoint.inode or stat.st_size < checkpoint.offset:
+        return None
+    if is_compressed(path) and stat.st_size != checkpoint.size:
+        return None
+    if last_line_hash(path, checkpoint.offset) != checkpoint.last_line_hash:
+        return None
+    return checkpoint.offset
+
+
+def checkpoint_path(logdump: pathlib.Path) -> pathlib.Path:
+    """Get the checkpoint file belonging to the given dump."""
+    return logdump.with_suffix(".checkpoint.json")
+
+
+def load_checkpoints(path: pathlib.Path) -> Tuple[dict, Dict[str, LogCheckpoint]]:
+    """Load checkpoints and the parameters they have been created with.
+
+    Returns:
+        Parameters and checkpoints keyed by logfile name. Both are empty if
+        no checkpoint file exists.
+    """
+    if not path.exists():
+        return {}, {}
+
+    with open(path) as cfile:
+        data = json.load(cfile)
+
+    checkpoints = {
+        name: LogCheckpoint(**checkpoint) for name, checkpoint in data["files"].items()
+    }
+    return data["params"], checkpoints
+
+
+def save_checkpoints(path: pathlib.Path, params: dict, checkpoints: Dict[str, LogCheckpoint]):
+    data = {
+        "params": params,
+        "files": {name: asdict(checkpoint) for name, checkpoint in checkpoints.items()},
+    }
+    # write atomically, so that an interrupted run does not leave a broken
+    # checkpoint file
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as cfile:
+        json.dump(data, cfile)
+    os.replace(tmp_path, path)
@@ -0,0 +1,135 @@
+"""
+Json backends used for decoding raw log messages and log dumps.
+
+The backend is selected by name, falling back to the FAASTERMETRICS_JSON
+environment variable. By default orjson is used if it is installed.
+Entries are always encoded with the json standard library, so that dumps
+stay byte-identical regardless of the backend.
+"""
+import os
+import json
+import pathlib
+import datetime
+from typing import List
+
+from .logentry import LogEntry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+BACKEND_ENV = "FAASTERMETRICS_JSON"
+
+_DECODER = json.JSONDecoder()
+_ENCODER = json.JSONEncoder()
+
+
+class JsonBackend:
+    """Decoding using the json standard library."""
+    name = "json"
+
+    def decode_message(self, message: str) -> dict:
+        """Decode the json object at the start of a log message, ignoring any
+        trailing data."""
+        obj, _ = _DECODER.raw_decode(message)
+        return obj
+
+    def loads(self, raw: bytes):
+        """Decode a complete utf-8 encoded json document."""
+        return _DECODER.decode(raw.decode("utf-8"))
+
+    def load_entry(self, raw: bytes) -> LogEntry:
+        """Decode a single entry encoded as in dumps."""
+        return json.loads(raw)
+
+    def load_dump(self, logdump: pathlib.Path) -> List[LogEntry]:
+        with open(logdump, "r") as logfile:
+            return json.load(logfile)
+
+
+class OrjsonBackend(JsonBackend):
+    """Decoding using orjson.
+
+    Messages with trailing data or values orjson does not support, such as
+    NaN or integers above 64 bit, are decoded by the standard library.
+    """
+    name = "orjson"
+
+    def decode_message(self, message: str) -> dict:
+        try:
+            return orjson.loads(message)
+        except orjson.JSONDecodeError:
+            return super().decode_message(message)
+
+    def loads(self, raw: bytes):
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return super().loads(raw)
+
+    def load_entry(self, raw: bytes) -> LogEntry:
+        try:
+            return decode_entry(orjson.loads(raw))
+        except orjson.JSONDecodeError:
+            return super().load_entry(raw)
+
+    def load_dump(self, logdump: pathlib.Path) -> List[LogEntry]:
+        with open(logdump, "rb") as logfile:
+            raw = logfile.read()
+        try:
+            objs = orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return super().load_dump(logdump)
+        return [decode_entry(obj) for obj in objs]
+
+
+BACKENDS = {
+    "json": JsonBackend,
+    "orjson": OrjsonBackend,
+}
+
+
+def default_backend() -> str:
+    name = os.environ.get(BACKEND_ENV)
+    if name:
+        return name
+    return "orjson" if orjson is not None else "json"
+
+
+def get_backend(name: str = None) -> JsonBackend:
+    """Get the json backend with the given name or the default backend."""
+    if name is None:
+        name = default_backend()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown json backend {name}, available: {', '.join(BACKENDS)}")
+    if name == "orjson" and orjson is None:
+        raise ImportError("The orjson json backend requires the orjson package.")
+    return BACKENDS[name]()
+
+
+def decode_entry(obj: dict) -> LogEntry:
+    """Create an entry from the json_coder representation in a dump.
+
+    Dumps only contain registered objects for entries and their timestamps.
+    """
+    fields = obj["__logentry__"]
+    timestamp = datetime.datetime.fromisoformat(fields["timestamp"]["__datetime__"])
+    return LogEntry(timestamp, fields["data"], fields["platform"])
+
+
+def encode_data(data: dict) -> bytes:
+    """Encode entry data as utf-8 json."""
+    return _ENCODER.encode(data).encode("utf-8")
+
+
+def encode_entry(entry: LogEntry) -> str:
+    """Encode an entry identical to json_coder without copying its data."""
+    return _ENCODER.encode({
+        "__logentry__": {
+            "timestamp": {"__datetime__": entry.timestamp.isoformat()},
+            "data": entry.data,
+            "platform": entry.platform,
+        }
+    })
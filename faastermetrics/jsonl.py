@@ -0,0 +1,175 @@
+"""
+Log dumps in JSON Lines format with an index for random access.
+
+Every line contains a single entry encoded the same way as in json dumps.
+A sidecar index maps context ids and function names to the byte offsets of
+their lines, so that entries of single requests can be read without
+decoding the complete dump.
+"""
+import pathlib
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+
+from .logentry import LogEntry, cast_log_type
+from .jsonbackend import get_backend, encode_entry
+
+
+INDEX_VERSION = 1
+
+# Entry fields included in the index.
+INDEX_KEYS = ("context_id", "function")
+
+
+def is_jsonl(logdump: pathlib.Path) -> bool:
+    """Check whether the dump contains one entry per line instead of a json
+    list.
+
+    Empty files are jsonl dumps without entries, json dumps always contain
+    a list.
+    """
+    if logdump.suffix == ".jsonl":
+        return True
+    with open(logdump, "rb") as dfile:
+        return dfile.read(64).lstrip()[:1] in (b"{", b"")
+
+
+def index_path(logdump: pathlib.Path) -> pathlib.Path:
+    """Get the index file belonging to the given dump."""
+    return logdump.with_name(logdump.name + ".index.npz")
+
+
+def _index_values(entry: LogEntry) -> tuple:
+    """Get values of the entry in the order of INDEX_KEYS."""
+    data = entry.data
+    return (
+        data.get("event", {}).get("contextId"),
+        data.get("fn", {}).get("name"),
+    )
+
+
+class _IndexBuilder:
+    """Collect line offsets by value for every index key."""
+
+    def __init__(self):
+        self.offsets = [defaultdict(list) for _ in INDEX_KEYS]
+
+    def add(self, entry: LogEntry, offset: int):
+        for offsets, value in zip(self.offsets, _index_values(entry)):
+            if value is not None:
+                offsets[value].append(offset)
+
+    def save(self, path: pathlib.Path, dump_size: int):
+        arrays = {
+            "index_version": np.array(INDEX_VERSION),
+            "dump_size": np.array(dump_size),
+        }
+        for name, offsets in zip(INDEX_KEYS, self.offsets):
+            values = sorted(offsets)
+            counts = [len(offsets[v]) for v in values]
+            arrays[f"{name}.values"] = np.array(values, dtype=str)
+            arrays[f"{name}.starts"] = np.cumsum([0] + counts, dtype=np.int64)
+            arrays[f"{name}.offsets"] = np.array(
+                [o for v in values for o in offsets[v]], dtype=np.int64)
+
+        with open(path, "wb") as ifile:
+            np.savez(ifile, **arrays)
+
+
+def dump_jsonl(entries: Iterable[LogEntry], logdump: pathlib.Path) -> int:
+    """Write log entries one per line and create the index of the dump.
+
+    Returns:
+        Number of written entries.
+    """
+    index = _IndexBuilder()
+    num_entries = 0
+    with open(logdump, "wb") as logfile:
+        for entry in entries:
+            index.add(entry, logfile.tell())
+            logfile.write(encode_entry(entry).encode("utf-8") + b"\n")
+            num_entries += 1
+        dump_size = logfile.tell()
+    index.save(index_path(logdump), dump_size)
+    return num_entries
+
+
+def build_index(logdump: pathlib.Path, backend: str = None):
+    """Create the index of an existing dump, eg after it has been modified."""
+    load_entry = get_backend(backend).load_entry
+    index = _IndexBuilder()
+    offset = 0
+    with open(logdump, "rb") as logfile:
+        for line in logfile:
+            if line.strip():
+                index.add(load_entry(line), offset)
+            offset += len(line)
+    index.save(index_path(logdump), offset)
+
+
+def lookup_offsets(logdump: pathlib.Path, **values) -> List[int]:
+    """Get line offsets of entries matching all given index values.
+
+    Args:
+        logdump: Path to the jsonl dump.
+        values: Values by name of the index key, eg context_id="abc".
+
+    Returns:
+        Sorted offsets or None if the dump has no up to date index.
+    """
+    unknown = set(values) - set(INDEX_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown index keys {unknown}, available: {INDEX_KEYS}")
+
+    path = index_path(logdump)
+    if not path.exists():
+        return None
+
+    matched = None
+    with np.load(path) as npz:
+        if int(npz["index_version"]) != INDEX_VERSION or int(npz["dump_size"]) != logdump.stat().st_size:
+            return None
+        for name, value in values.items():
+            indexed = npz[f"{name}.values"]
+            pos = np.searchsorted(indexed, value)
+            if pos < len(indexed) and indexed[pos] == value:
+                starts = npz[f"{name}.starts"]
+                offsets = npz[f"{name}.offsets"][starts[pos]:starts[pos + 1]]
+            else:
+                offsets = np.empty(0, dtype=np.int64)
+            matched = offsets if matched is None else np.intersect1d(matched, offsets)
+    return sorted(matched.tolist()) if matched is not None else None
+
+
+def iter_jsonl(logdump: pathlib.Path, backend: str = None, **values) -> Iterator[LogEntry]:
+    """Iterate over entries of a jsonl dump.
+
+    Args:
+        logdump: Path to the jsonl dump.
+        backend: Name of the json backend used for decoding entries.
+        values: Only include entries matching the given index values, eg
+            context_id="abc". Without an up to date index the complete dump
+            is read and filtered.
+    """
+    load_entry = get_backend(backend).load_entry
+    offsets = lookup_offsets(logdump, **values) if values else None
+    with open(logdump, "rb") as logfile:
+        if offsets is not None:
+            for offset in offsets:
+                logfile.seek(offset)
+                yield cast_log_type(load_entry(logfile.readline()))
+            return
+
+        for line in logfile:
+            if not line.strip():
+                continue
+            entry = load_entry(line)
+            if matches(entry, values):
+                yield cast_log_type(entry)
+
+
+def matches(entry: LogEntry, values: Dict[str, str]) -> bool:
+    """Check whether the entry has all given index values."""
+    entry_values = dict(zip(INDEX_KEYS, _index_values(entry)))
+    return all(entry_values[name] == value for name, value in values.items())
@@ -1,6 +1,7 @@
+import sys
 import datetime
-from typing import Union, ClassVar
-from dataclasses import dataclass, asdict
+from typing import Union, ClassVar, Callable, List
+from dataclasses import dataclass
 
 from json_coder import jsonify
 
@@ -15,25 +16,113 @@ MARK_END = "end"
 
 LOG_SUBTYPES = []
 
+# Event keys identifying subtypes and subtypes by the set of those keys
+# contained in an event, filled on demand.
+_SPECIAL_KEYS = []
+_SUBTYPE_DISPATCH = {}
+
+
+# Shared perf type tuples, there are only few distinct ones.
+_PERF_TYPES = {}
+
 
 class LogMeta(type):
     def __new__(cls, name, bases, attrs):
         new_cls = type.__new__(cls, name, bases, attrs)
+        new_cls._derivers = tuple((f, getattr(new_cls, "_compute_" + f)) for f in new_cls._derived_fields)
         if attrs["_special_keys"]:
             LOG_SUBTYPES.append(new_cls)
+            _SPECIAL_KEYS.extend(k for k in new_cls._special_keys if k not in _SPECIAL_KEYS)
+            _SUBTYPE_DISPATCH.clear()
         return new_cls
 
 
+# Errors raised while computing derived fields of malformed entries. These
+# are raised again when the field is accessed.
+_DERIVE_ERRORS = (KeyError, ValueError, TypeError, AttributeError)
+
+
 @jsonify("logentry")
 @dataclass
 class LogEntry(metaclass=LogMeta):
+    """Single log message.
+
+    Fields derived from data, such as context_id and x_pair, are computed
+    once on construction and stored in slots. Platforms are interned, as
+    there are only few of them. Context ids, xpairs and ids are shared with
+    other entries by the symbol table of the run grouping them, see
+    symbols.SymbolTable.intern_entry, and are released with the run.
+    """
+    __slots__ = ("timestamp", "data", "platform", "context_id", "x_pair", "id", "_raw", "_decode")
     _special_keys: ClassVar = tuple()  # ignore field for dataclasses
+    # derived fields, computed by the respective _compute_<name> method
+    _derived_fields: ClassVar = ("context_id", "x_pair", "id")
     timestamp: datetime.datetime
     data: dict
     platform: str
 
-    @property
-    def id(self):
+    def __post_init__(self):
+        if isinstance(self.platform, str):
+            self.platform = sys.intern(self.platform)
+        for name, compute in self._derivers:
+            try:
+                setattr(self, name, compute(self))
+            except _DERIVE_ERRORS:
+                pass
+
+    @classmethod
+    def lazy(cls, timestamp: datetime.datetime, raw: bytes, platform: str, decode: Callable):
+        """Create an entry that keeps its raw json data until it is accessed.
+
+        Args:
+            timestamp: Timestamp of the entry.
+            raw: Json encoded data of the entry.
+            platform: Platform the entry has been logged on.
+            decode: Function decoding the raw data.
+        """
+        entry = cls.__new__(cls)
+        entry.timestamp = timestamp
+        entry.platform = sys.intern(platform) if isinstance(platform, str) else platform
+        entry._raw = raw
+        entry._decode = decode
+        return entry
+
+    def __reduce__(self):
+        # derived fields are computed again instead of being pickled
+        try:
+            return (type(self).lazy, (self.timestamp, self._raw, self.platform, self._decode))
+        except AttributeError:
+            return (type(self), (self.timestamp, self.data, self.platform))
+
+    def __getattr__(self, name):
+        # only called for unset slots, which is the case for data of lazy
+        # entries before first access and their derived fields
+        if name == "data":
+            try:
+                raw = self._raw
+            except AttributeError:
+                pass
+            else:
+                self.data = self._decode(raw)
+                del self._raw, self._decode
+                return self.data
+        elif name in self._derived_fields:
+            value = getattr(self, "_compute_" + name)()
+            setattr(self, name, value)
+            return value
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def _compute_context_id(self):
+        return self.event.get("contextId", None)
+
+    def _compute_x_pair(self):
+        label_xpair = self.event.get("xPair", UNDEFINED_XPAIR)
+        if label_xpair == UNDEFINED_XPAIR:
+            return UNDEFINED_XPAIR
+        _, xpair = label_xpair.split("-")
+        return xpair
+
+    def _compute_id(self):
         return (self.context_id, self.x_pair)
 
     @property
@@ -54,20 +143,9 @@ class LogEntry(metaclass=LogMeta):
             raise NotImplementedError("Cannot match log data without defined identifying keys.")
         return all(key in event.event for key in cls._special_keys)
 
-    @property
-    def x_pair(self):
-        label_xpair = self.event.get("xPair", UNDEFINED_XPAIR)
-        if label_xpair == UNDEFINED_XPAIR:
-            return UNDEFINED_XPAIR
-        _, xpair = label_xpair.split("-")
-        return xpair
-
-    @property
-    def context_id(self):
-        return self.event.get("contextId", None)
-
 
 class RequestLog(LogEntry):
+    __slots__ = ()
     _special_keys: ClassVar = ("request",)
 
     @property
@@ -76,7 +154,9 @@ class RequestLog(LogEntry):
 
 
 class PerfLog(LogEntry):
+    __slots__ = ("perf_type", "perf_type_data")
     _special_keys: ClassVar = ("perf",)
+    _derived_fields: ClassVar = LogEntry._derived_fields + ("perf_type", "perf_type_data")
 
     @property
     def perf(self):
@@ -86,13 +166,12 @@ class PerfLog(LogEntry):
     def type(self):
         return self.perf["entryType"]
 
-    @property
-    def perf_type(self):
+    def _compute_perf_type(self):
         mark_type, perf_type, *_ = self.perf["mark"].split(":")
-        return (mark_type, perf_type)
+        key = (mark_type, perf_type)
+        return _PERF_TYPES.setdefault(key, key)
 
-    @property
-    def perf_type_data(self):
+    def _compute_perf_type_data(self):
         perfs = self.perf["mark"].split(":")
         if len(perfs) < 3:
             return ""
@@ -122,6 +201,7 @@ class PerfLog(LogEntry):
 
 
 class ColdstartLog(LogEntry):
+    __slots__ = ()
     _special_keys: ClassVar = ("coldstart",)
 
     @property
@@ -130,14 +210,14 @@ class ColdstartLog(LogEntry):
 
 
 class ArtilleryLog(LogEntry):
+    __slots__ = ()
     _special_keys: ClassVar = ("url", "type")
 
     @property
     def called_id(self):
-        return super().id
+        return (self.context_id, self.x_pair)
 
-    @property
-    def id(self):
+    def _compute_id(self):
         return (self.context_id, UNDEFINED_XPAIR)
 
     @property
@@ -149,9 +229,41 @@ class ArtilleryLog(LogEntry):
         return self.event["url"]
 
 
-def cast_log_type(entry: LogEntry) -> Union[RequestLog, PerfLog]:
+def _special_keys_subtype(keys: frozenset) -> type:
+    """Get the first subtype whose special keys are all contained in keys."""
     for subtype in LOG_SUBTYPES:
-        if subtype.match(entry):
-            return subtype(**asdict(entry))
-    print(f"Unknown log type: {entry}")
-    return entry
+        if all(key in keys for key in subtype._special_keys):
+            return subtype
+    return None
+
+
+def log_type(entry: LogEntry) -> type:
+    """Get the log subtype matching the given entry or None if the entry does
+    not match any subtype."""
+    event = entry.event
+    keys = frozenset(k for k in _SPECIAL_KEYS if k in event)
+    try:
+        return _SUBTYPE_DISPATCH[keys]
+    except KeyError:
+        subtype = _SUBTYPE_DISPATCH[keys] = _special_keys_subtype(keys)
+        return subtype
+
+
+def cast_log_type(entry: LogEntry) -> Union[RequestLog, PerfLog]:
+    """Create an entry of the matching subtype.
+
+    The data of the entry is shared with the created entry instead of being
+    copied.
+    """
+    subtype = log_type(entry)
+    if subtype is None:
+        print(f"Unknown log type: {entry}")
+        return entry
+    if type(entry) is subtype:
+        return entry
+    return subtype(entry.timestamp, entry.data, entry.platform)
+
+
+def cast_log_types(entries: List[LogEntry]) -> List[Union[RequestLog, PerfLog]]:
+    """Cast all given entries to their matching subtype."""
+    return [cast_log_type(e) for e in entries]
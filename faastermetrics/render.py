@@ -0,0 +1,51 @@
+"""
+Scheduling of independent figures in a process pool.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, List
+
+
+class RenderScheduler:
+    """Render figures in worker processes while the analysis continues.
+
+    Figures are submitted as a render function and its arguments, which
+    must be picklable and only contain precomputed data, eg durations by
+    function instead of entries, so that workers do not repeat the
+    analysis. With a single job figures are rendered immediately in the
+    current process.
+
+    Args:
+        jobs: Number of worker processes.
+    """
+
+    def __init__(self, jobs: int = 1):
+        self.jobs = jobs
+        self._executor = ProcessPoolExecutor(jobs) if jobs > 1 else None
+        self._futures: List[Future] = []
+
+    def submit(self, render: Callable, *args, **kwargs):
+        """Render a figure, in a worker process if there are multiple jobs."""
+        if self._executor is None:
+            render(*args, **kwargs)
+        else:
+            self._futures.append(self._executor.submit(render, *args, **kwargs))
+
+    def wait(self):
+        """Wait until all submitted figures are rendered, raising the first
+        error of a render function."""
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
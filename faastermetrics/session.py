@@ -0,0 +1,90 @@
+"""
+Analysis sessions sharing loaded entries and derived data between analyses.
+"""
+import pathlib
+from functools import cached_property
+from typing import Dict, List
+
+import networkx as nx
+
+from .logentry import LogEntry
+from .calls import Call, create_requestgroups, calls_by_id, platform_transport_times
+from .graph import calls_to_function_graph, add_default_metadata
+from .helper import group_by
+from .table import EntryTable
+from .symbols import SymbolTable
+
+
+class AnalysisSession:
+    """Load a dump once and compute derived data lazily when first accessed.
+
+    Every stage is computed at most once per session and shared by all
+    analyses using the session, eg plots and exports of run_analysis.py.
+    Ids of calls are coded in a symbol table owned by the session.
+    Stages must not be modified, copy them first, eg the function graph
+    before styling it.
+
+    Args:
+        logdump: Path to a dump in any format supported by load_logs.
+        lazy: Decode entry data of columnar dumps on first access.
+    """
+
+    def __init__(self, logdump: pathlib.Path = None, lazy: bool = False):
+        self.logdump = logdump
+        self.lazy = lazy
+        self.symbols = SymbolTable()
+
+    @classmethod
+    def from_entries(cls, entries: List[LogEntry]) -> "AnalysisSession":
+        """Create a session of already loaded entries."""
+        session = cls()
+        session.entries = entries
+        return session
+
+    @cached_property
+    def entries(self) -> List[LogEntry]:
+        from . import load_logs
+
+        if self.logdump is None:
+            raise ValueError("Session has neither a dump nor entries.")
+        return load_logs(self.logdump, lazy=self.lazy)
+
+    @cached_property
+    def calls(self) -> List[Call]:
+        """Calls as created by create_requestgroups."""
+        return create_requestgroups(self.entries, symbols=self.symbols)
+
+    @cached_property
+    def call_index(self) -> Dict[int, List[Call]]:
+        """Calls by the code of their id in the symbols of the session, see
+        calls_by_id."""
+        return calls_by_id(self.calls, self.symbols)
+
+    @cached_property
+    def function_graph(self) -> nx.DiGraph:
+        """Function graph with default metadata."""
+        return add_default_metadata(calls_to_function_graph(self.calls))
+
+    @cached_property
+    def table(self) -> EntryTable:
+        """Table of all entries."""
+        return EntryTable.from_entries(self.entries)
+
+    @cached_property
+    def platform_tables(self) -> Dict[str, EntryTable]:
+        """Tables of entries by platform."""
+        return {platform: self.table.take(rows) for platform, rows in self.table.group_by("platform").items()}
+
+    @cached_property
+    def function_durations(self) -> Dict[str, List[float]]:
+        """Durations of calls in ms by function."""
+        return {
+            function: [c.duration.total_seconds() * 1000 for c in calls if c.duration is not None]
+            for function, calls in group_by(self.calls, lambda c: c.function).items()
+        }
+
+    @cached_property
+    def transport_times(self) -> Dict[tuple, List[float]]:
+        """Transport times in ms by origin and destination platform, see
+        platform_transport_times."""
+        return platform_transport_times(self.calls)
@@ -0,0 +1,476 @@
+"""
+Mergeable quantile sketches of call durations with bounded memory.
+
+Sketches follow DDSketch: values are counted in logarithmically sized bins,
+so that every quantile is estimated with a bounded relative error. Sketches
+with the same accuracy can be merged, eg sketches of different logfiles or
+of separate processes.
+"""
+import math
+import heapq
+import datetime
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .logentry import LogEntry, UNDEFINED_XPAIR
+from .calls import Call, CallStream, DEFAULT_LATENESS, _normalized_name
+
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Maximum number of bins of each sign, lowest bins are merged beyond that.
+DEFAULT_MAX_BINS = 2048
+
+# Values with a smaller magnitude are counted as zero.
+MIN_VALUE = 1e-9
+
+# Time by which calls on both ends of an edge may be added apart.
+DEFAULT_HORIZON = datetime.timedelta(minutes=1)
+
+
+class _DenseStore:
+    """Counts of consecutive bin indices starting at an offset."""
+
+    def __init__(self, max_bins: int):
+        self.max_bins = max_bins
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, indices: np.ndarray, counts: np.ndarray = None):
+        if not len(indices):
+            return
+        self._extend(int(indices.min()), int(indices.max()))
+        added = np.bincount(indices - self.offset, weights=counts, minlength=len(self.counts))
+        self.counts += added.astype(np.int64)
+        self._collapse()
+
+    def merge(self, other: "_DenseStore"):
+        if not len(other.counts):
+            return
+        self._extend(other.offset, other.offset + len(other.counts) - 1)
+        start = other.offset - self.offset
+        self.counts[start:start + len(other.counts)] += other.counts
+        self._collapse()
+
+    def _extend(self, low: int, high: int):
+        if not len(self.counts):
+            self.offset = low
+            self.counts = np.zeros(high - low + 1, dtype=np.int64)
+            return
+        new_offset = min(low, self.offset)
+        new_end = max(high + 1, self.offset + len(self.counts))
+        if new_offset == self.offset and new_end == self.offset + len(self.counts):
+            return
+        counts = np.zeros(new_end - new_offset, dtype=np.int64)
+        start = self.offset - new_offset
+        counts[start:start + len(self.counts)] = self.counts
+        self.offset = new_offset
+        self.counts = counts
+
+    def _collapse(self):
+        """Merge the lowest bins, keeping accuracy of high quantiles."""
+        excess = len(self.counts) - self.max_bins
+        if excess > 0:
+            self.counts[excess] += self.counts[:excess].sum()
+            self.counts = self.counts[excess:].copy()
+            self.offset += excess
+
+    def items(self) -> List[tuple]:
+        """Get (index, count) of bins with values in ascending index order."""
+        found = np.flatnonzero(self.counts)
+        return list(zip((found + self.offset).tolist(), self.counts[found].tolist()))
+
+    def to_dict(self) -> dict:
+        return {"offset": self.offset, "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: dict, max_bins: int) -> "_DenseStore":
+        store = cls(max_bins)
+        store.offset = data["offset"]
+        store.counts = np.array(data["counts"], dtype=np.int64)
+        return store
+
+
+class QuantileSketch:
+    """Quantile sketch with a bounded relative error.
+
+    Args:
+        relative_accuracy: Maximum relative error of estimated quantiles.
+        max_bins: Maximum number of bins of positive and of negative values.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, max_bins: int = DEFAULT_MAX_BINS):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = _DenseStore(max_bins)
+        self.negative = _DenseStore(max_bins)
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _indices(self, values: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value: float):
+        self.add_many([value])
+
+    def add_many(self, values: Iterable[float]):
+        """Add values, converted to a float64 array at once."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return
+        self.positive.add(self._indices(values[values > MIN_VALUE]))
+        self.negative.add(self._indices(-values[values < -MIN_VALUE]))
+        self.zero_count += int(np.count_nonzero(np.abs(values) <= MIN_VALUE))
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Add all values of the other sketch to this sketch."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(
+                f"Cannot merge sketches with accuracy {self.relative_accuracy} and {other.relative_accuracy}")
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def scaled(self, factor: float) -> "QuantileSketch":
+        """Get a sketch of all values multiplied by a positive factor.
+
+        Values of every bin are moved to the bin of their scaled estimate,
+        adding at most the error of another bin.
+        """
+        if factor <= 0:
+            raise ValueError(f"Factor {factor} is not positive")
+        sketch = QuantileSketch(self.relative_accuracy, self.max_bins)
+        for store, scaled_store in ((self.positive, sketch.positive), (self.negative, sketch.negative)):
+            items = store.items()
+            if items:
+                indices, counts = (np.array(v) for v in zip(*items))
+                values = 2 * self.gamma ** indices.astype(np.float64) / (self.gamma + 1) * factor
+                scaled_store.add(self._indices(values), counts)
+        sketch.zero_count = self.zero_count
+        sketch.count = self.count
+        sketch.sum = self.sum * factor
+        sketch.min = self.min * factor
+        sketch.max = self.max * factor
+        return sketch
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else math.nan
+
+    def quantile(self, q: float) -> float:
+        """Estimate the value at quantile q in [0, 1], NaN if the sketch is
+        empty."""
+        if not 0 <= q <= 1:
+            raise ValueError(f"Quantile {q} not in [0, 1]")
+        if not self.count:
+            return math.nan
+
+        rank = q * (self.count - 1)
+        seen = 0
+        # negative values in ascending order have descending bin indices
+        for index, count in reversed(self.negative.items()):
+            seen += count
+            if seen > rank:
+                return self._clamp(-self._value(index))
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for index, count in self.positive.items():
+            seen += count
+            if seen > rank:
+                return self._clamp(self._value(index))
+        return self.max
+
+    def _clamp(self, value: float) -> float:
+        return min(max(value, self.min), self.max)
+
+    def to_dict(self) -> dict:
+        """Get a json serializable representation of the sketch."""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_bins": self.max_bins,
+            "positive": self.positive.to_dict(),
+            "negative": self.negative.to_dict(),
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"], data["max_bins"])
+        sketch.positive = _DenseStore.from_dict(data["positive"], sketch.max_bins)
+        sketch.negative = _DenseStore.from_dict(data["negative"], sketch.max_bins)
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+
+def _to_ms(duration: datetime.timedelta) -> float:
+    return duration.total_seconds() * 1000
+
+
+def _call_name(function: str, subcall_function: str = None) -> str:
+    """Name a call like create_requestgroups, given the function of the call
+    and of the subcall referring to it, if it has been seen."""
+    names = {function} if subcall_function is None else {function, subcall_function}
+    try:
+        return _normalized_name(names)
+    except ValueError:
+        return function
+
+
+def _sketch(sketches: dict, key, relative_accuracy: float) -> QuantileSketch:
+    sketch = sketches.get(key)
+    if sketch is None:
+        sketch = sketches[key] = QuantileSketch(relative_accuracy)
+    return sketch
+
+
+class LatencySketches:
+    """Sketches of rpcIn durations by function and of rpcOut and transport
+    durations by edge between functions, fed with calls as they are built.
+
+    Functions are named like in create_requestgroups. The name of a call
+    depends on the subcall referring to it, so durations are only added
+    once the calls on both ends of an edge have been seen. Transport
+    durations are computed like graph.edge_transport_duration.
+
+    Calls and subcalls waiting for each other are flushed as unmatched once
+    calls ending more than the horizon after them have been added. So only
+    entries and calls within the lateness and the horizon before the latest
+    ones are kept, if entries of all platforms are added in about timestamp
+    order, eg from iter_logdir with interleave. Entries in file order, eg
+    of dumps, need a horizon of None, which keeps waiting calls until
+    finish.
+
+    Sketches of any subsets of entries can be merged, pending calls of both
+    are matched when merging. Call finish once all entries have been added.
+
+    Args:
+        relative_accuracy: Maximum relative error of estimated quantiles.
+        lateness: Time by which entries of a call may be out of order, see
+            calls.CallStream.
+        horizon: Time by which calls on both ends of an edge may be added
+            apart, or None.
+    """
+
+    def __init__(
+            self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+            lateness: datetime.timedelta = DEFAULT_LATENESS, horizon: Optional[datetime.timedelta] = DEFAULT_HORIZON,
+    ):
+        self.relative_accuracy = relative_accuracy
+        self.horizon = horizon
+        self.rpc_in: Dict[str, QuantileSketch] = {}
+        self.rpc_out: Dict[tuple, QuantileSketch] = {}
+        self.transport: Dict[tuple, QuantileSketch] = {}
+        # infos of calls waiting for the subcall referring to them by id
+        self._calls: Dict[tuple, tuple] = {}
+        # subcalls waiting for their call by id of the call
+        self._subcalls: Dict[tuple, tuple] = {}
+        # end times and ids of waiting calls and subcalls, as heap
+        self._waiting: List[tuple] = []
+        # latest end time of added calls
+        self._watermark = None
+        # function names of calls by id, kept while their subcalls are not
+        # matched
+        self._names: Dict[tuple, str] = {}
+        self._unmatched: Dict[tuple, int] = defaultdict(int)
+        # edges waiting for the name of their calling call by id of the call
+        self._edges: Dict[tuple, list] = defaultdict(list)
+        # durations in ms not yet added to sketches by sketches name and key
+        self._added = defaultdict(list)
+        self._stream = CallStream(lateness)
+
+    def add_entries(self, entries: Iterable[LogEntry]):
+        """Add calls finished by the entries, which can be the next batch of
+        a stream."""
+        self.add_calls(self._stream.add(entries))
+
+    def add_calls(self, calls: Iterable[Call]):
+        """Add durations of calls and their subcalls."""
+        for call in calls:
+            self._add_call(call)
+        self._expire()
+        self._flush()
+
+    def _call_info(self, call: Call) -> tuple:
+        """Get the function, duration and anything else added once the call
+        has been named."""
+        return (call.function, call.duration)
+
+    def _add_node(self, name: str, info: tuple):
+        """Add a call once it has been named."""
+        duration = info[1]
+        if duration is not None:
+            self._added[("rpc_in", name)].append(_to_ms(duration))
+
+    def _record_edge(self, caller: str, name: str, duration, transport):
+        """Add a subcall once both calls have been named."""
+        edge = (caller, name)
+        if duration is not None:
+            self._added[("rpc_out", edge)].append(_to_ms(duration))
+        if transport is not None:
+            self._added[("transport", edge)].append(_to_ms(transport))
+
+    def _add_call(self, call: Call):
+        end = max((e.timestamp for e in call.entries), default=None)
+        if end is not None and (self._watermark is None or end > self._watermark):
+            self._watermark = end
+
+        for subcall in call.calls:
+            self._unmatched[call.id] += 1
+            self._add_subcall(subcall.id, (call.id, subcall.function, subcall.duration), end)
+
+        info = self._call_info(call)
+        if call.id[1] == UNDEFINED_XPAIR:
+            # not called by another function
+            self._resolve(call.id, _call_name(call.function), info)
+        else:
+            self._add_called(call.id, info, end)
+
+    def _wait(self, id: tuple, end: Optional[datetime.datetime]):
+        if end is not None:
+            heapq.heappush(self._waiting, (end, id))
+
+    def _add_subcall(self, id: tuple, subcall: tuple, end: Optional[datetime.datetime]):
+        info = self._calls.pop(id, None)
+        if info is None:
+            self._subcalls[id] = subcall
+            self._wait(id, end)
+        else:
+            self._match(id, subcall, info)
+
+    def _add_called(self, id: tuple, info: tuple, end: Optional[datetime.datetime]):
+        subcall = self._subcalls.pop(id, None)
+        if subcall is None:
+            self._calls[id] = info
+            self._wait(id, end)
+        else:
+            self._match(id, subcall, info)
+
+    def _match(self, id: tuple, subcall: tuple, info: tuple):
+        """Add a call and the subcall referring to it."""
+        caller_id, subcall_function, subcall_duration = subcall
+        function, duration = info[:2]
+        name = _call_name(function, subcall_function)
+        self._resolve(id, name, info)
+        transport = subcall_duration - duration if duration is not None else None
+        self._add_edge(caller_id, name, subcall_duration, transport)
+
+    def _resolve(self, id: tuple, name: str, info: tuple):
+        """Set the function name of a call."""
+        self._add_node(name, info)
+        self._names[id] = name
+        for edge in self._edges.pop(id, []):
+            self._record_edge(name, *edge)
+        self._release(id)
+
+    def _add_edge(self, caller_id: tuple, name: str, duration, transport):
+        if caller_id in self._names:
+            self._record_edge(self._names[caller_id], name, duration, transport)
+        else:
+            self._edges[caller_id].append((name, duration, transport))
+        self._unmatched[caller_id] -= 1
+        self._release(caller_id)
+
+    def _release(self, id: tuple):
+        """Forget the name of the call once all its subcalls are matched."""
+        if id in self._names and not self._unmatched[id]:
+            del self._names[id]
+            del self._unmatched[id]
+
+    def _flush(self):
+        """Add recorded durations to their sketches at once."""
+        for (name, key), durations in self._added.items():
+            _sketch(getattr(self, name), key, self.relative_accuracy).add_many(durations)
+        self._added.clear()
+
+    def _flush_unmatched(self, id: tuple):
+        """Add a waiting call or subcall without the other end."""
+        info = self._calls.pop(id, None)
+        if info is not None:
+            self._resolve(id, _call_name(info[0]), info)
+        subcall = self._subcalls.pop(id, None)
+        if subcall is not None:
+            caller_id, subcall_function, duration = subcall
+            self._add_edge(caller_id, _call_name(subcall_function), duration, None)
+
+    def _expire(self):
+        """Flush calls and subcalls waiting for longer than the horizon."""
+        if self.horizon is None or self._watermark is None:
+            return
+        expired = self._watermark - self.horizon
+        waiting = self._waiting
+        while waiting and waiting[0][0] < expired:
+            _, id = heapq.heappop(waiting)
+            # matched ids have been removed already
+            self._flush_unmatched(id)
+
+    def finish(self):
+        """Add remaining calls of added entries and calls and subcalls that
+        have not been matched, since the other end has not been logged."""
+        for call in self._stream.finish():
+            self._add_call(call)
+        for id in [*self._calls, *self._subcalls]:
+            self._flush_unmatched(id)
+        self._waiting = []
+        self._flush()
+
+    @property
+    def num_pending(self) -> int:
+        """Number of unfinished calls and of calls and subcalls that have not
+        been matched yet."""
+        return len(self._calls) + len(self._subcalls) + self._stream.num_pending
+
+    def merge(self, other: "LatencySketches") -> "LatencySketches":
+        """Add the sketches and pending calls of the other sketches, which
+        must not contain the same entries."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(
+                f"Cannot merge sketches with accuracy {self.relative_accuracy} and {other.relative_accuracy}")
+        for name in ("rpc_in", "rpc_out", "transport"):
+            sketches = getattr(self, name)
+            for key, sketch in getattr(other, name).items():
+                _sketch(sketches, key, self.relative_accuracy).merge(sketch)
+
+        self._names.update(other._names)
+        for id, unmatched in other._unmatched.items():
+            self._unmatched[id] += unmatched
+        for id, edges in other._edges.items():
+            self._edges[id] += edges
+        ends = {id: end for end, id in other._waiting}
+        for id, info in other._calls.items():
+            self._add_called(id, info, ends.get(id))
+        for id, subcall in other._subcalls.items():
+            self._add_subcall(id, subcall, ends.get(id))
+        if other._watermark is not None and (self._watermark is None or other._watermark > self._watermark):
+            self._watermark = other._watermark
+        # entries of calls split between both
+        self.add_entries(other._stream.entries())
+        return self
@@ -0,0 +1,312 @@
+"""
+Mergeable summaries of experiment logs for analyses split into shards.
+
+Summaries of separate shards of the entries can be computed in separate
+processes or on separate hosts and merged afterwards, so that no process
+has to load all entries.
+"""
+import re
+import mmap
+import heapq
+import pickle
+import pathlib
+import datetime
+import itertools
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+import numpy as np
+import networkx as nx
+
+from .logentry import LogEntry, UNDEFINED_XPAIR, cast_log_type
+from .calls import Call, DEFAULT_LATENESS, _shard
+from .sketch import LatencySketches, QuantileSketch, DEFAULT_HORIZON, DEFAULT_RELATIVE_ACCURACY
+from .graph import SUMMARY_MAX_XPAIRS
+from .jsonbackend import get_backend
+from . import columnar, jsonl
+
+
+SUMMARY_VERSION = 2
+
+SUMMARY_MAGIC = b"FMSUMMARY\n"
+
+# Number of entries added to summaries at once.
+BATCH_SIZE = 10000
+
+
+def is_summary(path: pathlib.Path) -> bool:
+    """Check whether the file is a summary instead of a log dump."""
+    with open(path, "rb") as sfile:
+        return sfile.read(len(SUMMARY_MAGIC)) == SUMMARY_MAGIC
+
+
+def _update_range(ranges: dict, key, start, end):
+    if start is None or end is None:
+        return
+    current = ranges.get(key)
+    if current is not None:
+        start, end = min(start, current[0]), max(end, current[1])
+    ranges[key] = (start, end)
+
+
+class AnalysisSummary(LatencySketches):
+    """Counts, platforms, time ranges and duration sketches of functions and
+    of edges between them.
+
+    Functions are named like in create_requestgroups and the summary
+    contains the topology of the function graph, see to_function_graph.
+    Summaries of any subsets of entries can be merged, call finish once all
+    entries have been added.
+
+    Args:
+        relative_accuracy: Maximum relative error of estimated quantiles.
+        lateness: Time by which entries of a call may be out of order.
+        horizon: Time by which calls on both ends of an edge may be added
+            apart, see sketch.LatencySketches.
+    """
+
+    def __init__(
+            self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+            lateness: datetime.timedelta = DEFAULT_LATENESS, horizon: Optional[datetime.timedelta] = DEFAULT_HORIZON,
+    ):
+        super().__init__(relative_accuracy, lateness, horizon)
+        self.version = SUMMARY_VERSION
+        self.num_entries = 0
+        self.num_calls: Dict[str, int] = Counter()
+        self.edge_calls: Dict[tuple, int] = Counter()
+        self.platforms: Dict[str, set] = defaultdict(set)
+        # example xpairs and UNDEFINED_XPAIR if calls without xpair exist
+        self.xpairs: Dict[str, set] = defaultdict(set)
+        # first and last timestamp of entries of all calls by function
+        self.time_ranges: Dict[str, tuple] = {}
+        # first and last timestamp of all entries
+        self.time_range: tuple = None
+
+    def add_entries(self, entries: Iterable[LogEntry]):
+        entries = list(entries)
+        if entries:
+            self.num_entries += len(entries)
+            timestamps = [e.timestamp for e in entries]
+            self._update_time_range(min(timestamps), max(timestamps))
+        super().add_entries(entries)
+
+    def _update_time_range(self, start, end):
+        if self.time_range is not None:
+            start, end = min(start, self.time_range[0]), max(end, self.time_range[1])
+        self.time_range = (start, end)
+
+    def _call_info(self, call: Call) -> tuple:
+        platforms = frozenset(e.platform for e in call.entries)
+        timestamps = [e.timestamp for e in call.entries]
+        start, end = (min(timestamps), max(timestamps)) if timestamps else (None, None)
+        return (call.function, call.duration, platforms, call.id[1], start, end)
+
+    def _add_node(self, name: str, info: tuple):
+        super()._add_node(name, info)
+        _, _, platforms, xpair, start, end = info
+        self.num_calls[name] += 1
+        self.platforms[name].update(platforms)
+        xpairs = self.xpairs[name]
+        if xpair == UNDEFINED_XPAIR or len(xpairs - {UNDEFINED_XPAIR}) < SUMMARY_MAX_XPAIRS:
+            xpairs.add(xpair)
+        _update_range(self.time_ranges, name, start, end)
+
+    def _record_edge(self, caller: str, name: str, duration, transport):
+        super()._record_edge(caller, name, duration, transport)
+        self.edge_calls[(caller, name)] += 1
+
+    def merge(self, other: "AnalysisSummary") -> "AnalysisSummary":
+        """Add the other summary, which must not contain the same entries."""
+        self.num_entries += other.num_entries
+        if other.time_range is not None:
+            self._update_time_range(*other.time_range)
+        self.num_calls.update(other.num_calls)
+        self.edge_calls.update(other.edge_calls)
+        for function, platforms in other.platforms.items():
+            self.platforms[function].update(platforms)
+        for function, xpairs in other.xpairs.items():
+            merged = self.xpairs[function]
+            merged.update(xpairs & {UNDEFINED_XPAIR})
+            for xpair in sorted(xpairs - {UNDEFINED_XPAIR}):
+                if len(merged - {UNDEFINED_XPAIR}) >= SUMMARY_MAX_XPAIRS:
+                    break
+                merged.add(xpair)
+        for function, (start, end) in other.time_ranges.items():
+            _update_range(self.time_ranges, function, start, end)
+        super().merge(other)
+        return self
+
+    @property
+    def functions(self) -> list:
+        """Functions of calls and subcalls."""
+        functions = dict.fromkeys(self.num_calls)
+        for edge in self.edge_calls:
+            functions.update(dict.fromkeys(edge))
+        return list(functions)
+
+    def function_platform(self, function: str) -> str:
+        """Get the platform of a function like graph.node_platform."""
+        platforms = self.platforms.get(function, set())
+        if len(platforms) != 1:
+            raise RuntimeError(f"{function} has wrong platform number: {platforms}")
+        platform, = platforms
+        return platform
+
+    def to_function_graph(self) -> nx.DiGraph:
+        """Create a summary function graph like graph.calls_to_summary_graph."""
+        graph = nx.DiGraph(summary=True)
+        for function in self.functions:
+            graph.add_node(
+                function,
+                num_calls=self.num_calls.get(function, 0),
+                platforms=set(self.platforms.get(function, ())),
+                xpairs=set(self.xpairs.get(function, ())),
+                rpc_in_sketch=self.rpc_in.get(function, QuantileSketch(self.relative_accuracy)),
+            )
+        for edge, num_calls in self.edge_calls.items():
+            graph.add_edge(
+                *edge,
+                num_calls=num_calls,
+                rpc_out_sketch=self.rpc_out.get(edge, QuantileSketch(self.relative_accuracy)),
+                transport_sketch=self.transport.get(edge, QuantileSketch(self.relative_accuracy)),
+            )
+        return graph
+
+    def dump(self, path: pathlib.Path):
+        """Write the summary, including calls that are not matched yet."""
+        with open(path, "wb") as sfile:
+            sfile.write(SUMMARY_MAGIC)
+            pickle.dump(self, sfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "AnalysisSummary":
+        with open(path, "rb") as sfile:
+            if sfile.read(len(SUMMARY_MAGIC)) != SUMMARY_MAGIC:
+                raise ValueError(f"{path} is not a summary.")
+            summary = pickle.load(sfile)
+        if summary.version != SUMMARY_VERSION:
+            raise ValueError(f"Unsupported summary version {summary.version}, expected {SUMMARY_VERSION}.")
+        return summary
+
+
+# Start of an entry in json dumps, which can only occur outside of strings.
+_ENTRY_START = re.compile(rb'\{\s*"__logentry__"\s*:')
+
+_ENTRY_TAIL = b", \t\r\n]"
+
+# Context id of an encoded entry without escape sequences.
+_CONTEXT_ID = re.compile(rb'"contextId"\s*:\s*"([^"\\]*)"')
+
+
+def _iter_encoded(logdump: pathlib.Path) -> Iterator[bytes]:
+    """Iterate over encoded entries of a json or jsonl dump without decoding
+    them."""
+    with open(logdump, "rb") as dfile:
+        if jsonl.is_jsonl(logdump):
+            for line in dfile:
+                if line.strip():
+                    yield line
+            return
+
+        with mmap.mmap(dfile.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if not buf[:64].lstrip().startswith(b"["):
+                raise ValueError(f"{logdump} is not a json list of log entries.")
+            start = None
+            for match in _ENTRY_START.finditer(buf):
+                if start is not None:
+                    yield buf[start:match.start()].rstrip(_ENTRY_TAIL)
+                start = match.start()
+            if start is not None:
+                yield buf[start:].rstrip(_ENTRY_TAIL)
+
+
+def _select_shard(num_shards: int, index: int) -> Callable[[bytes], bool]:
+    """Select raw logfile messages whose context id is in the shard.
+
+    Messages with escape sequences or without a single context id are
+    selected, their entries are checked once decoded.
+    """
+    from . import _CONTROL_BYTES
+
+    def select(message: bytes) -> bool:
+        if b"\\" in message:
+            return True
+        context_ids = _CONTEXT_ID.findall(message)
+        if len(context_ids) != 1:
+            return True
+        # decoded like messages without escape sequences in _parse_message
+        context_id = context_ids[0].translate(None, _CONTROL_BYTES).decode("latin-1")
+        return _shard(context_id, num_shards) == index
+
+    return select
+
+
+def iter_shard(data: pathlib.Path, num_shards: int, index: int, backend: str = None) -> Iterator[LogEntry]:
+    """Iterate over entries of a single shard of a log directory or dump.
+
+    Entries are split by a hash of their context id like in
+    calls.build_calls_parallel, so that calls are never split between
+    shards. Only entries of the shard are decoded. Entries of log
+    directories are interleaved by timestamp like in iter_logdir, entries
+    of dumps are in the order of the dump.
+
+    Args:
+        data: Log directory or dump.
+        num_shards: Number of shards.
+        index: Index of the shard in range(num_shards).
+        backend: Name of the json backend used for decoding entries.
+    """
+    from . import list_logfiles, iter_logfile, _timestamp
+
+    if not 0 <= index < num_shards:
+        raise ValueError(f"Shard {index} not in range of {num_shards} shards.")
+
+    if data.is_dir():
+        select = _select_shard(num_shards, index)
+        logfiles = [iter_logfile(path, backend=backend, select=select) for path in sorted(list_logfiles(data))]
+        for entry in heapq.merge(*logfiles, key=_timestamp):
+            if _shard(entry.context_id, num_shards) == index:
+                yield entry
+        return
+
+    if columnar.is_columnar(data):
+        codes, categories = columnar.load_categorical(data, "context_id")
+        # shards by code, the last one of missing context ids with code -1
+        shards = np.array([_shard(c, num_shards) for c in [*categories.tolist(), None]])
+        yield from columnar.iter_entries(data, backend=backend, rows=np.flatnonzero(shards[codes] == index))
+        return
+
+    load_entry = get_backend(backend).load_entry
+    for raw in _iter_encoded(data):
+        context_ids = _CONTEXT_ID.findall(raw)
+        if len(context_ids) == 1:
+            if _shard(context_ids[0].decode("utf-8"), num_shards) == index:
+                yield cast_log_type(load_entry(raw))
+            continue
+        # escaped, missing or ambiguous context id
+        entry = cast_log_type(load_entry(raw))
+        if _shard(entry.context_id, num_shards) == index:
+            yield entry
+
+
+def summarize(
+        entries: Iterable[LogEntry], batch_size: int = BATCH_SIZE,
+        horizon: Optional[datetime.timedelta] = DEFAULT_HORIZON,
+) -> AnalysisSummary:
+    """Create the summary of a stream of entries without finishing it, so
+    that it can still be merged with summaries of other entries.
+
+    Args:
+        entries: Log entries in about timestamp order, or any order with a
+            horizon of None.
+        batch_size: Number of entries added at once.
+        horizon: See sketch.LatencySketches.
+    """
+    summary = AnalysisSummary(horizon=horizon)
+    entries = iter(entries)
+    while True:
+        batch = list(itertools.islice(entries, batch_size))
+        if not batch:
+            break
+        summary.add_entries(batch)
+    return summary
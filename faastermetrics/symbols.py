@@ -0,0 +1,58 @@
+"""
+Interning of values shared by many log entries and calls, such as context
+ids, xpairs and platforms.
+"""
+from typing import Any, Dict, List
+
+
+class SymbolTable:
+    """Map hashable values to small integer codes.
+
+    Equal values share a single code and a single stored object, so that
+    entries referring to the same value do not keep separate copies.
+
+    There is no global table: every run grouping entries into calls, such
+    as an AnalysisSession, a CallIndex or a single build_calls call, owns its
+    table, which is released together with the run and its calls. Codes are
+    only valid inside of the table that created them.
+    """
+
+    def __init__(self):
+        self._codes: Dict[Any, int] = {}
+        self._values: List[Any] = []
+
+    def intern(self, value: Any) -> int:
+        """Get the code of the value, adding it if it is new."""
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._values)
+            self._values.append(value)
+        return code
+
+    def value(self, code: int) -> Any:
+        """Get the value of the given code."""
+        return self._values[code]
+
+    def canonical(self, value: Any) -> Any:
+        """Get the stored object equal to the value."""
+        return self._values[self.intern(value)]
+
+    def intern_id(self, id: tuple) -> int:
+        """Get the code of an id, storing its parts only once."""
+        return self.intern(tuple(self.canonical(part) for part in id))
+
+    def intern_entry(self, entry) -> int:
+        """Replace the platform, context id, xpair and id of the entry by the
+        stored objects and get the code of its id."""
+        entry.platform = self.canonical(entry.platform)
+        entry.context_id = self.canonical(entry.context_id)
+        entry.x_pair = self.canonical(entry.x_pair)
+        code = self.intern_id(entry.id)
+        entry.id = self._values[code]
+        return code
+
+    def __contains__(self, value: Any) -> bool:
+        return value in self._codes
+
+    def __len__(self):
+        return len(self._values)
@@ -0,0 +1,224 @@
+"""
+Log entries stored as NumPy columns for vectorized analyses.
+"""
+import pathlib
+import datetime
+from array import array
+from typing import Any, Dict, Iterable, Union
+
+import numpy as np
+
+from .logentry import LogEntry, UNDEFINED_XPAIR
+from .columnar import (
+    CATEGORICAL_COLUMNS as ENTRY_COLUMNS, _Categorical, _entry_columns, _perf_duration, _check_version, _load_categories,
+)
+from . import columnar
+
+
+# Categorical columns of dumps and the xpair column parsed like
+# LogEntry.x_pair.
+CATEGORICAL_COLUMNS = ENTRY_COLUMNS + ("x_pair",)
+
+NUMERIC_COLUMNS = ("timestamp", "perf_duration")
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MILLISECOND = datetime.timedelta(milliseconds=1)
+
+
+def _parse_xpair(label_xpair: str) -> str:
+    if label_xpair == UNDEFINED_XPAIR:
+        return UNDEFINED_XPAIR
+    return label_xpair.partition("-")[2]
+
+
+def _parse_xpairs(categories: np.ndarray) -> tuple:
+    """Get codes mapping xpair categories to parsed x_pair categories.
+
+    Missing xpairs are mapped to UNDEFINED_XPAIR, which is the last code.
+    """
+    parsed = {}
+    codes = [parsed.setdefault(_parse_xpair(c), len(parsed)) for c in categories]
+    codes.append(parsed.setdefault(UNDEFINED_XPAIR, len(parsed)))
+    return np.array(codes, dtype=np.int32), np.array(list(parsed), dtype=object)
+
+
+class EntryTable:
+    """Columns of log entries.
+
+    Categorical columns are stored as int32 codes into an array of
+    categories, missing values have the code -1. Timestamps are int64
+    milliseconds since the epoch of the naive entry timestamps, perf
+    durations are float64 with NaN for entries without a duration.
+
+    Args:
+        columns: Numeric columns and codes of categorical columns by name.
+        categories: Categories of categorical columns by name.
+        entries: Log entries of the rows, if the table has been created from
+            entries.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], categories: Dict[str, np.ndarray], entries: list = None):
+        self.columns = columns
+        self.categories = categories
+        self.entries = entries
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[LogEntry]) -> "EntryTable":
+        entries = list(entries)
+        timestamps = array("q")
+        durations = array("d")
+        categoricals = [_Categorical() for _ in ENTRY_COLUMNS]
+        for entry in entries:
+            timestamps.append((entry.timestamp - _EPOCH) // _MILLISECOND)
+            durations.append(_perf_duration(entry))
+            for categorical, value in zip(categoricals, _entry_columns(entry)):
+                categorical.append(value)
+
+        columns = {
+            "timestamp": np.frombuffer(timestamps, dtype=np.int64),
+            "perf_duration": np.frombuffer(durations, dtype=np.float64),
+        }
+        categories = {}
+        for name, categorical in zip(ENTRY_COLUMNS, categoricals):
+            columns[name] = np.frombuffer(categorical.codes, dtype=np.int32)
+            categories[name] = np.array(list(categorical.categories), dtype=object)
+        cls._add_x_pair(columns, categories)
+        return cls(columns, categories, entries)
+
+    @classmethod
+    def from_columnar(cls, logdump: pathlib.Path) -> "EntryTable":
+        """Create the table from the columns of a columnar dump without
+        restoring entries."""
+        with np.load(logdump) as npz:
+            _check_version(npz)
+            columns = {
+                "timestamp": npz["timestamp"].astype("datetime64[ms]").astype(np.int64),
+                "perf_duration": npz["perf_duration"],
+            }
+            categories = {}
+            for name in ENTRY_COLUMNS:
+                columns[name] = npz[f"{name}.codes"]
+                categories[name] = _load_categories(npz, name)
+        cls._add_x_pair(columns, categories)
+        return cls(columns, categories)
+
+    @classmethod
+    def load(cls, logdump: pathlib.Path) -> "EntryTable":
+        """Load the table from a columnar dump or from entries of any other
+        dump."""
+        if columnar.is_columnar(logdump):
+            return cls.from_columnar(logdump)
+        from . import load_logs
+        return cls.from_entries(load_logs(logdump))
+
+    @staticmethod
+    def _add_x_pair(columns: dict, categories: dict):
+        xpair_codes, categories["x_pair"] = _parse_xpairs(categories["xpair"])
+        columns["x_pair"] = xpair_codes[columns["xpair"]]
+
+    def __len__(self):
+        return len(self.columns["timestamp"])
+
+    def column(self, name: str) -> np.ndarray:
+        """Get a numeric column or the codes of a categorical column."""
+        if name not in self.columns:
+            raise ValueError(f"Unknown column {name}, available: {', '.join(self.columns)}")
+        return self.columns[name]
+
+    def values(self, name: str) -> np.ndarray:
+        """Get values of the column, categorical columns are returned as
+        object arrays with None for missing values."""
+        codes = self.column(name)
+        if name not in self.categories:
+            return codes
+        return np.append(self.categories[name], None)[codes]
+
+    def code(self, name: str, value: Any) -> int:
+        """Get the code of the value in a categorical column, -1 if the value
+        is missing."""
+        if value is None:
+            return -1
+        found = np.flatnonzero(self.categories[name] == value)
+        return int(found[0]) if len(found) else -1
+
+    def equals(self, name: str, value: Any) -> np.ndarray:
+        """Mask of rows with the given value in a categorical column."""
+        code = self.code(name, value)
+        if code == -1 and value is not None:
+            return np.zeros(len(self), dtype=bool)
+        return self.column(name) == code
+
+    def isin(self, name: str, values: Iterable[Any]) -> np.ndarray:
+        """Mask of rows with any of the given values in a categorical column."""
+        values = list(values)
+        codes = [self.code(name, v) for v in values]
+        codes = [c for c, v in zip(codes, values) if c != -1 or v is None]
+        return np.isin(self.column(name), codes)
+
+    def take(self, indices: np.ndarray) -> "EntryTable":
+        """Create a table of the given rows."""
+        columns = {name: column[indices] for name, column in self.columns.items()}
+        entries = None
+        if self.entries is not None:
+            entries = [self.entries[i] for i in indices.tolist()]
+        return EntryTable(columns, self.categories, entries)
+
+    def filter(self, mask: np.ndarray) -> "EntryTable":
+        """Create a table of the rows selected by the boolean mask."""
+        return self.take(np.flatnonzero(mask))
+
+    def _sort_key(self, name: str) -> np.ndarray:
+        """Get a column ordered like its values, missing values first."""
+        column = self.column(name)
+        if name not in self.categories:
+            return column
+        categories = self.categories[name]
+        ranks = np.empty(len(categories) + 1, dtype=np.int64)
+        ranks[np.argsort(categories, kind="stable")] = np.arange(len(categories))
+        ranks[-1] = -1
+        return ranks[column]
+
+    def argsort(self, *names: str) -> np.ndarray:
+        """Get row indices sorted by the given columns, keeping the order of
+        rows with equal values."""
+        return np.lexsort([self._sort_key(n) for n in reversed(names)])
+
+    def sort(self, *names: str) -> "EntryTable":
+        return self.take(self.argsort(*names))
+
+    def group_by(self, *names: str) -> Dict[Any, np.ndarray]:
+        """Group row indices by the values of categorical columns.
+
+        Returns:
+            Row indices in table order by value, or tuple of values for
+            multiple columns. Groups are ordered by their first row.
+        """
+        for name in names:
+            if name not in self.categories:
+                raise ValueError(f"Can only group by categorical columns, not {name}.")
+        # combine codes into a single key, shifted so that missing values
+        # are 0
+        key = np.ravel_multi_index(
+            [self.column(n).astype(np.int64) + 1 for n in names],
+            [len(self.categories[n]) + 1 for n in names],
+        )
+        uniq, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        rows = np.argsort(inverse, kind="stable")
+        groups = np.split(rows, np.cumsum(np.bincount(inverse))[:-1])
+        values = [
+            np.append(None, self.categories[n])[codes]
+            for n, codes in zip(names, np.unravel_index(uniq, [len(self.categories[n]) + 1 for n in names]))
+        ]
+
+        grouped = {}
+        for group in np.argsort(first, kind="stable").tolist():
+            key_values = tuple(v[group] for v in values)
+            grouped[key_values if len(names) > 1 else key_values[0]] = groups[group]
+        return grouped
+
+
+def as_table(entries: Union[EntryTable, Iterable[LogEntry]]) -> EntryTable:
+    """Get a table of the given entries, tables are returned as is."""
+    if isinstance(entries, EntryTable):
+        return entries
+    return EntryTable.from_entries(entries)
@@ -0,0 +1,3 @@
+"""
+Plotting scripts, importable for run_analysis.py and tests.
+"""
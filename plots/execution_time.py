@@ -1,5 +1,4 @@
 import pathlib
-from collections import defaultdict
 
 import matplotlib
 matplotlib.use("Agg")
@@ -8,9 +7,10 @@ import seaborn as sns
 
 from argmagic import argmagic
 
-import faastermetrics as fm
-from faastermetrics.helper import group_by
-from faastermetrics.calls import create_requestgroups
+from faastermetrics.sketch import QuantileSketch
+from faastermetrics.summary import AnalysisSummary, is_summary
+from faastermetrics.session import AnalysisSession
+from faastermetrics.render import RenderScheduler
 
 sns.set_style("whitegrid")
 
@@ -19,15 +19,33 @@ def timedelta_to_ms(timedelta):
     return timedelta.total_seconds() * 1000
 
 
+def sketch_boxplot_stats(sketch, label):
+    """Get boxplot statistics for Axes.bxp estimated from a quantile sketch,
+    with whiskers at 1.5 IQR like Axes.boxplot."""
+    q1, med, q3 = (sketch.quantile(q) for q in (0.25, 0.5, 0.75))
+    iqr = q3 - q1
+    return {
+        "label": label,
+        "med": med,
+        "q1": q1,
+        "q3": q3,
+        "whislo": max(sketch.min, q1 - 1.5 * iqr),
+        "whishi": min(sketch.max, q3 + 1.5 * iqr),
+    }
+
+
 def plot_boxplot(data, ylabel, title, log_scaling=True):
     """
     Args:
-        data: Dict of list of numbers.
+        data: Dict of list of numbers or of quantile sketches.
     """
 
     fig, ax = plt.subplots(1, 1, figsize=(8, 6), dpi=300)
     plt.xticks(rotation=90)
-    ax.boxplot(data.values(), labels=data.keys())
+    if data and all(isinstance(v, QuantileSketch) for v in data.values()):
+        ax.bxp([sketch_boxplot_stats(v, k) for k, v in data.items()], showfliers=False)
+    else:
+        ax.boxplot(data.values(), labels=data.keys())
     ax.set_ylabel(ylabel)
     ax.set_title(title)
 
@@ -39,95 +57,127 @@ def plot_boxplot(data, ylabel, title, log_scaling=True):
     return fig
 
 
-def plot_platform_transport_times(data, plot_dir):
-    """Get the average transport time between different platforms."""
-    cgroups = create_requestgroups(data)
+def render_boxplot(data, ylabel, title, plot_path, log_scaling=True):
+    """Plot a boxplot of precomputed data to the given path."""
+    fig = plot_boxplot(data, ylabel=ylabel, title=title, log_scaling=log_scaling)
+    print(f"Plotting to {plot_path}")
+    fig.savefig(str(plot_path))
+    plt.close(fig)
 
-    # get function platform associations
-    platforms = {
-        call.function: entry.platform for call in cgroups for entry in call.entries
-    }
 
-    transport_times = defaultdict(list)
-    # get transport times
-    for call in cgroups:
-        if call.function == "artillery":
+def summary_platform_transport_times(summary: AnalysisSummary) -> dict:
+    """Get sketches of transport times by origin and destination platform,
+    halved like calls.platform_transport_times."""
+    transport_times = {}
+    for (orig, dest), sketch in summary.transport.items():
+        if orig == "artillery":
             continue
-        for subcall in call.calls:
-            try:
-                matched_call, = [c for c in cgroups if c.id == subcall.id]
-            except ValueError:
-                continue
-
-            orig = platforms[call.function]
-            dest = platforms[subcall.function]
-            transport = (subcall.duration - matched_call.duration) / 2
-            transport_times[(orig, dest)].append(timedelta_to_ms(transport))
-
-    fig = plot_boxplot(
+        key = (summary.function_platform(orig), summary.function_platform(dest))
+        halved = sketch.scaled(0.5)
+        if key in transport_times:
+            transport_times[key].merge(halved)
+        else:
+            transport_times[key] = halved
+    return transport_times
+
+
+def as_session(data):
+    """Use summaries and sessions directly and wrap entries in a session."""
+    if isinstance(data, (AnalysisSummary, AnalysisSession)):
+        return data
+    return AnalysisSession.from_entries(data)
+
+
+def plot_platform_transport_times(data, plot_dir, scheduler: RenderScheduler = None):
+    """Get the average transport time between different platforms."""
+    data = as_session(data)
+    if isinstance(data, AnalysisSummary):
+        transport_times = summary_platform_transport_times(data)
+    else:
+        transport_times = data.transport_times
+
+    (scheduler or RenderScheduler()).submit(
+        render_boxplot,
         transport_times,
         ylabel="Transport Time (ms)",
         title="Network traffic time between platforms.",
+        plot_path=plot_dir / "boxplot_network_transport.png",
         log_scaling=True
     )
 
-    plot_path = str(plot_dir / "boxplot_network_transport.png")
-    print(f"Plotting to {plot_path}")
-    fig.savefig(plot_path)
-
-def plot_function_execution_time_frontend(data, plot_dir):
-    cgroups = create_requestgroups(data)
-    fn_calls = group_by(cgroups, lambda c: c.function)
-    function_durations = {}
-    for function, calls in fn_calls.items():
-        if function is not None and "frontend" in function:
-            function_durations[function] = [
-                timedelta_to_ms(c.duration) for c in calls if c.duration is not None
-            ]
-
-    fig = plot_boxplot(
+def get_function_durations(data) -> dict:
+    """Get durations in ms or duration sketches of summaries by function."""
+    data = as_session(data)
+    if isinstance(data, AnalysisSummary):
+        return dict(data.rpc_in)
+    return data.function_durations
+
+
+def plot_function_execution_time_frontend(data, plot_dir, scheduler: RenderScheduler = None):
+    function_durations = {
+        function: durations for function, durations in get_function_durations(data).items()
+        if function is not None and "frontend" in function
+    }
+
+    (scheduler or RenderScheduler()).submit(
+        render_boxplot,
         function_durations,
         ylabel="Execution Time (ms)",
         title="Comparison of total execution time for frontend functions.",
+        plot_path=plot_dir / "boxplot_frontend_function_execution_time.png",
         log_scaling=True
     )
 
-    plot_path = str(plot_dir / "boxplot_frontend_function_execution_time.png")
-    print(f"Plotting to {plot_path}")
-    fig.savefig(plot_path)
-
 
-def plot_function_execution_time(data, plot_dir):
-    cgroups = create_requestgroups(data)
-    fn_calls = group_by(cgroups, lambda c: c.function)
-    function_durations = {}
-    for function, calls in fn_calls.items():
-        if function not in ("artillery", None):
-            function_durations[function] = [
-                timedelta_to_ms(c.duration) for c in calls if c.duration is not None
-            ]
+def plot_function_execution_time(data, plot_dir, scheduler: RenderScheduler = None):
+    function_durations = {
+        function: durations for function, durations in get_function_durations(data).items()
+        if function not in ("artillery", None)
+    }
 
-    fig = plot_boxplot(
+    (scheduler or RenderScheduler()).submit(
+        render_boxplot,
         function_durations,
         ylabel="Execution Time (ms)",
         title="Comparison of total execution time in current deployment.",
+        plot_path=plot_dir / "boxplot_function_execution_time.png",
         log_scaling=True
     )
 
-    plot_path = str(plot_dir / "boxplot_function_execution_time.png")
-    print(f"Plotting to {plot_path}")
-    fig.savefig(plot_path)
 
+def plot_execution_times(data, plot_dir: pathlib.Path, scheduler: RenderScheduler = None):
+    """Create all execution time plots.
 
-def main(input_data: pathlib.Path, plot_dir: pathlib.Path):
-    # plot_dir = plot_dir / input_data.stem
+    Args:
+        data: Summary, analysis session or log entries.
+        plot_dir: Output plot folder.
+        scheduler: Scheduler rendering the plots, plots are rendered
+            immediately by default.
+    """
+    # calls are only created once for all plots
+    data = as_session(data)
     plot_dir.mkdir(exist_ok=True, parents=True)
+    plot_function_execution_time(data, plot_dir, scheduler)
+    plot_function_execution_time_frontend(data, plot_dir, scheduler)
+    plot_platform_transport_times(data, plot_dir, scheduler)
+
+
+def main(input_data: pathlib.Path, plot_dir: pathlib.Path, jobs: int = 1):
+    """
+    Args:
+        input_data: Path to log dump or summary created by summarize.py.
+        plot_dir: Output plot folder.
+        jobs: Number of processes rendering plots.
+    """
+    # plot_dir = plot_dir / input_data.stem
+    if is_summary(input_data):
+        data = AnalysisSummary.load(input_data)
+    else:
+        data = AnalysisSession(input_data)
 
-    data = fm.load_logs(input_data)
+    with RenderScheduler(jobs) as scheduler:
+        plot_execution_times(data, plot_dir, scheduler)
 
-    plot_function_execution_time(data, plot_dir)
-    plot_function_execution_time_frontend(data, plot_dir)
-    plot_platform_transport_times(data, plot_dir)
 
 if __name__ == "__main__":
     argmagic(main, positional=("input_data", "plot_dir"))
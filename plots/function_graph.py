@@ -2,7 +2,7 @@
 """
 Plot a graph representation of the logs.
 """
-from typing import List
+from typing import List, Union
 import pathlib
 from collections import defaultdict
 
@@ -15,7 +15,13 @@ from networkx.drawing.nx_agraph import to_agraph
 import faastermetrics as fm
 from faastermetrics.helper import group_by, uniq_by
 from faastermetrics.logentry import UNDEFINED_XPAIR
-from faastermetrics.graph import build_function_graph, add_default_metadata, build_call_graph
+from faastermetrics.summary import AnalysisSummary, is_summary
+from faastermetrics.session import AnalysisSession
+from faastermetrics.render import RenderScheduler
+from faastermetrics.graph import (
+    build_function_graph, add_default_metadata, build_call_graph, build_summary_function_graph, is_summary_graph,
+    calls_to_summary_graph, STATISTICS,
+)
 
 
 STYLE_CLASSIC = {
@@ -137,6 +143,8 @@ def get_caller_nodes(graph):
 
 
 def is_artillery(graph, node):
+    if is_summary_graph(graph):
+        return node == "artillery"
     return all(c.function == "artillery" for c in graph.nodes[node]["calls"])
 
 def get_artillery_nodes(graph):
@@ -151,6 +159,8 @@ def get_node_function(graph, node):
 
 
 def get_node_xpairs(graph, node):
+    if is_summary_graph(graph):
+        return graph.nodes[node].get("xpairs", set())
     xpairs = {c.id[1] for c in graph.nodes[node].get("calls", [])}
     return xpairs
 
@@ -177,8 +187,17 @@ def html_table(rowcol_data, attributes):
     return f"<table {format_attrs(attributes)}>{table_str}</table>"
 
 
+def format_duration(data, key, stat):
+    """Format the given statistic of rpc_in, rpc_out or transport durations."""
+    value = data[f"{key}_{stat}"]
+    if stat == "count":
+        return f"{value}"
+    return f"{value:.2f}ms"
+
+
 def format_graph(graph, filters, style):
     show_time = filters["show_time"]
+    stat = filters["stat"]
     context_id = bool(filters["context_id"])
 
     def format_node_label(node, data):
@@ -189,7 +208,7 @@ def format_graph(graph, filters, style):
             main_data = node[1]
 
         if show_time:
-            sub_datas += [f"{data['rpc_in']:.2f}ms"]
+            sub_datas += [format_duration(data, "rpc_in", stat)]
 
         if len(sub_datas) > 0:
             sub_datas = list(map(lambda s: html_font(s, style["node_label_table_font_small"]), sub_datas))
@@ -213,7 +232,7 @@ def format_graph(graph, filters, style):
         if context_id:
             labels += [f"{data['calls'][0].id[1]}"]
         if show_time:
-            labels += [f"{data['rpc_out']:.2f}ms"]
+            labels += [format_duration(data, "rpc_out", stat)]
 
         # show no edge label until we figure out rpcOut issues: https://github.com/FaaSterMetrics/analysis/issues/24
         # if context_id:
@@ -274,7 +293,8 @@ def apply_graph_style(graph, filters, style):
                 [html_font(caller_name, style["node_label_table_font_small"])],
             ]
             if graph.nodes[caller]["calltype"] == "__artillery__":
-                table_data.append([html_font(f"{graph.nodes[caller]['rpc_in']:.2f}ms", style["node_label_table_font_small"])])
+                duration = format_duration(graph.nodes[caller], "rpc_in", filters["stat"])
+                table_data.append([html_font(duration, style["node_label_table_font_small"])])
             graph.nodes[caller]["label"] = "<" + html_table(table_data, style["node_label_table"]) + ">"
         else:
             graph.nodes[caller]["label"] = caller_name
@@ -312,8 +332,6 @@ def apply_agraph_style(A, graph, filters, style):
                     **cluster_style
                 )
 
-    A.layout(style["layout"])
-
     return A
 
 
@@ -323,34 +341,78 @@ STYLES = {
 }
 
 
-def plot_graph(graph, plotdir, filters, style="classic"):
+def without_calls(graph):
+    """Copy the graph without calls of nodes and edges, which are not used
+    by graphviz."""
+    graph = graph.copy()
+    for _, data in graph.nodes(data=True):
+        data.pop("calls", None)
+    for _, _, data in graph.edges(data=True):
+        data.pop("calls", None)
+    return graph
+
+
+def render_graph(source: str, layout: str, plot_path: pathlib.Path):
+    """Layout and draw a graph in dot format."""
+    from pygraphviz import AGraph
+
+    A = AGraph(string=source)
+    A.layout(layout)
+    A.draw(str(plot_path), format="png")
+
+
+def plot_graph(graph, plotdir, filters, style="classic", scheduler: RenderScheduler = None):
     style = STYLES[style]
 
     graph = apply_graph_style(graph, filters, style)
 
-    A = to_agraph(graph)
+    A = to_agraph(without_calls(graph))
 
     A = apply_agraph_style(A, graph, filters, style)
 
     if plotdir.suffix != ".png":
         plotdir = plotdir / "gviz_fgraph.png"
 
-    A.draw(str(plotdir), format="png")
+    # layout and drawing only need the styled graph
+    (scheduler or RenderScheduler()).submit(render_graph, A.string(), style["layout"], plotdir)
 
 
-def analyze_tree(data: List[fm.LogEntry], plotdir: pathlib.Path, style: str, filters: dict):
-    """Build the call graph from the given logging data.
+def build_graph(data: Union[List[fm.LogEntry], AnalysisSummary, AnalysisSession], filters: dict) -> nx.DiGraph:
+    """Build the call graph from the given logging data or the function
+    graph of a summary or session, with default metadata.
     """
     context_id = filters["context_id"]
-    if context_id:
+    if isinstance(data, AnalysisSession):
+        if not context_id and filters["summary"]:
+            return add_default_metadata(calls_to_summary_graph(data.calls))
+        if not context_id:
+            # styling modifies the graph shared by the session
+            return data.function_graph.copy()
+        data = data.entries
+
+    if isinstance(data, AnalysisSummary):
+        if context_id:
+            raise ValueError("Summaries do not contain calls of single contexts.")
+        graph = data.to_function_graph()
+    elif context_id:
         len_before = len(data)
         data = [d for d in data if d.context_id == context_id]
         print(f"Filter on contextId({context_id}): {len(data)}/{len_before} included")
         graph = build_call_graph(data)
+    elif filters["summary"]:
+        # entries are in file order
+        graph = build_summary_function_graph(data, horizon=None)
     else:
         graph = build_function_graph(data)
 
-    graph = add_default_metadata(graph)
+    return add_default_metadata(graph)
+
+
+def analyze_tree(
+        data: Union[List[fm.LogEntry], AnalysisSummary, AnalysisSession],
+        plotdir: pathlib.Path, style: str, filters: dict, scheduler: RenderScheduler = None):
+    """Filter and plot the graph of the given data, see build_graph."""
+    graph = build_graph(data, filters)
 
     tree_root = filters["function_tree"]
     if tree_root:
@@ -371,7 +433,29 @@ def analyze_tree(data: List[fm.LogEntry], plotdir: pathlib.Path, style: str, fil
         print(functions)
         graph = graph.subgraph(functions)
 
-    plot_graph(graph, plotdir, filters, style=style)
+    plot_graph(graph, plotdir, filters, style=style, scheduler=scheduler)
+
+
+def graph_filters(
+        ftree: str = None,
+        functions: List[str] = (),
+        context: str = None,
+        degree: int = 0,
+        xpair: bool = False,
+        notime: bool = False,
+        stat: str = "mean",
+        summary: bool = False) -> dict:
+    """Get graph filters from options of main."""
+    return {
+        "function_tree": ftree,
+        "functions_only": functions,
+        "context_id": context,
+        "min_degree": degree,
+        "xpair": xpair,
+        "show_time": not notime,
+        "stat": stat,
+        "summary": summary,
+    }
 
 
 def main(
@@ -383,10 +467,13 @@ def main(
         degree: int = 0,
         xpair: bool = False,
         functions: List[str] = list(),
-        notime: bool = False):
+        notime: bool = False,
+        stat: str = "mean",
+        summary: bool = False):
     """
     Args:
-        data: Path to json log dump.
+        data: Path to log dump or summary created by summarize.py. Single
+            contexts are read from jsonl dumps using their index.
         output: Output graph folder.
         style: Set style of output graph.
         functions: Only show specific functions in graph. (eg "[frontend, add]")
@@ -394,22 +481,27 @@ def main(
         context: Filter on context id.
         ftree: Only show functions that are connected with the given function.
         notime: Hide rpcIn and rpcOut times.
+        stat: Statistic of rpcIn and rpcOut times shown, one of count, mean,
+            p50, p90, p99 or max.
+        summary: Only keep aggregates of calls in the function graph,
+            percentiles are estimated with 1% relative error.
         xpair: Show separate xpairs in individual nodes.
     """
+    if stat not in STATISTICS:
+        raise ValueError(f"Unknown statistic {stat}, available: {', '.join(STATISTICS)}")
+
     if output.suffix != ".png":
         output = output / data.stem
         output.mkdir(parents=True, exist_ok=True)
 
-    data = fm.load_logs(data)
-    graph_filters = {
-        "function_tree": ftree,
-        "functions_only": functions,
-        "context_id": context,
-        "min_degree": degree,
-        "xpair": xpair,
-        "show_time": not notime,
-    }
-    analyze_tree(data, output, style, graph_filters)
+    if is_summary(data):
+        data = AnalysisSummary.load(data)
+    else:
+        data = fm.load_logs(data, context_id=context)
+    filters = graph_filters(
+        ftree=ftree, functions=functions, context=context, degree=degree, xpair=xpair, notime=notime, stat=stat,
+        summary=summary)
+    analyze_tree(data, output, style, filters)
 
 
 if __name__ == "__main__":
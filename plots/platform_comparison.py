@@ -11,19 +11,25 @@ import seaborn as sns
 
 from argmagic import argmagic
 
-import faastermetrics as fm
+from faastermetrics.table import EntryTable, as_table
+from faastermetrics.render import RenderScheduler
 
 
 sns.set_style("whitegrid")
 
 
 def get_function_measures(entries):
-    """Return a dict with lists of rpcIn measures."""
-    measures = defaultdict(list)
-    for entry in entries:
-        if hasattr(entry, "perf") and entry.perf["entryType"] == "measure":
-            measures[entry.fn["name"]].append(entry.perf["duration"])
-    return measures
+    """Return a dict with lists of rpcIn measures.
+
+    Args:
+        entries: Log entries or an EntryTable.
+    """
+    table = as_table(entries)
+    table = table.filter(table.equals("perf_entry_type", "measure"))
+    durations = table.column("perf_duration")
+    return {
+        function: durations[rows].tolist() for function, rows in table.group_by("function").items()
+    }
 
 
 def get_average_duration(measures):
@@ -41,11 +47,8 @@ def logs_to_long_form(log_entries):
     return long_data
 
 
-def plot_platform_comparison(all_logs, plot_dir):
-    plot_path = plot_dir / f"platform_comparison.png"
-
-    data = logs_to_long_form(all_logs)
-
+def render_platform_comparison(data, plot_path):
+    """Plot precomputed long form durations to the given path."""
     x = data["function"]
     y = data["duration"]
     hue = data["platform"]
@@ -59,11 +62,26 @@ def plot_platform_comparison(all_logs, plot_dir):
     plt.close()
 
 
+def plot_platform_comparison(all_logs, plot_dir, scheduler: RenderScheduler = None):
+    """
+    Args:
+        all_logs: Dict of log entries or EntryTables by platform.
+        plot_dir: Output plot folder.
+        scheduler: Scheduler rendering the plot, rendered immediately by
+            default.
+    """
+    plot_path = plot_dir / f"platform_comparison.png"
+    data = logs_to_long_form(all_logs)
+    (scheduler or RenderScheduler()).submit(render_platform_comparison, data, plot_path)
+
+
 def main(logpath: pathlib.Path, output: pathlib.Path):
     output = output / logpath.name
     output.mkdir(exist_ok=True, parents=True)
 
-    platform_logs = {f.stem.split("_")[-1]: fm.load_logs(f) for f in logpath.glob("*.json")}
+    platform_logs = {
+        f.stem.split("_")[-1]: EntryTable.load(f) for f in [*logpath.glob("*.json"), *logpath.glob("*.npz")]
+    }
 
     plot_platform_comparison(platform_logs, output)
 
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Create the function tree, csv export, execution time plots and function graph
+of a log directory or dump, like run_analysis.sh. Function graphs in other
+styles and the platform comparison are created on request.
+
+The dump is loaded once and calls and the function graph are shared by all
+outputs, see faastermetrics.session.AnalysisSession. Figures are rendered
+from the precomputed data in a process pool with --jobs.
+"""
+import pathlib
+import contextlib
+from typing import List
+
+from argmagic import argmagic
+
+from faastermetrics.session import AnalysisSession
+from faastermetrics.render import RenderScheduler
+
+from scripts.dump_logs import dump_logs
+from scripts.analysis_function_tree import print_function_tree
+from scripts.export import export_entries
+from plots.execution_time import plot_execution_times
+from plots.platform_comparison import plot_platform_comparison
+from plots.function_graph import analyze_tree, graph_filters
+
+
+def graph_path(output: pathlib.Path, style: str) -> pathlib.Path:
+    """Get the path of the function graph in the given style, the modern
+    style is plotted to function_graph.png."""
+    if style == "modern":
+        return output / "function_graph.png"
+    return output / f"function_graph_{style}.png"
+
+
+def main(
+        data: pathlib.Path,
+        output: pathlib.Path,
+        styles: List[str] = ["modern"],
+        platform_comparison: bool = False,
+        jobs: int = 1):
+    """Create all analyses of run_analysis.sh.
+
+    Args:
+        data: Log directory or dump. Log directories are dumped to
+            dump.json in the output folder first.
+        output: Output analysis folder.
+        styles: Styles of function graphs. (eg "[modern, classic]")
+        platform_comparison: Also plot the platform comparison.
+        jobs: Number of processes rendering plots and graphs.
+    """
+    output.mkdir(parents=True, exist_ok=True)
+
+    if data.is_dir():
+        logdump = output / "dump.json"
+        print(f"Dumping logs to {logdump}")
+        dump_logs(data, logdump)
+    else:
+        logdump = data
+        print(f"Using logdump at {logdump}")
+
+    session = AnalysisSession(logdump)
+
+    with RenderScheduler(jobs) as scheduler:
+        with open(output / "function_tree.txt", "w") as tfile, contextlib.redirect_stdout(tfile):
+            print_function_tree(session)
+        # figures are submitted first, so that they are rendered during the export
+        plot_execution_times(session, output, scheduler)
+        if platform_comparison:
+            plot_platform_comparison(session.platform_tables, output, scheduler)
+        for style in styles:
+            analyze_tree(session, graph_path(output, style), style, graph_filters(), scheduler)
+        export_entries(session.entries, output / "dump.csv")
+
+
+if __name__ == "__main__":
+    argmagic(main, positional=("data", "output"), use_flags=True)
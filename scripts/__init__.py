@@ -0,0 +1,3 @@
+"""
+Command line scripts, importable for run_analysis.py and tests.
+"""
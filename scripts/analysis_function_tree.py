@@ -2,29 +2,37 @@
 import json
 import pathlib
 from pprint import pprint
-from typing import List
+from typing import List, Union
 
 from collections import defaultdict, Counter
 
 from argmagic import argmagic
 import faastermetrics as fm
 import faastermetrics.graph as fg
+from faastermetrics.session import AnalysisSession
 
 
-def print_walk_node(graph, node, level=0):
+def print_walk_node(graph, node, level=0, path=()):
     calls = graph.nodes[node]["calls"]
     indent = "  " * level
     add_info = ""
     if level == 0:
         add_info += str({c.id[0] for c in calls})
+    if node in path:
+        # functions calling themselves, directly or indirectly
+        print(f"{indent}{node}: calls: {len(calls)} : cycle")
+        return
     print(f"{indent}{node}: calls: {len(calls)} : {add_info}")
     for succ in graph.successors(node):
-        print_walk_node(graph, succ, level+1)
+        print_walk_node(graph, succ, level+1, path + (node,))
 
 
-def print_function_tree(entries: List[fm.LogEntry]):
+def print_function_tree(data: Union[List[fm.LogEntry], AnalysisSession]):
     """Print requests based on their xpairs and context ids."""
-    graph = fg.build_function_graph(entries)
+    if isinstance(data, AnalysisSession):
+        graph = data.function_graph
+    else:
+        graph = fg.build_function_graph(data)
     for node, deg in graph.in_degree:
         if deg == 0:
             print(f"= Calltree induced on: {node} =")
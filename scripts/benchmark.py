@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Micro benchmarks for performance sensitive parts of the analysis on
+synthetic experiment logs.
+"""
+import io
+import json
+import time
+import random
+import datetime
+import pathlib
+import tempfile
+import contextlib
+from typing import Callable, List
+from dataclasses import asdict
+
+from argmagic import argmagic_subparsers
+
+import faastermetrics as fm
+from faastermetrics.logentry import LOG_SUBTYPES
+from faastermetrics.helper import group_by
+from faastermetrics import calls as fc
+from faastermetrics import jsonbackend, columnar, jsonl, graph, critical_path
+
+
+FUNCTION_PLATFORMS = {
+    "frontend": "aws",
+    "add": "gcp",
+    "list": "azure",
+    "check": "gcp",
+}
+
+
+def _synthetic_call(rnd, emit, context_id, function, caller, xpair, timestamp, depth):
+    """Emit perf and request events for a single call and its subcalls."""
+    platform = FUNCTION_PLATFORMS[function]
+    event = {"contextId": context_id, "xPair": f"{caller}-{xpair}"}
+
+    def perf(perf_data, offset):
+        emit(platform, function, {**event, "perf": perf_data}, timestamp + int(offset))
+
+    perf({"entryType": "mark", "mark": "start:rpcIn"}, 0)
+    emit(platform, function, {**event, "request": {"method": "GET", "path": f"/{function}"}}, timestamp)
+    if rnd.random() < 0.05:
+        emit(platform, function, {**event, "coldstart": True}, timestamp)
+
+    duration = rnd.uniform(1, 50)
+    if depth < 2:
+        for subfunction in rnd.sample(["add", "list", "check"], rnd.randint(0, 2)):
+            subxpair = "%08x" % rnd.getrandbits(32)
+            mark = f"rpcOut:{subfunction}:{context_id}-{subxpair}"
+            perf({"entryType": "mark", "mark": f"start:{mark}"}, duration)
+            out_duration = _synthetic_call(
+                rnd, emit, context_id, subfunction, function, subxpair, timestamp + int(duration), depth + 1
+            ) + rnd.uniform(1, 20)
+            duration += out_duration
+            perf({"entryType": "mark", "mark": f"end:{mark}"}, duration)
+            perf({"entryType": "measure", "mark": f"measure:{mark}", "duration": out_duration}, duration)
+
+    perf({"entryType": "mark", "mark": "end:rpcIn"}, duration)
+    perf({"entryType": "measure", "mark": "measure:rpcIn", "duration": duration}, duration)
+    return duration
+
+
+def write_raw_logs(logdir: pathlib.Path, num_requests: int, seed: int = 0) -> int:
+    """Write platform logfiles for the given number of artillery requests.
+
+    Returns the number of written lines.
+    """
+    rnd = random.Random(seed)
+    logdir.mkdir(parents=True, exist_ok=True)
+    logfiles = {p: open(logdir / f"{p}.log", "w") for p in set(FUNCTION_PLATFORMS.values())}
+    num_lines = 0
+
+    def emit(platform, function, event, timestamp):
+        nonlocal num_lines
+        message = "FAASTERMETRICS" + json.dumps({
+            "timestamp": timestamp,
+            "version": "v1",
+            "deploymentId": "benchmark",
+            "platform": platform,
+            "fn": {"name": function},
+            "event": event,
+        })
+        if rnd.random() < 0.5:
+            # escaped message inside of a structured log line
+            line = '{"textPayload": ' + json.dumps(message) + ', "severity": "INFO"}'
+        else:
+            line = f"2020-05-23T16:21:29Z\tINFO\t{message}"
+        logfiles[platform].write(f"START RequestId: {rnd.getrandbits(64):x}\n{line}\n")
+        num_lines += 2
+
+    for i in range(num_requests):
+        context_id = "%012x" % rnd.getrandbits(48)
+        xpair = "%08x" % rnd.getrandbits(32)
+        timestamp = 1590000000000 + i * 100
+        artillery = {
+            "contextId": context_id, "xPair": f"artillery-{xpair}",
+            "url": "https://example.execute-api.com/dev/frontend/home", "type": "before",
+        }
+        emit("aws", "artillery", artillery, timestamp)
+        duration = _synthetic_call(rnd, emit, context_id, "frontend", "artillery", xpair, timestamp + 1, 0)
+        emit("aws", "artillery", {**artillery, "type": "after"}, timestamp + int(duration) + 2)
+
+    for logfile in logfiles.values():
+        logfile.close()
+    return num_lines
+
+
+def _timeit(fun: Callable, repeat: int) -> float:
+    """Return the best wall time of the given number of runs."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fun()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _parse_lines(path: pathlib.Path):
+    with open(path) as f:
+        parsed_entries = [fm._parse_entry(line, path.stem) for line in f]
+    return [e for e in parsed_entries if fm._is_valid(e)]
+
+
+def parse(requests: int = 20000, repeat: int = 3):
+    """Compare line based and byte based raw log parsing.
+
+    Args:
+        requests: Number of synthetic artillery requests.
+        repeat: Number of runs, the best is reported.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logdir = pathlib.Path(tmpdir)
+        num_lines = write_raw_logs(logdir, requests)
+        paths = sorted(logdir.glob("*.log"))
+        print(f"Parsing {num_lines} lines in {len(paths)} files")
+
+        line_time = _timeit(lambda: [_parse_lines(p) for p in paths], repeat)
+        byte_time = _timeit(lambda: [fm.parse_logfile(p) for p in paths], repeat)
+
+    print(f"line based: {num_lines / line_time:12.0f} lines/s")
+    print(f"byte based: {num_lines / byte_time:12.0f} lines/s ({line_time / byte_time:.2f}x)")
+
+
+def backends(entries: int = 200000, repeat: int = 3):
+    """Compare json backends for parsing raw logs and loading dumps.
+
+    Args:
+        entries: Approximate number of log entries in the dump.
+        repeat: Number of runs, the best is reported.
+    """
+    available = [n for n in jsonbackend.BACKENDS if n != "orjson" or jsonbackend.orjson is not None]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logdir = pathlib.Path(tmpdir) / "logs"
+        logdump = pathlib.Path(tmpdir) / "dump.json"
+        # a synthetic request creates about 20 entries
+        write_raw_logs(logdir, max(1, entries // 20))
+        num_entries = fm.dump_logs(fm.iter_logdir(logdir), logdump)
+        print(f"Dump with {num_entries} entries")
+
+        for name in available:
+            backend = jsonbackend.get_backend(name)
+            parse_time = _timeit(lambda: fm.parse_logdir(logdir, backend=name), repeat)
+            decode_time = _timeit(lambda: backend.load_dump(logdump), repeat)
+            load_time = _timeit(lambda: fm.load_logs(logdump, backend=name), repeat)
+            print(f"{name:>8}  parse: {num_entries / parse_time:12.0f} entries/s")
+            print(f"{name:>8} decode: {num_entries / decode_time:12.0f} entries/s")
+            print(f"{name:>8}   load: {num_entries / load_time:12.0f} entries/s")
+
+        # json_coder can only encode uncasted entries
+        log_entries = fm.parse_logdir(logdir)
+        with open(logdump, "w") as dfile:
+            coder_time = _timeit(lambda: json.dump(log_entries, dfile), repeat)
+        store_time = _timeit(lambda: fm.dump_logs(log_entries, logdump), repeat)
+        print(f"json_coder store: {num_entries / coder_time:12.0f} entries/s")
+        print(f" dump_logs store: {num_entries / store_time:12.0f} entries/s")
+
+
+def _cast_asdict(entries):
+    """Previous casting by matching all subtypes and copying the data."""
+    casted = []
+    for entry in entries:
+        for subtype in LOG_SUBTYPES:
+            if subtype.match(entry):
+                casted.append(subtype(**asdict(entry)))
+                break
+        else:
+            casted.append(entry)
+    return casted
+
+
+def cast(entries: int = 200000, repeat: int = 3):
+    """Compare casting entries to their log types by matching and copying
+    with the dispatch table.
+
+    Args:
+        entries: Approximate number of log entries.
+        repeat: Number of runs, the best is reported.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logdir = pathlib.Path(tmpdir)
+        write_raw_logs(logdir, max(1, entries // 20))
+        log_entries = fm.parse_logdir(logdir)
+    print(f"Casting {len(log_entries)} entries")
+
+    asdict_time = _timeit(lambda: _cast_asdict(log_entries), repeat)
+    dispatch_time = _timeit(lambda: fm.cast_log_types(log_entries), repeat)
+    print(f"   match and copy: {len(log_entries) / asdict_time:12.0f} entries/s")
+    print(f"dispatch and bind: {len(log_entries) / dispatch_time:12.0f} entries/s "
+          f"({asdict_time / dispatch_time:.2f}x)")
+
+
+def _requestgroups_reference(entries):
+    """Previous grouping, building calls with several passes per id."""
+    calls = [
+        fc.id_groups_to_call(call_id, id_entries)
+        for call_id, id_entries in group_by(entries, lambda e: e.id).items()
+    ]
+    calls = [c for c in calls if c.id[0] is not None]
+    return fc.normalize_call_names(calls)
+
+
+def _create_requestgroups(entries, workers=1):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fc.create_requestgroups(entries, workers=workers)
+
+
+def groups(sizes: List[int] = [10000, 100000, 400000], repeat: int = 3, workers: int = 1):
+    """Compare grouping entries into calls by number of entries.
+
+    Args:
+        sizes: Approximate numbers of log entries.
+        repeat: Number of runs, the best is reported.
+        workers: Number of processes for additionally timing sharded
+            grouping.
+    """
+    header = f"{'entries':>10} {'reference':>10} {'one pass':>10}"
+    if workers > 1:
+        header += f"        {'sharded':>10}"
+    print(header)
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logdir = pathlib.Path(tmpdir)
+            write_raw_logs(logdir, max(1, size // 20))
+            log_entries = fm.cast_log_types(fm.parse_logdir(logdir))
+
+        reference_time = _timeit(lambda: _requestgroups_reference(log_entries), repeat)
+        one_pass_time = _timeit(lambda: _create_requestgroups(log_entries), repeat)
+        line = f"{len(log_entries):10d} {reference_time:9.3f}s {one_pass_time:9.3f}s ({reference_time / one_pass_time:.2f}x)"
+        if workers > 1:
+            sharded_time = _timeit(lambda: _create_requestgroups(log_entries, workers), repeat)
+            line += f" {sharded_time:9.3f}s ({reference_time / sharded_time:.2f}x)"
+        print(line)
+
+
+def _synthetic_calls(num_calls: int) -> List[fc.Call]:
+    """Create calls of requests to the frontend calling add and list."""
+    entries = {
+        platform: fm.LogEntry(datetime.datetime(2020, 1, 1), {}, platform)
+        for platform in set(FUNCTION_PLATFORMS.values())
+    }
+
+    def call(context_id, xpair, function, duration):
+        return fc.Call(
+            id=(context_id, xpair),
+            function=function,
+            duration=datetime.timedelta(milliseconds=duration),
+            entries=[entries[FUNCTION_PLATFORMS[function]]],
+        )
+
+    calls = []
+    for i in range(max(1, num_calls // 3)):
+        context_id = f"ctx{i}"
+        frontend = call(context_id, "x0", "frontend", 30)
+        frontend.calls = [call(context_id, "x1", "add", 12), call(context_id, "x2", "list", 14)]
+        calls += [frontend, call(context_id, "x1", "add", 10), call(context_id, "x2", "list", 11)]
+    return calls
+
+
+def matching(sizes: List[int] = [10000, 100000, 1000000], repeat: int = 1):
+    """Time matching subcalls to calls by number of calls.
+
+    Times per call should stay about the same for all sizes.
+
+    Args:
+        sizes: Approximate numbers of calls.
+        repeat: Number of runs, the best is reported.
+    """
+    print(f"{'calls':>10} {'call graph':>14} {'function graph':>14} {'transport':>14}")
+    for size in sizes:
+        calls = _synthetic_calls(size)
+        call_graph_time = _timeit(lambda: graph.calls_to_call_graph(calls), repeat)
+        function_graph = graph.calls_to_function_graph(calls)
+        edge_time = _timeit(
+            lambda: graph.apply_to_graph_edges(function_graph, graph.edge_transport_duration, "transport"), repeat)
+        transport_time = _timeit(lambda: fc.platform_transport_times(calls), repeat)
+        print(
+            f"{len(calls):10d}"
+            + "".join(f" {t / len(calls) * 1e6:11.2f}us" for t in (call_graph_time, edge_time, transport_time))
+        )
+
+
+def critical(sizes: List[int] = [10000, 100000, 300000], repeat: int = 1):
+    """Time finding critical paths by number of requests.
+
+    Args:
+        sizes: Numbers of requests, each of three calls.
+        repeat: Number of runs, the best is reported.
+    """
+    print(f"{'requests':>10} {'total':>10} {'per request':>14}")
+    for size in sizes:
+        calls = _synthetic_calls(size * 3)
+        total = _timeit(lambda: critical_path.critical_paths(calls), repeat)
+        print(f"{size:10d} {total:9.3f}s {total / size * 1e6:11.2f}us")
+
+
+def dumps(entries: int = 200000, repeat: int = 3):
+    """Compare loading json, jsonl and columnar dumps.
+
+    Args:
+        entries: Approximate number of log entries in the dump.
+        repeat: Number of runs, the best is reported.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logdir = pathlib.Path(tmpdir) / "logs"
+        json_dump = pathlib.Path(tmpdir) / "dump.json"
+        jsonl_dump = pathlib.Path(tmpdir) / "dump.jsonl"
+        columnar_dump = pathlib.Path(tmpdir) / "dump.npz"
+        write_raw_logs(logdir, max(1, entries // 20))
+        num_entries = fm.dump_logs(fm.iter_logdir(logdir), json_dump)
+        jsonl.dump_jsonl(fm.iter_logdir(logdir), jsonl_dump)
+        columnar.dump_columnar(fm.iter_logdir(logdir), columnar_dump)
+        print(f"Dumps with {num_entries} entries")
+
+        json_time = _timeit(lambda: fm.load_logs(json_dump), repeat)
+        columnar_time = _timeit(lambda: fm.load_logs(columnar_dump), repeat)
+        lazy_time = _timeit(lambda: fm.load_logs(columnar_dump, lazy=True), repeat)
+        columns_time = _timeit(lambda: columnar.load_columns(columnar_dump), repeat)
+        selected_time = _timeit(
+            lambda: columnar.load_columns(columnar_dump, ["context_id", "perf_duration"]), repeat)
+        jsonl_time = _timeit(lambda: fm.load_logs(jsonl_dump), repeat)
+        context_ids = random.Random(0).sample(
+            sorted(set(columnar.load_columns(columnar_dump, ["context_id"])["context_id"]) - {None}), 10)
+        context_time = _timeit(lambda: [fm.load_logs(jsonl_dump, context_id=c) for c in context_ids], repeat)
+
+    print(f"        json entries: {json_time:8.3f}s")
+    print(f"    columnar entries: {columnar_time:8.3f}s")
+    print(f"        lazy entries: {lazy_time:8.3f}s")
+    print(f"    columnar columns: {columns_time:8.3f}s")
+    print(f"columnar two columns: {selected_time:8.3f}s")
+    print(f"       jsonl entries: {jsonl_time:8.3f}s")
+    print(f"jsonl single context: {context_time / len(context_ids):8.3f}s")
+
+
+if __name__ == "__main__":
+    argmagic_subparsers([
+        {"target": parse},
+        {"target": backends},
+        {"target": cast},
+        {"target": groups},
+        {"target": matching},
+        {"target": critical},
+        {"target": dumps},
+    ])
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Print the most common critical paths of requests and the time spent on
+critical paths by function.
+"""
+import csv
+import pathlib
+
+from argmagic import argmagic
+
+import faastermetrics as fm
+from faastermetrics.calls import create_requestgroups
+from faastermetrics.critical_path import critical_paths
+
+
+HOP_COLUMNS = ("request", "function", "depth", "duration", "exclusive", "transport", "child")
+
+
+def write_hops(paths, output: pathlib.Path):
+    """Write the hops of all critical paths with the context id of their request."""
+    context_ids = paths.requests["context_id"]
+    with open(output, "w", newline="") as hfile:
+        writer = csv.writer(hfile)
+        writer.writerow(("context_id",) + HOP_COLUMNS)
+        columns = [paths.hops[key].tolist() for key in HOP_COLUMNS]
+        for row in zip(*columns):
+            writer.writerow((context_ids[row[0]],) + row)
+
+
+def main(logdump: pathlib.Path, top: int = 10, output: pathlib.Path = None):
+    """Print critical paths of all requests.
+
+    Args:
+        logdump: Path to log dump.
+        top: Number of most common critical paths to print.
+        output: Optional csv file for the hops of all critical paths.
+    """
+    data = fm.load_logs(logdump)
+    paths = critical_paths(create_requestgroups(data))
+
+    print(f"= Most common critical paths of {len(paths)} requests =")
+    for path, count, mean, p99 in paths.most_common(top):
+        print(f"{count:8d} {count / len(paths):6.1%}  mean {mean:8.2f}ms  p99 {p99:8.2f}ms  {path}")
+
+    print("= Time on critical paths by function =")
+    breakdown = sorted(paths.function_breakdown().items(), key=lambda item: -item[1]["share"])
+    for function, times in breakdown:
+        print(
+            f"{function}: hops: {times['hops']} exclusive: {times['exclusive']:.0f}ms"
+            f" transport: {times['transport']:.0f}ms child: {times['child']:.0f}ms"
+            f" share: {times['share']:.1%}")
+
+    if output is not None:
+        write_hops(paths, output)
+
+
+if __name__ == "__main__":
+    argmagic(main, positional=("logdump",))
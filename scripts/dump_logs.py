@@ -1,12 +1,29 @@
 #!/usr/bin/env python3
-import json
 import pathlib
 import datetime
+import itertools
+from typing import Iterator
 from collections import Counter
 
+import numpy as np
+
 from argmagic import argmagic
 
 import faastermetrics as fm
+from faastermetrics import incremental as inc
+from faastermetrics import columnar, jsonl
+from faastermetrics.cache import get_cache
+from faastermetrics.table import EntryTable
+
+
+DUMP_FORMATS = {
+    "json": fm.dump_logs,
+    "jsonl": jsonl.dump_jsonl,
+    "npz": columnar.dump_columnar,
+}
+
+# Number of entries filtered at once.
+FILTER_BATCH_SIZE = 100000
 
 
 def parse_timewindow(timewindow: str) -> datetime.timedelta:
@@ -29,6 +46,11 @@ def dump_logs(
         outdir: pathlib.Path,
         version: str = None,
         timewindow: str = None,
+        jobs: int = 1,
+        incremental: bool = False,
+        output_format: str = None,
+        cache_dir: pathlib.Path = None,
+        no_cache: bool = False,
 ):
     """Output logs to the given destination directory.
 
@@ -37,44 +59,203 @@ def dump_logs(
         outdir: Destination for outputting collected log json.
         version: Version requirement for inclusion.
         timewindow: Only include events inside a timewindow up to latest.
+        jobs: Number of processes used for parsing raw logs.
+        incremental: Only parse lines appended since the last incremental
+            dump and add them to the existing dump.
+        output_format: Format of the dump, either json, jsonl for one entry
+            per line with an index by context id and function or npz for a
+            columnar dump. Defaults to the suffix of outdir or json.
+        cache_dir: Directory caching parsed logfiles, defaults to the
+            FAASTERMETRICS_CACHE environment variable. Not used for
+            incremental dumps.
+        no_cache: Parse all logfiles without using the cache.
     """
-    log_entries = fm.parse_logdir(logdir)
-    print(f"Loading {len(log_entries)} entries from {logdir}")
+    if output_format is None:
+        suffix = outdir.suffix[1:]
+        output_format = suffix if suffix in DUMP_FORMATS else "json"
+    if output_format not in DUMP_FORMATS:
+        raise ValueError(f"Unknown output format {output_format}, available: {', '.join(DUMP_FORMATS)}")
+
+    if incremental and timewindow is not None:
+        raise ValueError("Incremental dumps cannot be combined with a timewindow filter.")
+    if incremental and output_format != "json":
+        raise ValueError("Incremental dumps are only supported for json dumps.")
+
+    cache = get_cache(cache_dir, disabled=no_cache)
+    filters = []
 
     if version is not None:
         print(f"Filtering: version={version}")
-        num_before = len(log_entries)
-        log_entries = list(filter(lambda e: e.data["version"] == version, log_entries))
-        num_after = len(log_entries)
-        print(f"  Kept {num_after}/{num_before} ({num_before - num_after} removed)")
+        filters.append(("version", lambda t: t.equals("version", version)))
 
     if timewindow is not None:
-        end_time = max(*[e.timestamp for e in log_entries])
-        timedelta = parse_timewindow(timewindow)
-        start_time = end_time - timedelta
-        print(f"Filtering timewindow of {timewindow}: {start_time} {end_time}")
-        num_before = len(log_entries)
-        log_entries = [e for e in log_entries if e.timestamp >= start_time]
-        num_after = len(log_entries)
-        print(f"  Kept {num_after}/{num_before} ({num_before - num_after} removed)")
+        # validated before parsing, the window is applied once all entries are filtered
+        parse_timewindow(timewindow)
+        filters.append(("timewindow", None))
 
+    deploy_id = None
     deploy_path = logdir / "deployment_id.txt"
     if deploy_path.exists():
         with open(deploy_path) as dfile:
             deploy_id = dfile.read().strip()
         print(f"Filtering on deploy ID: {deploy_id}")
-        num_before = len(log_entries)
-        log_entries = [e for e in log_entries if e.data.get("deploymentId", "") == deploy_id]
-        num_after = len(log_entries)
-        print(f"  Kept {num_after}/{num_before} ({num_before - num_after} removed)")
+        filters.append(("deploy ID", lambda t: _has_deploy_id(t, deploy_id)))
 
     if outdir.is_dir():
-        outdir = outdir / f"{logdir.name}.json"
+        outdir = outdir / f"{logdir.name}.{output_format}"
+
+    if incremental:
+        if not fm.is_log_folder(logdir):
+            raise ValueError(f"{logdir} is not a valid log directory.")
+        params = {"version": version, "deploy_id": deploy_id}
+        checkpoints, append = _load_valid_checkpoints(logdir, outdir, params)
+        ranges = {
+            path: (checkpoints[path.name].offset if path.name in checkpoints else 0, inc.complete_lines_end(path))
+            for path in fm.list_logfiles(logdir)
+        }
+        log_entries = (
+            entry for path, (start, end) in ranges.items()
+            for entry in fm.iter_logfile(path, workers=jobs, start=start, end=end)
+        )
+    else:
+        append = False
+        log_entries = fm.iter_logdir(logdir, workers=jobs, cache=cache)
+
+    if append:
+        print(f"Appending new entries from {logdir} to {outdir}")
+    else:
+        print(f"Dumping entries from {logdir} to {outdir}")
+    counts = Counter()
+    log_entries = _apply_filters(log_entries, filters, counts, timewindow)
+    if append:
+        num_entries = fm.dump_logs(log_entries, outdir, append=True)
+    else:
+        num_entries = DUMP_FORMATS[output_format](log_entries, outdir)
+
+    if incremental:
+        inc.save_checkpoints(
+            inc.checkpoint_path(outdir), params,
+            {path.name: inc.create_checkpoint(path, end) for path, (_, end) in ranges.items()},
+        )
+
+    num_before = counts[None]
+    print(f"Loaded {num_before} entries from {logdir}")
+    for name, _ in filters:
+        num_after = counts[name]
+        print(f"  {name}: Kept {num_after}/{num_before} ({num_before - num_after} removed)")
+        num_before = num_after
+    print(f"Dumped {num_entries} entries to {outdir}")
+
+
+def _load_valid_checkpoints(logdir: pathlib.Path, logdump: pathlib.Path, params: dict) -> tuple:
+    """Load checkpoints of a previous incremental dump.
+
+    Returns:
+        Checkpoints with resumable offsets and whether the dump can be
+        appended to. If any logfile has been replaced, truncated or removed
+        all files are parsed again.
+    """
+    old_params, checkpoints = inc.load_checkpoints(inc.checkpoint_path(logdump))
+    if not checkpoints or not logdump.exists():
+        return {}, False
+
+    if old_params != params:
+        print("Filter parameters changed since last dump, parsing all logs again.")
+        return {}, False
+
+    for name, checkpoint in checkpoints.items():
+        path = logdir / name
+        if not path.exists() or inc.resume_offset(path, checkpoint) is None:
+            print(f"{name} changed since last dump, parsing all logs again.")
+            return {}, False
+
+    return checkpoints, True
+
+
+def _has_deploy_id(table: EntryTable, deploy_id: str):
+    """Mask of entries with the given deployment id, entries without any
+    match an empty one."""
+    mask = table.equals("deployment_id", deploy_id)
+    if deploy_id == "":
+        mask |= table.column("deployment_id") == -1
+    return mask
+
+
+def _batch_tables(entries: Iterator[fm.LogEntry], counts: Counter) -> Iterator[EntryTable]:
+    """Lazily collect entries into tables, counting all entries."""
+    entries = iter(entries)
+    while True:
+        batch = list(itertools.islice(entries, FILTER_BATCH_SIZE))
+        if not batch:
+            return
+        table = EntryTable.from_entries(batch)
+        counts[None] += len(table)
+        yield table
+
+
+def _filter_tables(tables: Iterator[EntryTable], filters: list, counts: Counter) -> Iterator[EntryTable]:
+    """Lazily apply the given named filters on tables, counting entries kept
+    after each filter.
+
+    Filters are functions returning a mask of the entries to keep in a table.
+    """
+    for table in tables:
+        for name, keep in filters:
+            table = table.filter(keep(table))
+            counts[name] += len(table)
+        yield table
+
+
+def _window_tables(tables: Iterator[EntryTable], timewindow: str, counts: Counter) -> Iterator[EntryTable]:
+    """Keep entries inside the timewindow up to the latest entry.
+
+    Tables are buffered until the latest entry is known, so entries are only
+    parsed once.
+    """
+    tables = [t for t in tables if len(t)]
+    if tables:
+        end_ms = max(t.column("timestamp").max() for t in tables)
+        start_ms = end_ms - parse_timewindow(timewindow) // datetime.timedelta(milliseconds=1)
+        start_time, end_time = np.array([start_ms, end_ms], dtype="datetime64[ms]").tolist()
+        print(f"Filtering timewindow of {timewindow}: {start_time} {end_time}")
+
+    for table in tables:
+        table = table.filter(table.column("timestamp") >= start_ms)
+        counts["timewindow"] += len(table)
+        yield table
+
+
+def _apply_filters(
+        entries: Iterator[fm.LogEntry], filters: list, counts: Counter = None, timewindow: str = None
+) -> Iterator[fm.LogEntry]:
+    """Lazily apply the given named filters, counting entries kept after
+    each filter.
+
+    The timewindow filter is given without a mask function and applied on
+    all entries kept by the filters before it.
+    """
+    if counts is None:
+        counts = Counter()
+
+    if not filters:
+        for entry in entries:
+            counts[None] += 1
+            yield entry
+        return
+
+    tables = _batch_tables(entries, counts)
+    names = [name for name, _ in filters]
+    if timewindow is not None:
+        window = names.index("timewindow")
+        tables = _filter_tables(tables, filters[:window], counts)
+        tables = _window_tables(tables, timewindow, counts)
+        tables = _filter_tables(tables, filters[window + 1:], counts)
+    else:
+        tables = _filter_tables(tables, filters, counts)
 
-    print(f"Dumping {len(log_entries)} entries to {outdir}")
-    with open(outdir, "w") as jsfile:
-        json.dump(log_entries, jsfile)
+    for table in tables:
+        yield from table.entries
 
 
 if __name__ == "__main__":
-    argmagic(dump_logs, positional=("logdir", "outdir"))
+    argmagic(dump_logs, positional=("logdir", "outdir"), use_flags=True)
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import pathlib
+from typing import List
 from dataclasses import asdict
 
 import pandas as pd
@@ -13,6 +14,12 @@ EXPORTERS = {
 }
 
 
+def export_entries(entries: List[fm.LogEntry], out_name: pathlib.Path):
+    """Export entries to a path with one of the suffixes of EXPORTERS."""
+    df = pd.json_normalize(map(asdict, entries))
+    EXPORTERS[out_name.suffix](df, out_name)
+
+
 def main(input_data: pathlib.Path, out_name: pathlib.Path):
     """Exports a log dump to a given format.
 
@@ -23,9 +30,7 @@ def main(input_data: pathlib.Path, out_name: pathlib.Path):
     if out_name.suffix not in EXPORTERS:
         print(f"Unknown extension {out_name.suffix}")
         return
-    data = fm.load_logs(input_data)
-    df = pd.json_normalize(map(asdict, data))
-    EXPORTERS[out_name.suffix](df, out_name)
+    export_entries(fm.load_logs(input_data), out_name)
 
 
 if __name__ == "__main__":
@@ -6,6 +6,7 @@ from collections import Counter
 from argmagic import argmagic
 
 import faastermetrics as fm
+from faastermetrics.cache import get_cache, ParseCache
 
 
 def _lprint(*args, level=0, lead=">"):
@@ -13,49 +14,57 @@ def _lprint(*args, level=0, lead=">"):
     print(lindent, *args)
 
 
-def _print_log_folder(logdir: pathlib.Path, level: int):
+def _print_log_folder(logdir: pathlib.Path, level: int, cache: ParseCache):
     """Print the given directory."""
     lprint = lambda m: _lprint(m, level=level, lead=" ")
     lprint_detail = lambda ms: list(map(lambda m: _lprint(m, level=level + 1, lead=" "), ms))
 
     _lprint(logdir.name, level=level)
 
-    all_entries = fm.parse_logdir(logdir)
-    lprint(f"Total entries: {len(all_entries)}")
-
-    platform_entries = Counter([e.platform for e in all_entries])
+    num_entries = 0
+    platform_entries = Counter()
+    version = Counter()
+    dates = Counter()
+    for entry in fm.iter_logdir(logdir, cache=cache):
+        num_entries += 1
+        platform_entries[entry.platform] += 1
+        version[entry.data.get("version", "NA")] += 1
+        dates[entry.timestamp.date()] += 1
+
+    lprint(f"Total entries: {num_entries}")
     lprint("Platforms: ")
     lprint_detail(f"{k}: {v}" for k, v in platform_entries.items())
-    version = Counter([e.data.get("version", "NA") for e in all_entries])
     lprint("Versions: ")
     lprint_detail(f"{k}: {v}" for k, v in version.items())
-    dates = Counter([e.timestamp.date() for e in all_entries])
     lprint("Dates: ")
     lprint_detail(f"{k.isoformat()}: {v}" for k, v in dates.items())
 
 
-def _walk_dirs(logdir: pathlib.Path, level: int = 0):
+def _walk_dirs(logdir: pathlib.Path, level: int = 0, cache: ParseCache = None):
     """Recursively walk through directories until logdir is reached."""
     if fm.is_log_folder(logdir):
-        _print_log_folder(logdir, level)
+        _print_log_folder(logdir, level, cache)
     elif logdir.is_dir():
         _lprint(logdir.name, level=level)
         for subdir in sorted(logdir.iterdir()):
-            _walk_dirs(subdir, level + 1)
+            _walk_dirs(subdir, level + 1, cache)
     else:
         _lprint(f"{logdir.name} ignored", level=level)
 
 
-def list_logs(logdir: pathlib.Path):
+def list_logs(logdir: pathlib.Path, cache_dir: pathlib.Path = None, no_cache: bool = False):
     """
     Simple script for some initial testing on logging data.
 
     Args:
         logdir: Directory containing logging data.
+        cache_dir: Directory caching parsed logfiles, defaults to the
+            FAASTERMETRICS_CACHE environment variable.
+        no_cache: Parse all logfiles without using the cache.
     """
     print("= Available logs =")
-    _walk_dirs(logdir)
+    _walk_dirs(logdir, cache=get_cache(cache_dir, disabled=no_cache))
 
 
 if __name__ == "__main__":
-    argmagic(list_logs, positional=("logdir",))
+    argmagic(list_logs, positional=("logdir",), use_flags=True)
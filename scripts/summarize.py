@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Summarize logs in shards and merge the summaries.
+
+Shards can be summarized in a process pool with run, or on separate hosts
+with shard and merged afterwards with merge, eg over a shared filesystem.
+Merged summaries can be plotted with function_graph.py and
+execution_time.py.
+"""
+import pathlib
+from typing import List
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from argmagic import argmagic_subparsers
+
+from faastermetrics.sketch import DEFAULT_HORIZON
+from faastermetrics.summary import AnalysisSummary, iter_shard, summarize
+
+
+def _summarize_shard(data: pathlib.Path, num_shards: int, index: int) -> AnalysisSummary:
+    # logfiles are interleaved by timestamp, dumps are in the order of the
+    # dump and keep waiting calls until finish
+    horizon = DEFAULT_HORIZON if data.is_dir() else None
+    return summarize(iter_shard(data, num_shards, index), horizon=horizon)
+
+
+def _print_summary(summary: AnalysisSummary):
+    print(f"Summarized {summary.num_entries} entries of {len(summary.num_calls)} functions")
+    for function, num_calls in summary.num_calls.items():
+        print(f"  {function}: {num_calls} calls")
+
+
+def run(data: pathlib.Path, output: pathlib.Path, jobs: int = 1, shards: int = None):
+    """Summarize a log directory or dump in a process pool.
+
+    Args:
+        data: Log directory or dump.
+        output: Path of the merged summary.
+        jobs: Number of processes.
+        shards: Number of shards, defaults to the number of processes.
+    """
+    shards = shards or jobs
+    with ProcessPoolExecutor(jobs) as executor:
+        summaries = list(executor.map(partial(_summarize_shard, data, shards), range(shards)))
+    summary = summaries[0]
+    for other in summaries[1:]:
+        summary.merge(other)
+    summary.finish()
+    summary.dump(output)
+    _print_summary(summary)
+
+
+def shard(data: pathlib.Path, output: pathlib.Path, shards: int, index: int):
+    """Summarize a single shard of a log directory or dump.
+
+    Args:
+        data: Log directory or dump.
+        output: Path of the unfinished shard summary.
+        shards: Number of shards.
+        index: Index of the shard, starting at 0.
+    """
+    _summarize_shard(data, shards, index).dump(output)
+
+
+def merge(output: pathlib.Path, summaries: List[pathlib.Path]):
+    """Merge summaries of all shards.
+
+    Args:
+        output: Path of the merged summary.
+        summaries: Paths of shard summaries.
+    """
+    summary = AnalysisSummary.load(summaries[0])
+    for path in summaries[1:]:
+        summary.merge(AnalysisSummary.load(path))
+    summary.finish()
+    summary.dump(output)
+    _print_summary(summary)
+
+
+if __name__ == "__main__":
+    argmagic_subparsers([
+        {"target": run, "positional": ("data", "output")},
+        {"target": shard, "positional": ("data", "output")},
+        {"target": merge, "positional": ("output",)},
+    ])
@@ -21,12 +21,18 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/faastermetrics/analysis",
-    packages=setuptools.find_packages(),
+    # scripts and plots are packages for run_analysis.py, but not installed
+    packages=setuptools.find_packages(exclude=["scripts", "plots", "tests"]),
     install_requires=[
         "json_coder==0.5",
         "argmagic==1.0.1",
         "networkx",
+        "numpy",
     ],
+    extras_require={
+        "zstd": ["zstandard"],
+        "orjson": ["orjson"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: Apache Software License",
@@ -0,0 +1,100 @@
+"""
+Raw log directories of small generated experiments.
+"""
+import json
+import random
+import pathlib
+
+import pytest
+
+
+FUNCTION_PLATFORMS = {"artillery": "aws", "frontend": "aws", "add": "gcp", "list": "azure"}
+
+
+class LogWriter:
+    """Write raw log lines of requests to platform logfiles."""
+
+    def __init__(self, logdir: pathlib.Path, seed: int = 0):
+        self.logdir = logdir
+        self.random = random.Random(seed)
+        self.lines = {platform: [] for platform in set(FUNCTION_PLATFORMS.values())}
+
+    def emit(self, function: str, event: dict, timestamp: int):
+        platform = FUNCTION_PLATFORMS[function]
+        message = json.dumps({
+            "timestamp": timestamp, "version": "v1", "deploymentId": "dep1", "platform": platform,
+            "fn": {"name": function}, "event": event,
+        })
+        self.lines[platform].append(f"2020-05-23T10:00:00Z INFO FAASTERMETRICS{message}\n")
+
+    def call(self, context_id: str, function: str, caller: str, xpair: str, timestamp: int,
+             subcalls: tuple = (), out_after_in: bool = False) -> float:
+        """Log a call and its subcalls, returns its duration in ms.
+
+        Args:
+            out_after_in: Log the rpcOut entries of subcalls after the rpcIn
+                measure of the call, as if the logs were out of order.
+        """
+        event = {"contextId": context_id, "xPair": f"{caller}-{xpair}"}
+        self.emit(function, {**event, "perf": {"entryType": "mark", "mark": "start:rpcIn"}}, timestamp)
+        duration = 2.0
+        out_entries = []
+        for subcall in subcalls:
+            sub_xpair = f"{self.random.getrandbits(32):08x}"
+            mark = f"{subcall}:{context_id}-{sub_xpair}"
+            out_entries.append(({**event, "perf": {
+                "entryType": "mark", "mark": f"start:rpcOut:{mark}",
+            }}, timestamp + 1))
+            sub_duration = self.call(context_id, subcall, function, sub_xpair, timestamp + 2)
+            out_duration = sub_duration + self.random.uniform(1, 10)
+            out_entries.append(({**event, "perf": {
+                "entryType": "measure", "mark": f"measure:rpcOut:{mark}", "duration": out_duration,
+            }}, timestamp + 1 + int(out_duration)))
+            if not out_after_in:
+                for out_entry in out_entries:
+                    self.emit(function, *out_entry)
+                out_entries = []
+            duration += out_duration
+        duration += self.random.uniform(0, 20)
+        self.emit(function, {**event, "perf": {
+            "entryType": "measure", "mark": "measure:rpcIn", "duration": duration,
+        }}, timestamp + int(duration))
+        for out_entry in out_entries:
+            self.emit(function, *out_entry)
+        return duration
+
+    def request(self, index: int, subcalls: tuple = ("add", "list"), **kwargs):
+        """Log an artillery request of the frontend."""
+        context_id = f"ctx{index:08d}"
+        xpair = f"{self.random.getrandbits(32):08x}"
+        timestamp = 1590000000000 + index * 100
+        event = {
+            "contextId": context_id, "xPair": f"artillery-{xpair}", "type": "before",
+            "url": "https://example.com/dev/frontend/home",
+        }
+        self.emit("artillery", event, timestamp)
+        duration = self.call(context_id, "frontend", "artillery", xpair, timestamp + 1, subcalls, **kwargs)
+        self.emit("artillery", {**event, "type": "after"}, timestamp + 5 + int(duration))
+
+    def write(self, drop: float = 0.0) -> pathlib.Path:
+        """Write all logged lines, dropping the given fraction of them at
+        random, as if they had been lost."""
+        self.logdir.mkdir(parents=True, exist_ok=True)
+        for platform, lines in self.lines.items():
+            with open(self.logdir / f"{platform}.log", "w") as logfile:
+                logfile.writelines(line for line in lines if self.random.random() >= drop)
+        return self.logdir
+
+
+def write_logdir(
+        logdir: pathlib.Path, num_requests: int, seed: int = 0, first: int = 0, drop: float = 0.0
+) -> pathlib.Path:
+    writer = LogWriter(logdir, seed)
+    for i in range(first, first + num_requests):
+        writer.request(i)
+    return writer.write(drop)
+
+
+@pytest.fixture
+def logdir(tmp_path):
+    return write_logdir(tmp_path / "logs", 50)
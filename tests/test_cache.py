@@ -0,0 +1,36 @@
+import os
+from unittest import mock
+
+import faastermetrics as fm
+from faastermetrics.cache import ParseCache
+
+from conftest import LogWriter
+
+
+def test_parse_cache(logdir, tmp_path):
+    cache = ParseCache(tmp_path / "cache")
+    entries = fm.parse_logdir(logdir)
+    assert fm.parse_logdir(logdir, cache=cache) == entries
+    assert len(list(cache.cache_dir.iterdir())) == len(fm.list_logfiles(logdir))
+
+    # cached logfiles are not parsed again
+    with mock.patch.object(fm, "parse_logfile", side_effect=AssertionError("parsed")):
+        assert fm.parse_logdir(logdir, cache=cache) == entries
+
+    # logfiles are parsed again once their modification time changed
+    logfile = logdir / "aws.log"
+    stat = logfile.stat()
+    os.utime(logfile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    with mock.patch.object(fm, "parse_logfile", wraps=fm.parse_logfile) as parse:
+        assert fm.parse_logdir(logdir, cache=cache) == entries
+    assert [c.args[0] for c in parse.call_args_list] == [logfile]
+
+    # and their new entries are cached
+    writer = LogWriter(logdir, seed=1)
+    writer.request(100)
+    with open(logfile, "a") as lfile:
+        lfile.writelines(writer.lines["aws"])
+    entries = fm.parse_logdir(logdir)
+    assert fm.parse_logdir(logdir, cache=cache) == entries
+    with mock.patch.object(fm, "parse_logfile", side_effect=AssertionError("parsed")):
+        assert fm.parse_logdir(logdir, cache=cache) == entries
@@ -0,0 +1,139 @@
+import datetime
+import itertools
+
+import pytest
+import tracemalloc
+
+import faastermetrics as fm
+from faastermetrics.logentry import LogEntry, cast_log_types
+from faastermetrics.calls import Call, CallIndex, CallStream, create_requestgroups, stream_calls
+
+from conftest import LogWriter, write_logdir
+
+
+def _batches(entries, size):
+    entries = iter(entries)
+    while True:
+        batch = list(itertools.islice(entries, size))
+        if not batch:
+            return
+        yield batch
+
+
+def test_call_index_parser_batches(logdir):
+    # parsed entries have not been cast to their log type yet
+    index = CallIndex()
+    built = []
+    for batch in _batches(fm.iter_logdir(logdir), 97):
+        built += index.add(batch)
+    # calls are only built once the watermark of their platform has passed
+    assert index.num_pending > 0
+    built += index.finish()
+    assert index.num_pending == 0
+    expected = create_requestgroups(cast_log_types(fm.parse_logdir(logdir)))
+    assert index.calls == expected
+    assert len(built) == len(expected)
+
+
+def test_call_index_name_conflicts(logdir):
+    entries = cast_log_types(fm.parse_logdir(logdir))
+    called = [e for e in entries if e.data["fn"]["name"] == "add"]
+    called = [e for e in called if e.id == called[0].id]
+    others = [e for e in entries if e not in called]
+    index = CallIndex()
+    index.add(others)
+    index.finish()
+    expected = create_requestgroups(others)
+    assert index.calls == expected
+
+    # the call is named differently than the calls of its caller
+    for entry in called:
+        entry.data["fn"]["name"] = "other"
+    with pytest.raises(ValueError):
+        # the watermark of its platform has passed already
+        index.add(called)
+    assert index.calls == expected
+    assert index.num_pending == 0
+    assert index.finish() == []
+
+
+def test_stream_calls_memory_flat(tmp_path):
+    # nothing of a streamed call may outlive it, eg its ids
+    logdirs = [write_logdir(tmp_path / f"logs{i}", 2000, first=i * 2000) for i in range(2)]
+
+    def stream(logdir):
+        for call in stream_calls(fm.iter_logdir(logdir), batch_size=500):
+            pass
+
+    stream(logdirs[0])
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        stream(logdirs[1])
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    assert retained < 100 * 1024
+
+
+def _call_summary(calls):
+    return sorted(
+        (c.id, c.duration, sorted((s.id, s.duration) for s in c.calls))
+        for c in calls
+    )
+
+
+def test_call_stream_outgoing_after_incoming(tmp_path):
+    writer = LogWriter(tmp_path / "logs")
+    for i in range(50):
+        writer.request(i, out_after_in=i % 2 == 0)
+    logdir = writer.write()
+
+    stream = CallStream()
+    calls = []
+    for entry in fm.iter_logdir(logdir):
+        calls += stream.add([entry])
+    calls += stream.finish()
+    assert stream.num_pending == 0
+    assert _call_summary(calls) == _call_summary(create_requestgroups(cast_log_types(fm.parse_logdir(logdir))))
+
+
+def test_call_stream_split_entries(logdir):
+    # entries of calls split in halves, added in reverse order but within
+    # the lateness
+    entries = fm.parse_logdir(logdir)
+    half = len(entries) // 2
+    stream = CallStream(lateness=datetime.timedelta(minutes=1))
+    calls = stream.add(entries[half:])
+    calls += stream.add(entries[:half])
+    calls += stream.finish()
+    assert _call_summary(calls) == _call_summary(create_requestgroups(cast_log_types(entries)))
+
+
+def test_parallel_requestgroups_equal_serial(logdir):
+    entries = cast_log_types(fm.parse_logdir(logdir))
+    # platform messages without context id
+    entries[5:5] = cast_log_types([LogEntry(entries[5].timestamp, {"event": {"message": "restart"}}, "aws")])
+    serial = create_requestgroups(entries)
+    for workers in (2, 3):
+        parallel = create_requestgroups(entries, workers=workers)
+        assert parallel == serial
+        assert [c.function for c in parallel] == [c.function for c in serial]
+        # entries are the parsed ones instead of copies
+        assert all(a is b for p, s in zip(parallel, serial) for a, b in zip(p.entries, s.entries))
+
+
+def test_call_time_range_follows_entries():
+    start = datetime.datetime(2020, 5, 23, 10)
+    first, second, last = (LogEntry(start + datetime.timedelta(seconds=s), {}, "aws") for s in (0, 1, 1))
+    call = Call(("ctx", "f"), "frontend", None, [second, last, first])
+    assert call.start_time is first and call.end_time is last
+    assert call.log_duration == datetime.timedelta(seconds=1)
+
+    # entries changed in place
+    later = LogEntry(start + datetime.timedelta(seconds=5), {}, "aws")
+    call.entries[0] = later
+    assert call.end_time is later
+    assert call.log_duration == datetime.timedelta(seconds=5)
+    call.entries.clear()
+    assert call.start_time is None and call.end_time is None and call.log_duration is None
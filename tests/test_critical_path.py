@@ -0,0 +1,84 @@
+import datetime
+
+import pytest
+
+from faastermetrics.logentry import LogEntry, UNDEFINED_XPAIR
+from faastermetrics.calls import Call
+from faastermetrics.critical_path import critical_paths
+
+
+START = datetime.datetime(2020, 5, 23, 10)
+
+
+def _ms(ms):
+    return datetime.timedelta(milliseconds=ms)
+
+
+def _entries(*times):
+    return [LogEntry(START + _ms(t), {}, "aws") for t in times]
+
+
+def _call(xpair, function, start, end, calls=()):
+    return Call(("ctx", xpair), function, _ms(end - start), _entries(start, end), list(calls))
+
+
+def test_critical_paths():
+    # add ends before list starts, list and add2 run in parallel with it
+    frontend = _call("f", "frontend", 5, 85, [
+        _call("a", "add", 10, 30),
+        _call("l", "list", 20, 60),
+        _call("a2", "add", 65, 75),
+    ])
+    calls = [
+        _call(UNDEFINED_XPAIR, "artillery", 0, 100, [_call("f", "frontend", 0, 90)]),
+        frontend,
+        _call("a", "add", 12, 27),
+        _call("l", "list", 22, 57),
+        _call("a2", "add", 66, 74),
+    ]
+    paths = critical_paths(calls)
+    assert len(paths) == 1
+    assert paths.requests["path"].tolist() == ["artillery > frontend > list > add"]
+    assert paths.requests["duration"].tolist() == [100]
+    hops = paths.hops
+    assert hops["function"].tolist() == ["artillery", "frontend", "list", "add"]
+    assert hops["depth"].tolist() == [0, 1, 2, 2]
+    assert hops["duration"].tolist() == pytest.approx([100, 80, 35, 8])
+    assert hops["transport"].tolist() == pytest.approx([0, 10, 5, 2])
+    assert hops["child"].tolist() == pytest.approx([90, 50, 0, 0])
+    assert hops["exclusive"].tolist() == pytest.approx([10, 30, 35, 8])
+
+    breakdown = paths.function_breakdown()
+    assert breakdown["add"]["hops"] == 1
+    assert breakdown["frontend"]["share"] == pytest.approx((30 + 10) / 100)
+    assert paths.most_common() == [("artillery > frontend > list > add", 1, 100.0, 100.0)]
+
+
+def test_critical_paths_of_unlogged_calls():
+    calls = [
+        _call(UNDEFINED_XPAIR, "artillery", 0, 100, [_call("f", "frontend", 0, 90)]),
+        # call of another request without its artillery call
+        Call(("other", "f"), "frontend", _ms(50), _entries(0, 50)),
+    ]
+    paths = critical_paths(calls)
+    assert paths.requests["path"].tolist() == ["artillery > frontend", "frontend"]
+    # the frontend call of the first request has not been logged
+    assert paths.hops["duration"].tolist() == pytest.approx([100, 90, 50])
+    assert paths.hops["exclusive"].tolist() == pytest.approx([10, 90, 50])
+
+
+def test_critical_paths_of_subcalls_with_unknown_end():
+    calls = [
+        _call("f", "frontend", 0, 100, [
+            _call("a", "add", 10, 30),
+            # end of the first list call is unknown, the second one has no
+            # duration either
+            Call(("ctx", "l"), "list", _ms(20), []),
+            Call(("ctx", "l2"), "list", None, []),
+        ]),
+    ]
+    paths = critical_paths(calls)
+    # unknown ends are clamped to the end of the call
+    assert paths.requests["path"].tolist() == ["frontend > add > list"]
+    assert paths.hops["duration"].tolist() == pytest.approx([100, 20, 20])
+    assert paths.hops["exclusive"].tolist() == pytest.approx([60, 20, 20])
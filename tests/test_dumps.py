@@ -0,0 +1,105 @@
+import sys
+import pickle
+
+import faastermetrics as fm
+from faastermetrics import columnar, jsonl
+from faastermetrics.logentry import PerfLog
+
+
+def test_iter_logs_all_formats(logdir, tmp_path):
+    entries = fm.parse_logdir(logdir)
+    for name, dump in (("json", fm.dump_logs), ("jsonl", jsonl.dump_jsonl), ("npz", columnar.dump_columnar)):
+        path = tmp_path / f"dump.{name}"
+        dump(entries, path)
+        for backend in ("json", "orjson"):
+            iterated = list(fm.iter_logs(path, backend=backend))
+            assert iterated == fm.load_logs(path, backend=backend)
+            assert len(iterated) == len(entries)
+
+
+def test_orjson_falls_back_to_json_for_nan(logdir, tmp_path):
+    entries = fm.parse_logdir(logdir)[:10]
+    entries[0].data["event"]["value"] = float("nan")
+    entries[1].data["event"]["value"] = float("inf")
+    for name, dump in (("json", fm.dump_logs), ("jsonl", jsonl.dump_jsonl)):
+        path = tmp_path / f"dump.{name}"
+        dump(entries, path)
+        expected = fm.load_logs(path, backend="json")
+        loaded = fm.load_logs(path, backend="orjson")
+        assert [e.data["event"].get("value") for e in loaded][1:2] == [float("inf")]
+        assert repr(loaded) == repr(expected)
+
+
+def test_empty_jsonl_round_trip(tmp_path):
+    for name in ("dump.jsonl", "dump.out"):
+        path = tmp_path / name
+        assert jsonl.dump_jsonl([], path) == 0
+        assert jsonl.is_jsonl(path)
+        assert fm.load_logs(path) == []
+        assert list(fm.iter_logs(path)) == []
+        assert fm.load_logs(path, context_id="ctx") == []
+
+
+def _is_decoded(entry):
+    return not hasattr(entry, "_raw")
+
+
+def test_lazy_entries_equal_eager(logdir, tmp_path):
+    path = tmp_path / "dump.npz"
+    columnar.dump_columnar(fm.parse_logdir(logdir), path)
+    eager = fm.load_logs(path)
+    lazy = fm.load_logs(path, lazy=True)
+    assert [type(e) for e in lazy] == [type(e) for e in eager]
+    assert [(e.timestamp, e.platform) for e in lazy] == [(e.timestamp, e.platform) for e in eager]
+    assert not any(_is_decoded(e) for e in lazy)
+
+    # pickled entries stay lazy
+    restored = pickle.loads(pickle.dumps(lazy))
+    assert not any(_is_decoded(e) for e in restored)
+    # platforms are interned like those of eager entries
+    assert all(e.platform is sys.intern(e.platform) for e in lazy + restored)
+
+    # data and derived fields are decoded on first access
+    for entries in (lazy, restored):
+        assert [e.id for e in entries] == [e.id for e in eager]
+        assert all(_is_decoded(e) for e in entries)
+        assert [e.perf_type for e in entries if isinstance(e, PerfLog)] == [
+            e.perf_type for e in eager if isinstance(e, PerfLog)]
+        assert entries == eager
+
+
+def test_columnar_round_trip_of_json_values(logdir, tmp_path):
+    entries = fm.parse_logdir(logdir)[:10]
+    entries[0].data["version"] = 2
+    entries[1].data["version"] = None
+    entries[2].data["deploymentId"] = 1.5
+    entries[3].data["fn"]["name"] = True
+    entries[4].data["event"]["contextId"] = "1"
+    entries[5].data["event"]["perf"] = {"entryType": "measure", "mark": "measure:rpcIn", "duration": None}
+    path = tmp_path / "dump.npz"
+    assert columnar.dump_columnar(entries, path) == len(entries)
+    fm.dump_logs(entries, tmp_path / "dump.json")
+    assert fm.load_logs(path) == fm.load_logs(tmp_path / "dump.json")
+
+    columns = columnar.load_columns(path)
+    assert [type(v) for v in columns["version"].tolist()[:3]] == [int, type(None), str]
+    assert columns["deployment_id"][2] == 1.5
+    assert columns["function"][3] is True
+    assert columns["context_id"][4] == "1"
+    assert repr(columns["perf_duration"].tolist()[5]) == "nan"
+    codes, categories = columnar.load_categorical(path, "context_id")
+    assert categories[codes].tolist() == [e.data["event"].get("contextId") for e in entries]
+
+
+
+def test_jsonl_indexes_of_dumps_with_same_stem(logdir, tmp_path):
+    entries = fm.parse_logdir(logdir)
+    halves = entries[::2], entries[1::2]
+    paths = tmp_path / "dump.jsonl", tmp_path / "dump.json"
+    for half, path in zip(halves, paths):
+        jsonl.dump_jsonl(half, path)
+    assert jsonl.index_path(paths[0]) != jsonl.index_path(paths[1])
+    for half, path in zip(halves, paths):
+        context_id = half[0].context_id
+        expected = [e for e in fm.load_logs(path) if e.context_id == context_id]
+        assert expected and fm.load_logs(path, context_id=context_id) == expected
@@ -0,0 +1,65 @@
+import numpy as np
+
+import faastermetrics as fm
+from faastermetrics.logentry import cast_log_types
+from faastermetrics.calls import create_requestgroups, stream_calls
+from faastermetrics.graph import (
+    STATISTICS, add_duration_statistics, build_function_graph, build_summary_function_graph, calls_to_summary_graph,
+    duration_statistics, edge_rpc_out_duration, edge_transport_duration,
+)
+
+
+def _graph_summary(graph):
+    nodes = sorted(
+        (n, d["num_calls"], sorted(d["platforms"]), d["rpc_in_sketch"].count)
+        for n, d in graph.nodes(data=True)
+    )
+    edges = sorted(
+        (u, v, d["num_calls"], d["rpc_out_sketch"].count, d["transport_sketch"].count)
+        for u, v, d in graph.edges(data=True)
+    )
+    return nodes, edges
+
+
+def test_summary_graph_of_streams(logdir):
+    expected = calls_to_summary_graph(create_requestgroups(cast_log_types(fm.parse_logdir(logdir))))
+    nodes, edges = _graph_summary(expected)
+    assert [n[:2] for n in nodes] == [("add", 50), ("artillery", 50), ("frontend/home", 50), ("list", 50)]
+    assert all(e[2:] == (50, 50, 50) for e in edges)
+
+    streamed = calls_to_summary_graph(stream_calls(fm.iter_logdir(logdir), batch_size=100))
+    assert _graph_summary(streamed) == (nodes, edges)
+    assert _graph_summary(build_summary_function_graph(fm.iter_logdir(logdir))) == (nodes, edges)
+
+
+def test_duration_statistics_equal_numpy():
+    rng = np.random.default_rng(0)
+    num_groups = 6
+    # group 4 is empty, group 5 has a single duration, ties in group 0
+    codes = np.concatenate([rng.integers(0, 4, 1000), [5], [0] * 10])
+    durations = np.concatenate([rng.lognormal(3, 1, 1000), [7.5], [20.0] * 10])
+    order = rng.permutation(len(codes))
+    stats = duration_statistics(durations[order], codes[order], num_groups)
+
+    for group in range(num_groups):
+        values = durations[codes == group]
+        assert stats["count"][group] == len(values)
+        if not len(values):
+            assert all(np.isnan(stats[name][group]) for name in STATISTICS if name != "count")
+            continue
+        assert np.isclose(stats["mean"][group], np.mean(values))
+        for name, percentile in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100)):
+            assert np.isclose(stats[name][group], np.percentile(values, percentile))
+
+
+def test_graph_duration_statistics(logdir):
+    graph = add_duration_statistics(build_function_graph(cast_log_types(fm.parse_logdir(logdir))))
+    for node, attrs in graph.nodes(data=True):
+        durations = [c.duration.total_seconds() * 1000 for c in attrs["calls"] if c.duration is not None]
+        assert attrs["rpc_in_count"] == len(durations)
+        assert np.isclose(attrs["rpc_in_p90"], np.percentile(durations, 90))
+        assert np.isclose(attrs["rpc_in"], np.mean(durations))
+    for edge in graph.edges:
+        attrs = graph.edges[edge]
+        assert np.isclose(attrs["transport_p99"], np.percentile(edge_transport_duration(graph, edge, list), 99))
+        assert np.isclose(attrs["rpc_out_p50"], edge_rpc_out_duration(graph, edge, np.median))
@@ -0,0 +1,88 @@
+import os
+import datetime
+from unittest import mock
+
+import faastermetrics as fm
+from faastermetrics import incremental as inc
+from faastermetrics.logentry import cast_log_types
+
+import scripts.dump_logs as dl
+from scripts.dump_logs import dump_logs
+
+from conftest import LogWriter
+
+
+def _requests(logdir, first, num_requests):
+    writer = LogWriter(logdir, seed=first)
+    for i in range(first, first + num_requests):
+        writer.request(i)
+    return writer.lines
+
+
+def _append(logdir, lines, partial: str = ""):
+    for platform, platform_lines in lines.items():
+        with open(logdir / f"{platform}.log", "a") as logfile:
+            logfile.writelines(platform_lines)
+            if platform == "aws":
+                logfile.write(partial)
+
+
+def _sorted(entries):
+    return sorted(cast_log_types(entries), key=repr)
+
+
+def test_incremental_dump(tmp_path):
+    logdir = tmp_path / "logs"
+    logdir.mkdir()
+    dump = tmp_path / "dump.json"
+
+    _append(logdir, _requests(logdir, 0, 10))
+    dump_logs(logdir, dump, incremental=True)
+    assert fm.load_logs(dump) == cast_log_types(fm.parse_logdir(logdir))
+
+    # a partially written last line is left for the next run
+    lines = _requests(logdir, 10, 10)
+    last = lines["aws"].pop()
+    _append(logdir, lines, partial=last[:len(last) // 2])
+    dump_logs(logdir, dump, incremental=True)
+    partial_entry = fm._parse_entry(last, "aws")
+    partial_size = len(last) // 2
+    _, checkpoints = inc.load_checkpoints(inc.checkpoint_path(dump))
+    assert checkpoints["aws.log"].offset == (logdir / "aws.log").stat().st_size - partial_size
+
+    with open(logdir / "aws.log", "a") as logfile:
+        logfile.write(last[partial_size:])
+    entries = fm.parse_logdir(logdir)
+    assert _sorted(fm.load_logs(dump)) == _sorted(e for e in entries if e != partial_entry)
+    dump_logs(logdir, dump, incremental=True)
+    assert _sorted(fm.load_logs(dump)) == _sorted(entries)
+
+    # a rotated logfile is parsed again completely
+    rotated = logdir / "aws.log.new"
+    with open(rotated, "w") as logfile:
+        logfile.writelines(_requests(logdir, 20, 5)["aws"])
+    os.replace(rotated, logdir / "aws.log")
+    dump_logs(logdir, dump, incremental=True)
+    assert _sorted(fm.load_logs(dump)) == _sorted(fm.parse_logdir(logdir))
+
+
+def test_dump_timewindow(logdir, tmp_path, capsys):
+    dump = tmp_path / "dump.json"
+    (logdir / "deployment_id.txt").write_text("dep1")
+    with mock.patch.object(fm, "iter_logdir", wraps=fm.iter_logdir) as iter_logdir, \
+            mock.patch.object(dl, "FILTER_BATCH_SIZE", 100):
+        dump_logs(logdir, dump, version="v1", timewindow="2s")
+    # entries are only parsed once
+    assert iter_logdir.call_count == 1
+    entries = cast_log_types(fm.parse_logdir(logdir))
+    start = max(e.timestamp for e in entries) - datetime.timedelta(seconds=2)
+    assert _sorted(fm.load_logs(dump)) == _sorted(e for e in entries if e.timestamp >= start)
+
+    # empty logs are reported like unfiltered ones
+    for path in fm.list_logfiles(logdir):
+        path.write_text("")
+    capsys.readouterr()
+    dump_logs(logdir, dump, timewindow="2s")
+    out = capsys.readouterr().out
+    assert "Loaded 0 entries" in out and "Dumped 0 entries" in out
+    assert fm.load_logs(dump) == []
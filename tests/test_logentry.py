@@ -0,0 +1,82 @@
+import json
+import pickle
+
+import pytest
+
+import faastermetrics as fm
+from faastermetrics.logentry import LOG_SUBTYPES, LogEntry, PerfLog, cast_log_types
+from faastermetrics.jsonbackend import encode_entry, get_backend
+
+
+def _fields(entry):
+    fields = [entry.timestamp, entry.data, entry.platform, entry.context_id, entry.x_pair, entry.id]
+    if isinstance(entry, PerfLog):
+        fields += [entry.perf_type, entry.perf_type_data]
+    return fields
+
+
+def test_entry_slots_round_trip(logdir):
+    parsed = fm.parse_logdir(logdir)
+    entries = cast_log_types(parsed)
+    assert {type(e) for e in entries} > {PerfLog}
+    for entry in entries:
+        assert not hasattr(entry, "__dict__")
+    with pytest.raises(AttributeError):
+        entries[0].unknown = 1
+
+    assert json.loads(json.dumps(parsed)) == parsed
+    encoded = [encode_entry(e) for e in entries]
+    for restored in (
+            cast_log_types(json.loads(e) for e in encoded),
+            cast_log_types(get_backend("orjson").load_entry(e.encode("utf-8")) for e in encoded),
+            pickle.loads(pickle.dumps(entries)),
+    ):
+        assert restored == entries
+        assert [type(e) for e in restored] == [type(e) for e in entries]
+        assert [_fields(e) for e in restored] == [_fields(e) for e in entries]
+
+
+def test_malformed_entry_fields():
+    entry = LogEntry(None, {"event": {"xPair": "no-separator-here"}}, "aws")
+    assert entry.context_id is None
+    # errors of derived fields are raised on access
+    with pytest.raises(ValueError):
+        entry.x_pair
+    restored = pickle.loads(pickle.dumps(entry))
+    assert restored == entry
+    with pytest.raises(ValueError):
+        restored.x_pair
+
+
+def _matching_subtype(entry):
+    """Subtype found by matching all subtypes in order."""
+    return next((t for t in LOG_SUBTYPES if t.match(entry)), None)
+
+
+def test_cast_log_types_dispatch(logdir):
+    events = [
+        {"perf": {"entryType": "mark", "mark": "start:rpcIn"}},
+        {"request": {}},
+        {"coldstart": True},
+        {"url": "https://example.com", "type": "before"},
+        # incomplete and ambiguous keys
+        {"url": "https://example.com"},
+        {"perf": {}, "request": {}},
+        {"coldstart": True, "url": "https://example.com", "type": "after"},
+        {},
+    ]
+    entries = [LogEntry(None, {"event": {"contextId": "ctx", **event}}, "aws") for event in events]
+    entries += fm.parse_logdir(logdir)
+    cast = cast_log_types(entries)
+    for entry, cast_entry in zip(entries, cast):
+        subtype = _matching_subtype(entry)
+        if subtype is None:
+            assert cast_entry is entry
+        else:
+            assert type(cast_entry) is subtype
+            # data is shared instead of copied
+            assert cast_entry.data is entry.data
+            assert (cast_entry.timestamp, cast_entry.platform, cast_entry.context_id, cast_entry.x_pair) == (
+                entry.timestamp, entry.platform, entry.context_id, entry.x_pair)
+    # entries of their subtype are kept
+    assert all(a is b for a, b in zip(cast_log_types(cast), cast))
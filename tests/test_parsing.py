@@ -0,0 +1,89 @@
+import gzip
+import json
+import lzma
+from unittest import mock
+
+import pytest
+
+import faastermetrics as fm
+from faastermetrics.compression import zstandard
+from faastermetrics.jsonbackend import get_backend
+
+
+def test_parallel_parsing_equals_serial(logdir):
+    entries = fm.parse_logdir(logdir)
+    assert fm.parse_logdir(logdir, workers=2) == entries
+
+    logfile = logdir / "aws.log"
+    serial = fm.parse_logfile(logfile)
+    size = logfile.stat().st_size
+    # chunks smaller than a line, ending inside lines and at the end of the
+    # logfile
+    for chunk_size in (1, 100, 4096, size - 1, size):
+        with mock.patch.object(fm, "CHUNK_SIZE", chunk_size):
+            assert fm.parse_logfile(logfile, workers=2) == serial
+    with mock.patch.object(fm, "CHUNK_SIZE", 1000):
+        assert fm.parse_logdir(logdir, workers=3) == entries
+
+
+def _raw_lines():
+    obj = {
+        "timestamp": 1590000000123, "version": "v1", "platform": "aws", "fn": {"name": "add"},
+        "event": {"contextId": "ctx1", "message": "café ✓ a\nb"},
+    }
+    message = json.dumps(obj)
+    # without any backslash
+    unescaped = message.replace("\\u00e9", "é").replace("\\u2713", "✓").replace("a\\nb", "ab")
+    return [
+        message,
+        # escape sequences of the whole message and of its values
+        message.replace('"', '\\"'),
+        message.replace("\\u00e9", "\\\\u00e9"),
+        # non-ASCII characters, without and with escape sequences
+        unescaped,
+        unescaped.replace("ab", "a\\\\nb"),
+        # control characters and trailing data
+        message.replace('"v1"', '"v\x0e1\x12"').replace("{", "{\x14", 1) + " trailing",
+    ]
+
+
+def test_byte_parsing_equals_parse_entry():
+    lines = [f"2020-05-23T10:00:00Z INFO {fm.MESSAGE_TAG}{message}" for message in _raw_lines()]
+    expected = [fm._parse_entry(line, "aws") for line in lines]
+    for backend in ("json", "orjson"):
+        decode = get_backend(backend).decode_message
+        for line, entry in zip(lines, expected):
+            raw = line.encode("utf-8")
+            message = raw[raw.index(fm._MESSAGE_TAG_BYTES) + len(fm._MESSAGE_TAG_BYTES):]
+            assert fm._parse_message(message, "aws", decode) == entry
+        buf = "\n".join(lines).encode("utf-8")
+        assert list(fm._iter_buffer(buf, "aws", decode)) == expected
+
+
+def _compress(path, suffix):
+    compressed = path.with_name(path.name + suffix)
+    if suffix == ".zst":
+        data = zstandard.ZstdCompressor().compress(path.read_bytes())
+    else:
+        data = {".gz": gzip.compress, ".xz": lzma.compress}[suffix](path.read_bytes())
+    compressed.write_bytes(data)
+    return compressed
+
+
+@pytest.mark.parametrize("suffix", [".gz", ".xz", ".zst"])
+def test_compressed_logfiles(logdir, tmp_path, suffix):
+    if suffix == ".zst" and zstandard is None:
+        pytest.skip("zstandard is not installed")
+    compressed_dir = tmp_path / "compressed"
+    compressed_dir.mkdir()
+    for path in fm.list_logfiles(logdir):
+        plain = compressed_dir / path.name
+        plain.write_bytes(path.read_bytes())
+        compressed = _compress(plain, suffix)
+        plain.unlink()
+        assert fm.parse_logfile(compressed) == fm.parse_logfile(path)
+        # blocks ending inside of lines
+        with mock.patch.object(fm, "CHUNK_SIZE", 100):
+            assert fm.parse_logfile(compressed) == fm.parse_logfile(path)
+            assert fm.parse_logfile(compressed, workers=2) == fm.parse_logfile(path)
+    assert sorted(fm.parse_logdir(compressed_dir), key=repr) == sorted(fm.parse_logdir(logdir), key=repr)
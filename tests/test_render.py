@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from faastermetrics.render import RenderScheduler
+
+
+def _render(path, text):
+    path.write_text(f"{text} {os.getpid()}")
+
+
+def _fail(message):
+    raise ValueError(message)
+
+
+def test_render_scheduler(tmp_path):
+    # single jobs render immediately in the current process
+    with RenderScheduler(1) as scheduler:
+        scheduler.submit(_render, tmp_path / "single", "a")
+        assert (tmp_path / "single").read_text() == f"a {os.getpid()}"
+
+    paths = [tmp_path / f"plot{i}" for i in range(4)]
+    with RenderScheduler(2) as scheduler:
+        for i, path in enumerate(paths):
+            scheduler.submit(_render, path, text=str(i))
+    for i, path in enumerate(paths):
+        text, pid = path.read_text().split()
+        assert text == str(i)
+        assert int(pid) != os.getpid()
+
+
+def test_render_scheduler_errors(tmp_path):
+    for jobs in (1, 2):
+        with pytest.raises(ValueError, match="first"):
+            with RenderScheduler(jobs) as scheduler:
+                scheduler.submit(_fail, "first")
+                if jobs > 1:
+                    scheduler.submit(_render, tmp_path / "after", "b")
+        if jobs > 1:
+            # other figures are still rendered
+            assert (tmp_path / "after").exists()
@@ -0,0 +1,44 @@
+from unittest import mock
+
+import faastermetrics as fm
+from faastermetrics import session as fs
+from faastermetrics.logentry import cast_log_types
+from faastermetrics.calls import create_requestgroups, platform_transport_times
+from faastermetrics.graph import build_function_graph
+from faastermetrics.session import AnalysisSession
+
+
+def test_session_computes_stages_once(logdir, tmp_path):
+    dump = tmp_path / "dump.json"
+    fm.dump_logs(fm.parse_logdir(logdir), dump)
+    entries = fm.load_logs(dump)
+
+    session = AnalysisSession(dump)
+    with mock.patch.object(fm, "load_logs", wraps=fm.load_logs) as load, \
+            mock.patch.object(fs, "create_requestgroups", wraps=fs.create_requestgroups) as group:
+        for _ in range(2):
+            assert session.entries == entries
+            calls = session.calls
+            graph = session.function_graph
+            index = session.call_index
+            transport_times = session.transport_times
+            tables = session.platform_tables
+    assert load.call_count == 1
+    assert group.call_count == 1
+
+    assert calls == create_requestgroups(entries)
+    assert session.calls is calls and session.function_graph is graph
+    assert all(c in index[c.code(session.symbols)] for c in calls)
+    assert transport_times == platform_transport_times(create_requestgroups(entries))
+    expected = build_function_graph(entries)
+    assert set(graph.nodes) == set(expected.nodes)
+    assert set(graph.edges) == set(expected.edges)
+    assert {p: len(t) for p, t in tables.items()} == {
+        p: sum(e.platform == p for e in entries) for p in {e.platform for e in entries}}
+
+
+def test_session_of_entries(logdir):
+    entries = cast_log_types(fm.parse_logdir(logdir))
+    session = AnalysisSession.from_entries(entries)
+    assert session.entries is entries
+    assert session.function_durations.keys() == {c.function for c in create_requestgroups(entries)}
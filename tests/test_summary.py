@@ -0,0 +1,109 @@
+import datetime
+import itertools
+import tracemalloc
+from unittest import mock
+
+import pytest
+
+import faastermetrics as fm
+from faastermetrics import columnar, jsonl
+from faastermetrics.logentry import LogEntry
+from faastermetrics.calls import _shard
+from faastermetrics.summary import AnalysisSummary, iter_shard, summarize
+
+from conftest import FUNCTION_PLATFORMS, write_logdir
+
+
+NUM_SHARDS = 3
+
+
+def _sorted(entries):
+    return sorted(entries, key=repr)
+
+
+def test_iter_shard_logdir(logdir):
+    entries = fm.parse_logdir(logdir)
+    shards = []
+    with mock.patch.object(LogEntry, "__post_init__", autospec=True, side_effect=LogEntry.__post_init__) as init:
+        # more shards than logfiles, all of them contain entries
+        for i in range(5):
+            shard = list(iter_shard(logdir, 5, i))
+            assert shard and all(_shard(e.context_id, 5) == i for e in shard)
+            shards.append(shard)
+    # messages of other shards are not decoded
+    assert init.call_count == len(entries)
+    assert _sorted(e for shard in shards for e in shard) == _sorted(entries)
+
+    summary = summarize(iter_shard(logdir, 5, 0))
+    for i in range(1, 5):
+        summary.merge(summarize(iter_shard(logdir, 5, i)))
+    summary.finish()
+    expected = summarize(entries)
+    expected.finish()
+    assert summary.num_calls == expected.num_calls
+    assert summary.edge_calls == expected.edge_calls
+
+    # calls of artillery requests are named after their url path
+    assert {f.split("/")[0]: summary.function_platform(f) for f in summary.functions} == FUNCTION_PLATFORMS
+    with pytest.raises(RuntimeError):
+        summary.function_platform("unknown")
+    assert "unknown" not in summary.platforms
+
+
+def test_iter_shard_dumps(logdir, tmp_path):
+    entries = fm.parse_logdir(logdir)
+    # context ids only found by decoding
+    entries[0].data["event"]["contextId"] = "ctx\"quoted"
+    entries[1].data["event"]["nested"] = {"contextId": "other"}
+    entries[2].data["event"]["message"] = '{"__logentry__": "not an entry"}'
+    entries[3].data["event"].pop("contextId")
+    for name, dump in (("json", fm.dump_logs), ("jsonl", jsonl.dump_jsonl), ("npz", columnar.dump_columnar)):
+        path = tmp_path / f"dump.{name}"
+        dump(entries, path)
+        expected = fm.load_logs(path)
+        shards = []
+        with mock.patch.object(LogEntry, "__post_init__", autospec=True, side_effect=LogEntry.__post_init__) as init:
+            for i in range(NUM_SHARDS):
+                shard = list(iter_shard(path, NUM_SHARDS, i))
+                assert all(_shard(e.context_id, NUM_SHARDS) == i for e in shard)
+                shards.append(shard)
+        # entries of other shards are not decoded, except the ones above,
+        # decoded entries are created again when cast to their log type
+        assert init.call_count <= 2 * (len(entries) + 3 * (NUM_SHARDS - 1))
+        assert _sorted(e for shard in shards for e in shard) == _sorted(expected)
+
+
+def test_summary_memory_flat(tmp_path):
+    # 150 s of requests with some lost entries, so that calls and subcalls
+    # never see the other end of their edge and calls cannot be built
+    logdir = write_logdir(tmp_path / "logs", 1500, drop=0.02)
+    horizon = datetime.timedelta(seconds=5)
+    summary = AnalysisSummary(horizon=horizon)
+    entries = fm.iter_logdir(logdir, interleave=True)
+    num_pending = []
+    tracemalloc.start()
+    try:
+        for i in itertools.count():
+            batch = list(itertools.islice(entries, 500))
+            if not batch:
+                break
+            summary.add_entries(batch)
+            del batch
+            num_pending.append(summary.num_pending)
+            if i == 8:
+                # after the horizon
+                baseline = tracemalloc.get_traced_memory()[0]
+        growth = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    assert len(num_pending) > 30
+    assert max(num_pending[8:]) < 100
+    assert growth < 100 * 1024
+    summary.finish()
+
+    # nothing is flushed before the other end has been added
+    expected = summarize(fm.iter_logdir(logdir, interleave=True), horizon=None)
+    expected.finish()
+    assert summary.num_calls == expected.num_calls
+    assert summary.edge_calls == expected.edge_calls
+    assert {k: s.count for k, s in summary.transport.items()} == {k: s.count for k, s in expected.transport.items()}
@@ -0,0 +1,61 @@
+import gc
+import pickle
+import weakref
+
+import faastermetrics as fm
+from faastermetrics.logentry import cast_log_types
+from faastermetrics.calls import CallIndex, create_requestgroups, calls_by_id, calls_symbols
+from faastermetrics.critical_path import critical_paths
+from faastermetrics.session import AnalysisSession
+from faastermetrics.symbols import SymbolTable
+
+
+def test_symbol_table():
+    symbols = SymbolTable()
+    a, b = "ctx" + str(1), "ctx" + str(1)
+    assert symbols.intern(a) == symbols.intern(b) == 0
+    assert symbols.canonical(b) is a
+    code = symbols.intern_id((b, "x"))
+    assert symbols.value(code) == (a, "x") and symbols.value(code)[0] is a
+    assert len(symbols) == 3 and "x" in symbols
+
+
+def test_calls_share_symbols_of_their_run(logdir):
+    entries = cast_log_types(fm.parse_logdir(logdir))
+    calls = create_requestgroups(entries)
+    symbols = calls_symbols(calls)
+    assert all(c.symbols is symbols and s.symbols is symbols for c in calls for s in c.calls)
+    assert all(symbols.value(c.id_code) is c.id for c in calls)
+    # entries of a context share a single context id object
+    contexts = {}
+    assert all(contexts.setdefault(e.context_id, e.context_id) is e.context_id for e in entries)
+
+    # another run owns another table, calls of both runs still match
+    other = create_requestgroups(cast_log_types(fm.parse_logdir(logdir)))
+    assert calls_symbols(other) is not symbols
+    index = calls_by_id(calls, symbols)
+    assert all(index[c.code(symbols)][0].id == c.id for c in other)
+
+    # tables are released with the calls of their run
+    table = weakref.ref(symbols)
+    del calls, other, index, symbols
+    gc.collect()
+    assert table() is None
+
+
+def test_symbols_of_owners(logdir):
+    entries = cast_log_types(fm.parse_logdir(logdir))
+    session = AnalysisSession.from_entries(entries)
+    assert calls_symbols(session.calls) is session.symbols
+    assert sorted(session.call_index) == sorted(c.id_code for c in session.calls)
+
+    index = CallIndex()
+    index.add(fm.parse_logdir(logdir))
+    index.finish()
+    assert calls_symbols(index.calls) is index.symbols
+    assert index.calls == session.calls
+
+    # codes are not pickled, calls are coded again in the table they are used with
+    restored = pickle.loads(pickle.dumps(session.calls))
+    assert restored == session.calls and restored[0].symbols is None
+    assert critical_paths(restored).requests["path"].tolist() == critical_paths(session.calls).requests["path"].tolist()
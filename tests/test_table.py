@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+import faastermetrics as fm
+from faastermetrics import columnar
+from faastermetrics.logentry import cast_log_types
+from faastermetrics.table import EntryTable
+
+
+def _function(entry):
+    return entry.data.get("fn", {}).get("name")
+
+
+def _mark(entry):
+    return entry.data["event"].get("perf", {}).get("mark")
+
+
+def test_entry_table(logdir, tmp_path):
+    entries = cast_log_types(fm.parse_logdir(logdir))
+    table = EntryTable.from_entries(entries)
+    assert len(table) == len(entries)
+
+    aws = table.filter(table.equals("platform", "aws"))
+    assert aws.entries == [e for e in entries if e.platform == "aws"]
+    # missing values and values not in the table
+    no_mark = table.filter(table.equals("perf_mark", None))
+    assert no_mark.entries == [e for e in entries if _mark(e) is None]
+    assert not table.equals("platform", "unknown").any()
+    selected = table.filter(table.isin("function", ["add", "list", "unknown"]))
+    assert selected.entries == [e for e in entries if _function(e) in ("add", "list")]
+
+    expected = defaultdict(list)
+    for i, entry in enumerate(entries):
+        expected[(entry.platform, entry.context_id)].append(i)
+    grouped = table.group_by("platform", "context_id")
+    assert list(grouped) == list(expected)
+    assert {k: v.tolist() for k, v in grouped.items()} == dict(expected)
+    assert {k: v.tolist() for k, v in table.group_by("x_pair").items()} == {
+        x_pair: [i for i, e in enumerate(entries) if e.x_pair == x_pair] for x_pair in dict.fromkeys(
+            e.x_pair for e in entries)}
+
+    # missing values first, equal rows keep their order
+    order = sorted(range(len(entries)), key=lambda i: (_mark(entries[i]) is not None, _mark(entries[i]) or ""))
+    assert table.sort("perf_mark").entries == [entries[i] for i in order]
+    assert table.argsort("perf_mark", "timestamp").tolist() == sorted(range(len(entries)), key=lambda i: (
+        _mark(entries[i]) is not None, _mark(entries[i]) or "", entries[i].timestamp, i))
+
+    # tables of columnar dumps contain the same columns
+    path = tmp_path / "dump.npz"
+    columnar.dump_columnar(entries, path)
+    loaded = EntryTable.from_columnar(path)
+    for name in table.columns:
+        # NaN durations compare equal by repr
+        assert repr(loaded.values(name).tolist()) == repr(table.values(name).tolist())